@@ -1,15 +1,15 @@
-from flask import Flask, render_template, jsonify, request, abort
+from flask import Flask, render_template, jsonify, request, abort, Response, stream_with_context
 import mysql.connector
 import datetime
 import os
 from gpiozero import OutputDevice, PWMOutputDevice
 import time
-import sched
 import threading
 import psutil
 import logging
 import subprocess
 import json
+import tempfile
 from functools import wraps
 from include.data_writer_mysql import SensorDataLogger
 from include.fridge_controller import Fridge, ControlMode
@@ -25,6 +25,23 @@ from include.health_monitoring import HealthMonitor
 from include.picamera_recorder import CameraRecorder
 from include.plantgeek_backend_connector import PlantGeekBackendConnector
 from include.humidifier_controller import Humidifier
+from include.downsampling import downsample_rows, MEASUREMENT_STATE_COLUMNS
+from include.columnar_format import (supported_mimetypes, column_types, encode_columnar, encode_msgpack,
+                                     COLUMNAR_MIMETYPE, MSGPACK_MIMETYPE)
+from include.measurement_rollups import select_rollup_level
+from include.database_pool import DEFAULT_DB_CONFIG
+from include.measurement_storage import create_storage
+from include.measurement_archive import MeasurementArchiver
+from include.measurement_export import EXPORT_SOURCES, EXPORT_FORMATS, parse_time, csv_chunks, write_parquet
+from include.sensor_sample_store import LatestSampleStore
+from include.ring_buffer import SampleRingBuffer, samples_to_rows
+from include.trend_estimator import TrendEstimator
+from include.single_flight_cache import SingleFlightCache
+from include.sample_queue import SampleQueue, DROP_OLDEST
+from include.liveness import LivenessTracker
+from include.runtime import Runtime
+from include.sample_bus import SampleBus
+from include.conditional_get import conditional_get
 
 import faulthandler
 import argparse
@@ -56,17 +73,11 @@ werkzeug_logger = logging.getLogger('werkzeug')
 werkzeug_logger.addFilter(ExcludeLogsFilter())
 
 app = Flask(__name__)
-sensorsAlive = False
-databaseAlive = False
 
 # Apply the custom filter to the Flask app logger 
 for handler in logging.getLogger('werkzeug').handlers:
     handler.addFilter(ExcludeLogsFilter())
 
-# State tracking variables for error logging
-db_error_logged = False
-sensors_error_logged = False
-
 # Ensure only authorized users can access the route
 def requires_auth(f):
     @wraps(f)
@@ -77,6 +88,12 @@ def requires_auth(f):
         return f(*args, **kwargs)
     return decorated
 
+def config_version():
+    try:
+        return os.stat(CONFIG_FILE).st_mtime_ns
+    except OSError:
+        return None
+
 # Function to load the existing configuration
 def load_config():
     if os.path.exists(CONFIG_FILE):
@@ -111,10 +128,20 @@ def load_config():
             },
             "APIConfig": {
                 "apiKey": ""
+            },
+            "DataRetention": {
+                "retentionDays": 365,
+                "archiveAfterDays": 28
+            },
+            "Storage": {
+                "backend": "mysql",
+                "sqlitePath": "data/sensor_data.db",
+                "writeQueuePolicy": "drop_oldest"
             }
         }
         
 @app.route('/config', methods=['GET'])
+@conditional_get(config_version)
 def get_config():
     config = load_config()
     return jsonify(config)
@@ -145,6 +172,9 @@ def initConfigOnStartup():
     
     heater.set_control_temperature(config['TemperatureControl']['targetDayTemperature'])
     heater.set_hysteresis(config['TemperatureControl']['hysteresis'])
+
+    measurement_retention.set_retention_days(config.get('DataRetention', {}).get('retentionDays', 365))
+    measurement_archiver.set_archive_after_days(config.get('DataRetention', {}).get('archiveAfterDays', 28))
     
 @app.route('/save_config', methods=['POST'])
 def save_config():
@@ -261,12 +291,34 @@ def reboot():
 
 
 # Database connection parameters
-db_config = {
-    'host': 'localhost',
-    'user': 'drow',
-    'password': 'drowBox4ever',
-    'database': 'sensor_data'
-}
+db_config = DEFAULT_DB_CONFIG
+
+# Sensors and database are alive as long as the data writer and the connection pool report
+# heartbeats, nothing is polled
+liveness = LivenessTracker()
+liveness.register('sensors', timeout=60)
+liveness.register('database', timeout=120)
+
+# Measurement storage shared by the web app, the data writer and the controllers. MySQL uses one
+# connection pool for all of them, SQLite a file in WAL mode (config "Storage").
+storage = create_storage(load_config().get('Storage'), db_config, liveness=liveness)
+
+# Latest sensor reading, published by the data writer and read by the controllers
+sample_store = LatestSampleStore(max_age=60)
+# runs the controllers once per new reading, safe mode if no sample arrived for 15 seconds
+sample_bus = SampleBus(sample_store, timeout=15, check_interval=5)
+
+# Samples of the last 24 hours, filled by the data writer. /data and the heater's trend detection
+# read from it, MySQL is only queried for older ranges.
+ring_buffer = SampleRingBuffer()
+
+# Running temperature/humidity/CO2 trends, fed by the data writer for the controllers
+trend_estimator = TrendEstimator()
+
+# Drops measurements which are older than the retention period
+measurement_retention = storage.retention()
+# Packs raw measurements of old days into compressed daily blocks
+measurement_archiver = MeasurementArchiver(storage)
 
 # light = OutputDevice(17)
 # co2valve = OutputDevice(27)
@@ -283,6 +335,7 @@ frontend_display_settings = {
 }
 
 @app.route('/fridge_state')
+@conditional_get(lambda: fridge.is_on)
 def fridge_state():
     return jsonify(fridge.is_on)
 
@@ -358,14 +411,85 @@ def zigbeeDeviceRoute():
     # mqtt_interface.print_devices()
     return jsonify(temps)
 
+def series_response(rows, column_count, bit_columns=(), float64_columns=()):
+    """Rows as JSON (default) or in the columnar format if the client asks for it in the Accept header"""
+    mimetype = request.accept_mimetypes.best_match(supported_mimetypes())
+    types = column_types(column_count, bit_columns, float64_columns)
+    if mimetype == COLUMNAR_MIMETYPE:
+        response = Response(encode_columnar(rows, types), mimetype=COLUMNAR_MIMETYPE)
+    elif mimetype == MSGPACK_MIMETYPE:
+        response = Response(encode_msgpack(rows, types), mimetype=MSGPACK_MIMETYPE)
+    else:
+        response = jsonify(rows)
+    response.vary.add('Accept')
+    return response
+
+# Rows of /data: temperature, humidity, eco2, light, fridge, co2, heater, unix timestamp
+DATA_COLUMNS = 8
+DATA_TIMESTAMP_COLUMN = 7
+# a delta request further behind than this gets a truncated answer, the client then reloads the window
+DATA_DELTA_LIMIT = 2000
+# hours of data for clients which do not send timespan=
+DEFAULT_DATA_TIMESPAN = 4
+
+# Results of /data by (timespan, points, data version). Open dashboards poll the same views, concurrent
+# identical requests wait for one query instead of running their own.
+data_cache = SingleFlightCache(max_entries=16)
+
+def parse_since_cursor(value):
+    """
+    since= is a measurement id, a unix timestamp with fraction (cursors of ring buffer responses)
+    or an ISO timestamp. Returns ('id', int) or ('timestamp', unix timestamp).
+    """
+    if value.isdigit():
+        return 'id', int(value)
+    try:
+        return 'timestamp', float(value)
+    except ValueError:
+        pass
+    try:
+        return 'timestamp', datetime.datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        return None, None
+
+def ring_buffer_cursor(samples):
+    timestamp = samples['timestamp'][-1] if len(samples) else ring_buffer.latest_timestamp()
+    return None if timestamp is None else '{:.3f}'.format(timestamp)
+
 @app.route('/data')
+@conditional_get(lambda: (ring_buffer.version, sensorData.write_version))
 def data():
-    if not databaseAlive or not sensorsAlive:
-        return ''
+    # optional point budget, the series is downsampled on the server if it has more rows
+    points = request.args.get('points', type=int)
+    if points is not None and points < 3:
+        return jsonify({'error': 'points must be at least 3'}), 400
 
-    conn = mysql.connector.connect(**db_config)
-    cursor = conn.cursor()
+    timespan = request.args.get('timespan', DEFAULT_DATA_TIMESPAN, type=float)
+    if timespan <= 0:
+        return jsonify({'error': 'timespan must be positive'}), 400
 
+    since = request.args.get('since')
+    key = (timespan, points, ring_buffer.version, sensorData.write_version)
+    try:
+        # raw delta rows cannot be appended to a chart of rollup buckets, these get the full payload
+        if since is not None and not window_uses_rollups(timespan, points):
+            return data_since(since, timespan)
+        results, bit_columns, data_cursor = data_cache.get(key, lambda: query_data_window(timespan, points))
+    except storage.Error as e:
+        # windows within the ring buffer are still served while the database is down
+        logging.error("[data] Database error: %s", str(e))
+        return jsonify({'error': 'database unavailable'}), 503
+    response = series_response(results, DATA_COLUMNS, bit_columns, (DATA_TIMESTAMP_COLUMN,))
+    # the client continues with /data?since=<cursor> and only receives newer rows, rollup windows have no cursor
+    response.headers['X-Data-Cursor'] = data_cursor
+    return response
+
+def window_uses_rollups(timespan, points):
+    window_start = time.time() - timespan * 3600
+    return not ring_buffer.covers(window_start) and select_rollup_level(timespan, points) is not None
+
+def query_data_window(timespan, points):
+    """Rows of the last timespan hours, the state columns to bit pack and the delta cursor"""
     # query = """
     # SELECT temperature_c, humidity, eco2
     # FROM measurements
@@ -379,79 +503,102 @@ def data():
     # WHERE timestamp >= DATE_SUB(NOW(), INTERVAL 24 HOUR)
     # """
     
-    query = """
-    SELECT temperature_c, humidity, eco2, light_state, fridge_state, co2_state, heater_state
-    FROM measurements
-    WHERE timestamp >= DATE_SUB(NOW(), INTERVAL {} HOUR)
-    """.format(timeSpanDataFetching)
-    
-    cursor.execute(query)
-    results = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return jsonify(results)
+    window_start = time.time() - timespan * 3600
+    if ring_buffer.covers(window_start):
+        samples = ring_buffer.window(window_start)
+        results = samples_to_rows(samples)
+        if points is not None:
+            results = downsample_rows(results, points)
+        return results, MEASUREMENT_STATE_COLUMNS, ring_buffer_cursor(samples) or ''
+
+    # long timespans are served from the coarsest rollup table that still meets the resolution
+    rollup_table = select_rollup_level(timespan, points)
+    if rollup_table is not None:
+        results = storage.fetch_rollups(rollup_table, window_start)
+        # no delta cursor, the client reloads the window (a 304 while nothing changed)
+        data_cursor = None
+    else:
+        rows = storage.fetch_window(window_start)
+        # archived rows have no id
+        data_cursor = max((row[-1] for row in rows if row[-1] is not None), default=None)
+        results = [row[:-1] for row in rows]
+    
+    if points is not None:
+        results = downsample_rows(results, points)
+    # rollup rows contain duty cycles (0..1), only raw states can be bit packed
+    bit_columns = MEASUREMENT_STATE_COLUMNS if rollup_table is None else ()
+    return results, bit_columns, '' if data_cursor is None else str(data_cursor)
+
+def data_since(since, timespan):
+    kind, value = parse_since_cursor(since)
+    if kind is None:
+        return jsonify({'error': 'since must be a measurement id or a timestamp'}), 400
+
+    if kind == 'timestamp' and ring_buffer.covers(value):
+        samples = ring_buffer.window(value, include_start=False)[:DATA_DELTA_LIMIT]
+        return jsonify({
+            'cursor': ring_buffer_cursor(samples) or since,
+            'rows': samples_to_rows(samples),
+            'truncated': len(samples) >= DATA_DELTA_LIMIT,
+        })
+
+    # ordered by id, rows replayed from the writer's spool arrive late but are not skipped
+    window_start = time.time() - timespan * 3600
+    if kind == 'id':
+        rows = storage.fetch_after_id(value, window_start, DATA_DELTA_LIMIT)
+    else:
+        rows = storage.fetch_after_timestamp(value, window_start, DATA_DELTA_LIMIT)
 
-def check_database():
-    global databaseAlive, db_error_logged
+    if rows:
+        data_cursor = rows[-1][-1]
+    elif kind == 'id':
+        data_cursor = value
+    else:
+        data_cursor = storage.max_id()
+
+    return jsonify({
+        'cursor': data_cursor,
+        'rows': [row[:-1] for row in rows],
+        'truncated': len(rows) >= DATA_DELTA_LIMIT,
+    })
+
+# Full history download, e.g. /export?start=2024-01-01&end=2024-02-01&format=csv&source=measurements_1h
+@app.route('/export')
+def export():
+    source = request.args.get('source', 'measurements')
+    export_format = request.args.get('format', 'csv')
+    if source not in EXPORT_SOURCES:
+        return jsonify({'error': 'source must be one of {}'.format(', '.join(sorted(EXPORT_SOURCES)))}), 400
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': 'format must be one of {}'.format(', '.join(EXPORT_FORMATS))}), 400
     try:
-        conn = mysql.connector.connect(**db_config)
-        cursor = conn.cursor()
-        cursor.execute("SELECT 1")
-        result = cursor.fetchone()  # Fetch the result
-        cursor.close()
-        conn.close()
-        if not databaseAlive:
-            logging.info("[check_database] Database is alive again.")
-        databaseAlive = True
-        db_error_logged = False
-    except mysql.connector.Error as e:
-        if databaseAlive:
-            logging.error("[check_database] Database error: %s", str(e))
-        databaseAlive = False
-        db_error_logged = True
-    scheduler_databaseCheck.enter(1, 1, check_database)
-
-def check_sensors():
-    global sensorsAlive, sensors_error_logged
-    if not databaseAlive:
-        scheduler_sensorCheck.enter(1, 1, check_sensors)
-        return
-
-    conn = mysql.connector.connect(**db_config)
-    cursor = conn.cursor()
-
-    query = """
-    SELECT timestamp
-    FROM measurements
-    ORDER BY timestamp DESC
-    LIMIT 1;
-    """
-    cursor.execute(query)
-    result = cursor.fetchone()
-
-    if result is None:
-        if sensorsAlive:
-            logging.error("[check_sensors] Sensors are offline!")
-        sensorsAlive = False
-        sensors_error_logged = True
+        start = parse_time(request.args.get('start'), 0)
+        end = parse_time(request.args.get('end'), time.time())
+    except ValueError:
+        return jsonify({'error': 'start and end must be ISO dates or unix timestamps'}), 400
+
+    filename = 'plantgeek_{}_{}'.format(source, datetime.date.today().isoformat())
+    if export_format == 'parquet':
+        # the Parquet footer is written last, so the file is built on disk and then streamed from there
+        spooled = tempfile.TemporaryFile()
+        try:
+            write_parquet(storage, source, start, end, spooled)
+        except RuntimeError as e:
+            spooled.close()
+            return jsonify({'error': str(e)}), 501
+        spooled.seek(0)
+
+        def file_chunks():
+            with spooled:
+                for chunk in iter(lambda: spooled.read(64 * 1024), b''):
+                    yield chunk
+        response = Response(file_chunks(), mimetype='application/vnd.apache.parquet')
+        filename += '.parquet'
     else:
-        last_timestamp = result[0]
-        current_time = datetime.datetime.now()
-        time_difference = current_time - last_timestamp
-        if time_difference.total_seconds() > 60:
-            if sensorsAlive:
-                logging.error("[check_sensors] Sensors are offline!")
-            sensorsAlive = False
-            sensors_error_logged = True
-        else:
-            if not sensorsAlive:
-                logging.info("[check_sensors] Sensors are online again.")
-            sensorsAlive = True
-            sensors_error_logged = False
-            
-    cursor.close()
-    conn.close()
-    scheduler_sensorCheck.enter(5, 1, check_sensors)
+        response = Response(stream_with_context(csv_chunks(storage, source, start, end)), mimetype='text/csv')
+        filename += '.csv'
+    response.headers['Content-Disposition'] = 'attachment; filename={}'.format(filename)
+    return response
 
 @app.route('/setFanSpeed', methods=['POST'])
 def fan_speed():
@@ -488,9 +635,8 @@ def pump_power():
 
 
 
-# temporary use global variable for timeSpan value
-timeSpanDataFetching = 4
-
+# The timespan is a parameter of every /data request now, so one browser no longer changes what the
+# others get. Kept for pages loaded from an older version, which still post their timespan here.
 @app.route('/dataFetchTimeSpan', methods=['POST'])
 def dataFetchTimeSpan():
     if not request.is_json:
@@ -499,9 +645,7 @@ def dataFetchTimeSpan():
     timeSpan = request.get_json().get('timeSpan')
     if timeSpan is None:
         return jsonify({'error': 'Missing required parameter'}), 400
-    global timeSpanDataFetching 
-    timeSpanDataFetching = timeSpan
-    return jsonify({'status': 'Pump time set to {}'.format(timeSpan)})
+    return jsonify({'status': 'Time span is passed with every /data request, ignoring {}'.format(timeSpan)})
 
 
 
@@ -568,27 +712,30 @@ def pump_once():
     return jsonify({'status': 'Pump activated'})
 
 @app.route('/data/now')
+@conditional_get(lambda: (sample_store.version, sample_store.is_stale()))
 def data_now():
-    if not databaseAlive or not sensorsAlive:
+    sample = sample_store.fresh()
+    if sample is None:
         return ''
 
-    conn = mysql.connector.connect(**db_config)
-    cursor = conn.cursor()
+    # same shape as the former "newest row" query result
+    return jsonify([[sample.temperature, sample.humidity, sample.co2]])
 
-    query = """
-    SELECT temperature_c, humidity, eco2
-    FROM measurements
-    WHERE timestamp >= DATE_SUB(NOW(), INTERVAL 24 HOUR)
-    ORDER BY timestamp DESC
-    LIMIT 1;
-    """
-    cursor.execute(query)
-    results = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return jsonify(results)
+@app.route('/system/database')
+def get_database_stats():
+    return jsonify(dict(storage.stats(), data_cache=data_cache.stats()))
+
+@app.route('/system/liveness')
+def get_liveness():
+    return jsonify(liveness.status())
+
+# queue depth, dropped samples and latency from the sensor reading to the commit
+@app.route('/system/writer')
+def get_writer_stats():
+    return jsonify(sensorData.sample_queue.stats())
 
 @app.route('/system/warnings')
+@conditional_get(lambda: systemHealth.version)
 def get_warnings():
     warnings = systemHealth.get_active_warnings()
     warnings_data = [{
@@ -599,6 +746,7 @@ def get_warnings():
     return jsonify(warnings_data)
 
 @app.route('/system/errors')
+@conditional_get(lambda: systemHealth.version)
 def get_errors():
     errors = systemHealth.get_active_errors()
     errors_data = [{
@@ -608,16 +756,29 @@ def get_errors():
     } for error in errors]
     return jsonify(errors_data)
 
-def run_scheduler(scheduler):
-    try:
-        scheduler.run()
-    except Exception as e:
-        logging.error(f"[run_scheduler] Scheduler error: {e}")
+# Timers of all periodic jobs run in one event loop, the jobs in a small thread pool
+runtime = Runtime(control_workers=4, io_workers=3)
 
-sensorData = SensorDataLogger(use_dht22=False, use_scd41=True, use_ccs811=False)
+@app.route('/system/jobs')
+def get_jobs():
+    # start lag, duration and overruns of every job, ?buckets=1 adds the histogram buckets
+    return jsonify(runtime.jobs(buckets=request.args.get('buckets') == '1'))
+
+@app.route('/system/bus')
+def get_sample_bus():
+    return jsonify(sample_bus.stats())
+
+# an hour of samples is buffered while the database is slow, then the queue policy applies
+sample_queue = SampleQueue(maxsize=720, policy=(load_config().get('Storage') or {}).get('writeQueuePolicy', DROP_OLDEST))
+sensorData = SensorDataLogger(use_dht22=False, use_scd41=True, use_ccs811=False, storage=storage, sample_store=sample_store, ring_buffer=ring_buffer, trend_estimator=trend_estimator, sample_queue=sample_queue, liveness=liveness)
     
 mqtt_interface = MQTT_Interface("localhost", 1883, "drow_mqtt", "drow4mqtt")
 
+@app.route('/system/mqtt')
+def get_mqtt_commands():
+    # published and suppressed (repeated) socket commands
+    return jsonify(mqtt_interface.command_stats())
+
 
 
 def start_sensor_data_logger():
@@ -647,12 +808,6 @@ if __name__ == '__main__':
     activateCO2control = config['CO2Control']['activateCO2control']
     activateMQTTinterface = config['MQTTInterface']['activateMQTTinterface']
 
-    scheduler_sensorCheck = sched.scheduler(time.time, time.sleep)
-    scheduler_databaseCheck = sched.scheduler(time.time, time.sleep)
-        
-    scheduler_health = sched.scheduler(time.time, time.sleep)
-    scheduler_camera = sched.scheduler(time.time, time.sleep)
-       
     if enable_camera:
         camera = CameraRecorder()
     else:
@@ -664,24 +819,20 @@ if __name__ == '__main__':
     if plantGeekBackendInUse:
         plantGeekBackend = PlantGeekBackendConnector()
         
-        scheduler_plantGeekBackend = sched.scheduler(time.time, time.sleep)
+        scheduler_plantGeekBackend = runtime.scheduler('plantgeek_data', executor='io')
         scheduler_plantGeekBackend.enter(20, 1, plantGeekBackend.sendDataToPlantGeekBackend, (scheduler_plantGeekBackend,sensorData,mqtt_interface,systemHealth,))
-        plantGeekBackend_thread = threading.Thread(target=run_scheduler, args=(scheduler_plantGeekBackend,))
-        plantGeekBackend_thread.start()
         
-        scheduler_plantGeekBackend2 = sched.scheduler(time.time, time.sleep)
+        scheduler_plantGeekBackend2 = runtime.scheduler('plantgeek_image', executor='io')
         scheduler_plantGeekBackend2.enter(2, 1, plantGeekBackend.sendImageToPlantGeekBackend, (scheduler_plantGeekBackend2,mqtt_interface,camera,))
-        plantGeekBackend_thread2 = threading.Thread(target=run_scheduler, args=(scheduler_plantGeekBackend2,))
-        plantGeekBackend_thread2.start()
                 
-    fridge = Fridge(db_config) 
-    heater = Heater(db_config)
+    fridge = Fridge(db_config, sample_store)
+    heater = Heater(db_config, sample_store, storage, ring_buffer, trend_estimator)
     light = Light(db_config)
     
     activateHumidifier = True
     
     if activateHumidifier:
-        humidifier = Humidifier(db_config)
+        humidifier = Humidifier(db_config, sample_store)
         
     if activateCO2control:
         co2 = CO2()
@@ -695,84 +846,65 @@ if __name__ == '__main__':
     sensor_data_logger_thread.start()
     
 
-    scheduler_sensorCheck.enter(0, 1, check_sensors)
-    scheduler_databaseCheck.enter(0, 1, check_database)
-    
     if activateMQTTinterface:
-        scheduler_mqtt = sched.scheduler(time.time, time.sleep)
-        scheduler_light = sched.scheduler(time.time, time.sleep)
-        scheduler_fridge = sched.scheduler(time.time, time.sleep)
-        scheduler_heater = sched.scheduler(time.time, time.sleep)        
+        scheduler_mqtt = runtime.scheduler('mqtt')
+        scheduler_light = runtime.scheduler('light')
+        # driven by the sample bus, a run should finish before the next sample arrives
+        scheduler_fridge = runtime.scheduler('fridge', budget=5)
+        scheduler_heater = runtime.scheduler('heater', budget=5)
         scheduler_mqtt.enter(0, 1, mqtt_interface.mainloop,(scheduler_mqtt, systemHealth,))
         scheduler_light.enter(0, 1, light.check_time_and_control_light, (scheduler_light,mqtt_interface,))
-        scheduler_fridge.enter(0, 1, fridge.control_fridge, (scheduler_fridge,mqtt_interface,))
-        scheduler_heater.enter(0, 1, heater.control_heater, (scheduler_heater,mqtt_interface,))
+        sample_bus.subscribe('fridge', scheduler_fridge, lambda sample: fridge.control_step(mqtt_interface),
+                             lambda: fridge.safe_mode(mqtt_interface))
+        sample_bus.subscribe('heater', scheduler_heater, lambda sample: heater.control_step(mqtt_interface),
+                             lambda: heater.safe_mode(mqtt_interface))
         
+    scheduler_retention = runtime.scheduler('retention', executor='io')
+    scheduler_retention.enter(60, 1, measurement_retention.run, (scheduler_retention,))
+    scheduler_retention.enter(120, 1, measurement_archiver.run, (scheduler_retention,))
+
+    scheduler_health = runtime.scheduler('health')
     scheduler_health.enter(10, 1, systemHealth.check_status,(scheduler_health, mqtt_interface,sensorData,activateMQTTinterface,)) # 10 seconds delay to allow for bootup
     if enable_camera:
+        scheduler_camera = runtime.scheduler('camera', executor='io')
         scheduler_camera.enter(1, 1, camera.record, (scheduler_camera, mqtt_interface,))
 
     if activateHumidifier:
         print("activating humidifier")
-        scheduler_humidifier = sched.scheduler(time.time, time.sleep)
-        scheduler_humidifier.enter(0,1,humidifier.control_humidifier, (scheduler_humidifier,))
-        humidifier_thread = threading.Thread(target=run_scheduler, args=(scheduler_humidifier,))
-        humidifier_thread.start()
+        scheduler_humidifier = runtime.scheduler('humidifier', budget=5)
+        sample_bus.subscribe('humidifier', scheduler_humidifier, lambda sample: humidifier.control_step(),
+                             humidifier.safe_mode)
         print("done activating humidifier")
     
     if activateCO2control:
-        scheduler_co2 = sched.scheduler(time.time, time.sleep)
-        scheduler_co2.enter(0, 1, co2.control_co2, (scheduler_co2,mqtt_interface,sensorData,))
+        scheduler_co2 = runtime.scheduler('co2', budget=5)
+        sample_bus.subscribe('co2', scheduler_co2, lambda sample: co2.control_step(mqtt_interface, sample.co2),
+                             lambda: co2.safe_mode(mqtt_interface))
 
-    light.turn_light_off(mqtt_interface)
-    if activateCO2control:
-        co2.close_co2_valve(mqtt_interface)
-    fridge.switch_off(mqtt_interface)
+    # the controllers above run on new samples, the watchdog switches them to safe mode if samples stop
+    scheduler_sample_watchdog = runtime.scheduler('sample_watchdog')
+    scheduler_sample_watchdog.enter(sample_bus.timeout, 1, sample_bus.watchdog, (scheduler_sample_watchdog,))
 
-    if activateMQTTinterface:
-        mqtt_thread = threading.Thread(target=run_scheduler, args=(scheduler_mqtt,))
-        fridge_thread = threading.Thread(target=run_scheduler, args=(scheduler_fridge,))
-        heater_thread = threading.Thread(target=run_scheduler, args=(scheduler_heater,))
-        light_thread = threading.Thread(target=run_scheduler, args=(scheduler_light,))
-
-        mqtt_thread.start()
-        fridge_thread.start()
-        heater_thread.start()
-        light_thread.start()
-        
-    if enable_camera:
-        camera_thread = threading.Thread(target=run_scheduler, args=(scheduler_camera,))
-        camera_thread.start()
-    
-    if activateCO2control:
-        threads = [
-            threading.Thread(target=run_scheduler, args=(scheduler_sensorCheck,)),
-            threading.Thread(target=run_scheduler, args=(scheduler_databaseCheck,)),
-            threading.Thread(target=run_scheduler, args=(scheduler_health,)),
-            threading.Thread(target=run_scheduler, args=(scheduler_co2,))
-        ]
-    else:
-        threads = [
-            threading.Thread(target=run_scheduler, args=(scheduler_sensorCheck,)),
-            threading.Thread(target=run_scheduler, args=(scheduler_databaseCheck,)),
-            threading.Thread(target=run_scheduler, args=(scheduler_health,)),
-        ]
-
-    for thread in threads:
-        thread.start()
+    # timing percentiles of all jobs in the log every 15 minutes
+    scheduler_job_summary = runtime.scheduler('job_summary')
+    scheduler_job_summary.enter(900, 1, runtime.log_summary, (scheduler_job_summary, 900,))
 
     if plantGeekBackendInUse:   
         # Add health warning reporting scheduler
-        scheduler_health_warning = sched.scheduler(time.time, time.sleep)
+        scheduler_health_warning = runtime.scheduler('plantgeek_warnings', executor='io')
         scheduler_health_warning.enter(2, 1, plantGeekBackend.sendWarningsToBackend, (scheduler_health_warning, systemHealth,))
-        health_warning_thread = threading.Thread(target=run_scheduler, args=(scheduler_health_warning,))
-        health_warning_thread.start()
 
         # Existing schedulers
-        scheduler_health_reporting = sched.scheduler(time.time, time.sleep)
+        scheduler_health_reporting = runtime.scheduler('plantgeek_errors', executor='io')
         scheduler_health_reporting.enter(2, 1, plantGeekBackend.sendHealthErrorsToBackend, (scheduler_health_reporting, systemHealth,))
-        health_reporting_thread = threading.Thread(target=run_scheduler, args=(scheduler_health_reporting,))
-        health_reporting_thread.start()
+
+    light.turn_light_off(mqtt_interface)
+    if activateCO2control:
+        co2.close_co2_valve(mqtt_interface)
+    fridge.switch_off(mqtt_interface)
+
+    # all jobs entered above start now
+    runtime.start()
 
     @app.route('/getDeviceConfig')
     def get_device_config():
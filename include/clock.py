@@ -0,0 +1,43 @@
+import datetime
+import time
+
+
+class SystemClock:
+    """Wall clock, the default of every controller"""
+    def time(self):
+        return time.time()
+
+    def now(self):
+        return datetime.datetime.now()
+
+    def monotonic(self):
+        return time.monotonic()
+
+
+SYSTEM_CLOCK = SystemClock()
+
+
+class VirtualClock:
+    """
+    Clock which only moves when advanced, for replaying recorded or synthetic
+    traces through the controllers faster than real time
+    """
+    def __init__(self, start=None):
+        self._now = time.time() if start is None else float(start)
+
+    def time(self):
+        return self._now
+
+    def now(self):
+        return datetime.datetime.fromtimestamp(self._now)
+
+    def monotonic(self):
+        return self._now
+
+    def advance(self, seconds):
+        self._now += seconds
+
+    def set(self, timestamp):
+        if timestamp < self._now:
+            raise ValueError("virtual time cannot go backwards")
+        self._now = float(timestamp)
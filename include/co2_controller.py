@@ -19,16 +19,23 @@ class CO2:
         mqtt_interface.setCO2State(False)
         
     def control_co2(self, sc, mqtt_interface, sensorData):
-        if sensorData.currentCO2 is None:
+        # polling mode, the sample bus calls control_step() once per new sample instead
+        self.control_step(mqtt_interface, sensorData.currentCO2)
+        sc.enter(5, 1, self.control_co2, (sc,mqtt_interface,sensorData,))
+
+    def control_step(self, mqtt_interface, co2):
+        if co2 is None:
             # print('CO2 data not ready yet')
-            sc.enter(5, 1, self.control_co2, (sc,mqtt_interface,sensorData,))
             return
                 
-        if sensorData.currentCO2 < self.co2_target_value:
+        if co2 < self.co2_target_value:
             self.open_co2_valve(mqtt_interface)
-        elif sensorData.currentCO2 > self.co2_target_value + self.co2_hysteresis:
+        elif co2 > self.co2_target_value + self.co2_hysteresis:
             self.close_co2_valve(mqtt_interface)
-        sc.enter(5, 1, self.control_co2, (sc,mqtt_interface,sensorData,))
+
+    def safe_mode(self, mqtt_interface):
+        # no sensor samples, do not keep dosing blindly
+        self.close_co2_valve(mqtt_interface)
            
     def co2_activateForTime(self, state, openTime, mqtt_interface):
         if state:
@@ -0,0 +1,107 @@
+"""
+Columnar encoding of time series rows for the chart endpoints.
+
+Instead of a JSON list of row tuples every column is sent as one typed array:
+analog values as little-endian float32 (missing values as NaN) and on/off
+states packed into bits (least significant bit first). Timestamps need more
+precision than float32 and are sent as float64. Two containers are
+supported:
+
+- COLUMNAR_MIMETYPE, a raw buffer
+      b'PGC1', uint32 rows, uint32 columns
+      per column: uint32 type, uint32 byte length, data padded to 4 bytes
+- MSGPACK_MIMETYPE, {'rows': n, 'types': [...], 'columns': [bytes, ...]}
+  (only if the optional msgpack package is installed)
+
+The browser can view the float32 data directly as a Float32Array without parsing.
+"""
+import struct
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+COLUMNAR_MIMETYPE = 'application/vnd.plantgeek.columnar'
+MSGPACK_MIMETYPE = 'application/msgpack'
+JSON_MIMETYPE = 'application/json'
+
+MAGIC = b'PGC1'
+COLUMN_FLOAT32 = 0
+COLUMN_BITS = 1
+COLUMN_FLOAT64 = 2
+
+
+def supported_mimetypes():
+    """Response types in order of preference if the client accepts several"""
+    mimetypes = [JSON_MIMETYPE, COLUMNAR_MIMETYPE]
+    if msgpack is not None:
+        mimetypes.append(MSGPACK_MIMETYPE)
+    return mimetypes
+
+
+def column_types(column_count, bit_columns=(), float64_columns=()):
+    types = []
+    for i in range(column_count):
+        if i in bit_columns:
+            types.append(COLUMN_BITS)
+        elif i in float64_columns:
+            types.append(COLUMN_FLOAT64)
+        else:
+            types.append(COLUMN_FLOAT32)
+    return types
+
+
+def encode_columns(rows, types):
+    """Encode a list of row tuples into one bytes object per column"""
+    columns = []
+    for index, column_type in enumerate(types):
+        values = [row[index] for row in rows]
+        if column_type == COLUMN_BITS:
+            bits = np.fromiter((1 if v else 0 for v in values), dtype=np.uint8, count=len(values))
+            columns.append(np.packbits(bits, bitorder='little').tobytes())
+        else:
+            dtype = '<f8' if column_type == COLUMN_FLOAT64 else '<f4'
+            floats = np.fromiter((np.nan if v is None else v for v in values), dtype=dtype, count=len(values))
+            columns.append(floats.tobytes())
+    return columns
+
+
+def encode_columnar(rows, types):
+    columns = encode_columns(rows, types)
+    parts = [MAGIC, struct.pack('<II', len(rows), len(types))]
+    for column_type, data in zip(types, columns):
+        parts.append(struct.pack('<II', column_type, len(data)))
+        parts.append(data)
+        parts.append(b'\0' * (-len(data) % 4))  # keeps the next float32 array aligned
+    return b''.join(parts)
+
+
+def encode_msgpack(rows, types):
+    return msgpack.packb({
+        'rows': len(rows),
+        'types': list(types),
+        'columns': encode_columns(rows, types),
+    }, use_bin_type=True)
+
+
+def decode_columnar(buffer):
+    """Inverse of encode_columnar, returns a list of columns (lists of floats / 0/1)"""
+    if buffer[:4] != MAGIC:
+        raise ValueError('not a columnar buffer')
+    row_count, column_count = struct.unpack_from('<II', buffer, 4)
+    offset = 12
+    columns = []
+    for _ in range(column_count):
+        column_type, length = struct.unpack_from('<II', buffer, offset)
+        offset += 8
+        data = buffer[offset:offset + length]
+        offset += length + (-length % 4)
+        if column_type == COLUMN_BITS:
+            bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8), bitorder='little')[:row_count]
+            columns.append(bits.tolist())
+        else:
+            dtype = '<f8' if column_type == COLUMN_FLOAT64 else '<f4'
+            columns.append(np.frombuffer(data, dtype=dtype).tolist())
+    return columns
@@ -0,0 +1,23 @@
+import hashlib
+from functools import wraps
+from flask import request, Response, make_response
+
+
+# ETag from a version of the data behind the route. If the client's copy is still current it gets
+# 304 Not Modified and the view (and its database queries) is not executed.
+def conditional_get(version):
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            # query string and Accept header select different representations of the same data
+            key = repr((version(), request.full_path, request.headers.get('Accept')))
+            etag = hashlib.sha1(key.encode()).hexdigest()
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'  # always revalidate, polling must see new data
+            return response
+        return decorated
+    return decorator
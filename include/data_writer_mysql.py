@@ -1,15 +1,23 @@
 import time
+import threading
+import dataclasses
 import adafruit_dht
 import board
 import busio
 from adafruit_ccs811 import CCS811
 import adafruit_scd4x
-import mysql.connector
-from mysql.connector import Error
 import logging
 import importlib.util
 import sys
 import os
+from include.database_pool import DatabasePool, DEFAULT_DB_CONFIG
+from include.measurement_storage import MySQLStorage
+from include.sensor_sample_store import LatestSampleStore, SensorSample
+from include.measurement_spool import MeasurementSpool
+from include.ring_buffer import SampleRingBuffer
+from include.trend_estimator import TrendEstimator
+from include.sample_queue import SampleQueue
+from include.liveness import LivenessTracker
 
 def get_scd4x_class():
     """Dynamically choose between real and mock sensor based on environment"""
@@ -23,14 +31,24 @@ def get_scd4x_class():
         return adafruit_scd4x.SCD4X
 
 class SensorDataLogger:
-    def __init__(self, use_dht22=False, use_scd41=True, use_ccs811=False):
+    def __init__(self, use_dht22=False, use_scd41=True, use_ccs811=False, storage=None, sample_store=None,
+                 batch_size=12, flush_interval=20.0, spool=None, ring_buffer=None, trend_estimator=None,
+                 sample_queue=None, sample_interval=5.0, liveness=None):
         self.use_dht22 = use_dht22
         self.use_scd41 = use_scd41
         self.use_ccs811 = use_ccs811
-        self.mysql_error_logged = False
+        self.storage_error_logged = False
         self.sensor_error_logged = False
-        self.db = None
-        self.cursor = None
+        # MySQL or SQLite, see include/measurement_storage.py
+        self.storage = storage if storage is not None else MySQLStorage(DatabasePool(DEFAULT_DB_CONFIG))
+        self.storage_ready = False
+        # latest reading for the controllers, they do not need to query the database
+        self.sample_store = sample_store if sample_store is not None else LatestSampleStore()
+        # recent history for charts and trend detection, the database is only read for older ranges
+        self.ring_buffer = ring_buffer if ring_buffer is not None else SampleRingBuffer()
+        self.ringBufferWarmed = False
+        # running trends of the signals registered by the controllers
+        self.trend_estimator = trend_estimator if trend_estimator is not None else TrendEstimator()
         self.i2c = busio.I2C(board.SCL, board.SDA)
         self.sensor = None
         self.dht_device = None
@@ -42,33 +60,65 @@ class SensorDataLogger:
         self.dht22Temprature = None
         self.dht22Humidity = None
 
+        # the sensors are read at a fixed rate, independent of how long the database takes
+        self.sample_interval = sample_interval
+        # samples are handed to the writer thread, which writes one multi-row INSERT per batch
+        self.sample_queue = sample_queue if sample_queue is not None else SampleQueue()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.writer_thread = None
+        # sensor readings and commits are reported as heartbeats, the web app does not poll for them
+        self.liveness = liveness if liveness is not None else LivenessTracker()
+        # rows which could not be written are kept on disk until the database is back
+        self.spool = spool if spool is not None else MeasurementSpool()
+        self.replay_batch_size = 500
+        self.reconnect_interval = 10
+        self.last_connect_attempt = 0
+        # incremented after every commit of new measurements, used as cache validator by the web app
+        self.write_version = 0
+
         logging.basicConfig(filename='logs/data_writer.log', filemode='a', format='%(asctime)s - %(message)s', level=logging.INFO)
 
-    def connect_to_mysql(self):
-        while True:
-            try:
-                self.db = mysql.connector.connect(
-                    host="localhost",
-                    user="drow",
-                    password="drowBox4ever",
-                    database="sensor_data"
-                )
-                if self.db.is_connected():
-                    db_info = self.db.get_server_info()
-                    logging.info("Connected to MySQL Server version %s", db_info)
-                    if self.mysql_error_logged:
-                        logging.info("MySQL connection restored, system is healthy again.")
-                        self.mysql_error_logged = False
-                    break
-
-            except Error as e:
-                if not self.mysql_error_logged:
-                    logging.error("Error while connecting to MySQL %s", str(e))
-                    self.mysql_error_logged = True
-                time.sleep(5)  # wait for 5 seconds before re-trying to connect
-
-        self.cursor = self.db.cursor()
+    def connect_to_storage(self):
+        """Single attempt to reach the database, returns False instead of blocking the sensor loop"""
+        self.last_connect_attempt = time.time()
+        try:
+            self.storage.ensure_schema()
+            if not self.ringBufferWarmed:
+                self.warm_ring_buffer()
+        except self.storage.Error as e:
+            self.liveness.failure('database', e)
+            if not self.storage_error_logged:
+                logging.error("Error while connecting to the %s database: %s", self.storage.dialect, str(e))
+                self.storage_error_logged = True
+            return False
+
+        logging.info("Connected to the %s database", self.storage.dialect)
+        self.liveness.heartbeat('database')
+        if self.storage_error_logged:
+            logging.info("Database connection restored, system is healthy again.")
+            self.storage_error_logged = False
+        self.storage_ready = True
+        return True
 
+    def warm_ring_buffer(self):
+        """Load the part of the ring buffer's span which was recorded before this process started"""
+        since = time.time() - self.ring_buffer.span
+        rows = [(float(row[7]),) + tuple(row[:7]) for row in self.storage.fetch_window(since)]
+        self.ring_buffer.load_history(rows, since)
+        # the trend estimator only keeps its own window, older rows are dropped by it
+        if self.lastTimestamp is None:
+            for row in rows:
+                self.trend_estimator.add_sample(row[0], temperature=row[1], humidity=row[2], co2=row[3])
+        self.ringBufferWarmed = True
+        logging.info("Loaded %d measurements into the ring buffer", len(rows))
+
+    def ensure_storage(self):
+        if self.storage_ready:
+            return True
+        if time.time() - self.last_connect_attempt < self.reconnect_interval:
+            return False
+        return self.connect_to_storage()
    
     def read_sensor_data_dht22(self):
         try:
@@ -88,9 +138,51 @@ class SensorDataLogger:
                 self.sensor_error_logged = True
             return
 
-    def insert_data_to_db(self, data):
-        query = "INSERT INTO measurements (temperature_c, humidity, eco2, light_state, fridge_state,co2_state, heater_state) VALUES (%s, %s, %s, %s, %s, %s, %s)"
-        self.cursor.execute(query, data)
+    def replay_spool(self):
+        """Write spooled rows in the order they were recorded"""
+        if self.spool.pending() == 0:
+            return
+        replayed = self.spool.replay(self.storage, self.replay_batch_size)
+        if replayed:
+            self.write_version += 1
+        logging.info("Replayed %d spooled measurements", replayed)
+
+    def flush(self, samples):
+        rows = [dataclasses.astuple(sample) for sample in samples]
+        if not self.ensure_storage():
+            self.spool.append(rows)
+            return
+        try:
+            # older spooled rows go first, so the table stays in recording order
+            self.replay_spool()
+            self.storage.insert_rows(rows)
+            self.write_version += 1
+            self.sample_queue.record_latency(samples)
+            self.liveness.heartbeat('database')
+        except self.storage.Error as e:
+            self.liveness.failure('database', e)
+            if not self.storage_error_logged:
+                logging.error("Error while writing measurements, spooling to disk: %s", str(e))
+                self.storage_error_logged = True
+            self.storage_ready = False
+            self.spool.append(rows)
+
+    def write_loop(self):
+        """Writer thread, drains the sample queue in batches"""
+        self.connect_to_storage()
+        while True:
+            samples = self.sample_queue.get_batch(self.batch_size, self.flush_interval)
+            if not samples:
+                continue
+            try:
+                self.flush(samples)
+            except Exception as e:
+                logging.error(f"Error in writer loop: {str(e)}")
+
+    def start_writer(self):
+        if self.writer_thread is None:
+            self.writer_thread = threading.Thread(target=self.write_loop, name='measurement-writer', daemon=True)
+            self.writer_thread.start()
 
     def initialize_sensors(self):
         max_retries = 3
@@ -117,16 +209,26 @@ class SensorDataLogger:
                     logging.error("Failed to initialize sensors after all retries")
                     return False
 
+    def record_sample(self, sample):
+        """
+        Hand a new reading to its consumers. Publishing to the sample store runs the
+        controllers right away, so the ring buffer and trend estimator are updated first.
+        """
+        self.ring_buffer.append((sample.timestamp, sample.temperature, sample.humidity, sample.co2,
+                                 sample.light_state, sample.fridge_state, sample.co2_state, sample.heater_state))
+        self.trend_estimator.add_sample(sample.timestamp, temperature=sample.temperature,
+                                        humidity=sample.humidity, co2=sample.co2)
+        self.sample_store.publish(sample)
+        self.sample_queue.put(sample)
+        self.liveness.heartbeat('sensors')
+
     def run(self, mqtt_interface):
-        self.connect_to_mysql()
+        self.start_writer()
         sensor_init_success = self.initialize_sensors()
-        data_available = False
-        
+        next_sample = time.monotonic()
+
         while True:
             try:
-                if not self.db.is_connected():
-                    self.connect_to_mysql()
-                
                 if not sensor_init_success:
                     logging.error("Attempting sensor reinitialization...")
                     sensor_init_success = self.initialize_sensors()
@@ -143,17 +245,18 @@ class SensorDataLogger:
                             self.lastTimestamp = time.time()
                             
                             data = (
-                                self.scd4x.temperature,
-                                self.scd4x.relative_humidity,
-                                self.scd4x.CO2,
+                                self.currentTemperature,
+                                self.currentHumidity,
+                                self.currentCO2,
                                 mqtt_interface.getLightState(),
                                 mqtt_interface.getFridgeState(),
                                 mqtt_interface.getCO2State(),
                                 mqtt_interface.getHeaterState(),
                             )
-                            data_available = True
+                            self.record_sample(SensorSample(self.lastTimestamp, *data))
                     except (RuntimeError, OSError) as e:
                         logging.error(f"I2C error: {str(e)}")
+                        self.liveness.failure('sensors', e)
                         # Reset the sensor connection
                         sensor_init_success = False
                         self.currentTemperature = None
@@ -162,13 +265,15 @@ class SensorDataLogger:
                         time.sleep(5)
                         continue
 
-                if data_available:
-                    self.insert_data_to_db(data)
-                    self.db.commit()
-                    data_available = False
+                # fixed rate: the next reading is due one interval after the previous one was due,
+                # if a read took longer than that the cadence restarts from now instead of bursting
+                next_sample += self.sample_interval
+                delay = next_sample - time.monotonic()
+                if delay < 0:
+                    next_sample = time.monotonic()
+                    delay = 0
+                time.sleep(delay)
 
-                time.sleep(5.0)
-                
             except Exception as e:
                 logging.error(f"Error in main loop: {str(e)}")
                 time.sleep(5)
@@ -0,0 +1,216 @@
+import threading
+import time
+from contextlib import contextmanager
+import mysql.connector
+from mysql.connector import errors
+
+
+# Credentials created by setup.sh
+DEFAULT_DB_CONFIG = {
+    'host': 'localhost',
+    'user': 'drow',
+    'password': 'drowBox4ever',
+    'database': 'sensor_data'
+}
+
+
+class DatabasePoolTimeout(errors.PoolError):
+    """Raised if no connection could be checked out within the checkout timeout"""
+    pass
+
+
+class DatabasePool:
+    """
+    Shared MySQL connection pool
+
+    One instance is shared by the web app, the data writer and the controllers,
+    so the database is not asked for a new TCP connection + authentication on
+    every query.
+
+    - at most pool_size connections are open at the same time
+    - a checkout blocks for up to checkout_timeout seconds if all connections
+      are in use, then DatabasePoolTimeout (a mysql.connector.Error) is raised
+    - connections older than recycle_time are closed and replaced on checkout
+    - connections idle for more than ping_after seconds are pinged before reuse
+    - connections which raised a database error are discarded
+
+    Connections are opened lazily, so creating the pool does not need a running
+    database server.
+
+    If a LivenessTracker is passed, every connection returned without an error
+    counts as a heartbeat of the database, failed connects and queries as failures.
+    """
+    def __init__(self, db_config, pool_size=5, checkout_timeout=5.0, recycle_time=1800, ping_after=30.0,
+                 liveness=None, liveness_name='database'):
+        self.db_config = db_config
+        self.pool_size = pool_size
+        self.checkout_timeout = checkout_timeout
+        self.recycle_time = recycle_time
+        self.ping_after = ping_after
+        self.liveness = liveness
+        self.liveness_name = liveness_name
+
+        self._condition = threading.Condition()
+        self._idle = []  # (connection, last used), used as a stack so warm connections are reused first
+        self._created_at = {}
+        self._open = 0
+
+        # statistics
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.connections_created = 0
+        self.connections_recycled = 0
+        self.connections_discarded = 0
+
+    def _connect(self):
+        conn = mysql.connector.connect(**self.db_config)
+        with self._condition:
+            self._created_at[id(conn)] = time.monotonic()
+            self.connections_created += 1
+        return conn
+
+    def _close_quietly(self, conn):
+        with self._condition:
+            self._created_at.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_usable(self, conn, last_used):
+        now = time.monotonic()
+        created = self._created_at.get(id(conn), now)
+        if now - created > self.recycle_time:
+            return False
+        if now - last_used > self.ping_after:
+            # is_connected() pings the server and fails for dropped connections
+            try:
+                return conn.is_connected()
+            except Exception:
+                return False
+        return True
+
+    def acquire(self, timeout=None):
+        """Check out a connection, it must be returned with release()"""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        waited = False
+        conn = None
+
+        with self._condition:
+            while True:
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._open < self.pool_size:
+                    self._open += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise DatabasePoolTimeout(
+                        msg=f"No database connection available within {timeout:.1f} seconds")
+                waited = True
+                self._condition.wait(remaining)
+
+            wait_time = time.monotonic() - start
+            self.checkouts += 1
+            if waited:
+                self.waits += 1
+                self.total_wait_time += wait_time
+                self.max_wait_time = max(self.max_wait_time, wait_time)
+
+        if conn is not None and not self._is_usable(conn, last_used):
+            self._close_quietly(conn)
+            with self._condition:
+                self.connections_recycled += 1
+            conn = None
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception as e:
+                if self.liveness is not None:
+                    self.liveness.failure(self.liveness_name, e)
+                with self._condition:
+                    self._open -= 1
+                    self._condition.notify()
+                raise
+        return conn
+
+    def release(self, conn, discard=False):
+        """Return a connection to the pool, broken connections should be discarded"""
+        if not discard:
+            try:
+                # end the implicit transaction, otherwise the next user reads an old snapshot
+                if conn.in_transaction:
+                    conn.rollback()
+            except Exception:
+                discard = True
+
+        if discard:
+            self._close_quietly(conn)
+            with self._condition:
+                self._open -= 1
+                self.connections_discarded += 1
+                self._condition.notify()
+            return
+
+        with self._condition:
+            self._idle.append((conn, time.monotonic()))
+            self._condition.notify()
+        if self.liveness is not None:
+            self.liveness.heartbeat(self.liveness_name)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        conn = self.acquire(timeout)
+        discard = False
+        try:
+            yield conn
+        except mysql.connector.Error as e:
+            discard = True
+            if self.liveness is not None:
+                self.liveness.failure(self.liveness_name, e)
+            raise
+        finally:
+            self.release(conn, discard)
+
+    def fetchall(self, query, params=None):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(query, params)
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+
+    def fetchone(self, query, params=None):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(query, params)
+                return cursor.fetchone()
+            finally:
+                cursor.close()
+
+    def stats(self):
+        with self._condition:
+            return {
+                'pool_size': self.pool_size,
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': self._open - len(self._idle),
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+                'avg_wait_ms': 1000.0 * self.total_wait_time / self.waits if self.waits else 0.0,
+                'max_wait_ms': 1000.0 * self.max_wait_time,
+                'connections_created': self.connections_created,
+                'connections_recycled': self.connections_recycled,
+                'connections_discarded': self.connections_discarded,
+            }
@@ -0,0 +1,115 @@
+"""
+Downsampling of measurement rows for the history charts.
+
+The /data endpoint can return tens of thousands of rows for long timespans,
+far more than a chart can display. The helpers in here reduce a series to a
+point budget while keeping its visual shape:
+
+- analog columns (temperature, humidity, eco2) use Largest-Triangle-Three-Buckets
+- state columns (light, fridge, co2, heater) keep the maximum of every bucket,
+  so short switching pulses do not disappear from the chart
+"""
+
+MEASUREMENT_ANALOG_COLUMNS = (0, 1, 2)
+MEASUREMENT_STATE_COLUMNS = (3, 4, 5, 6)
+
+
+def _as_float(value):
+    # NULL values from the database are treated as zero for the area computation only
+    return 0.0 if value is None else float(value)
+
+
+def bucket_bounds(length, points):
+    """
+    Split the inner points of a series into points-2 buckets.
+    The first and the last point always form a bucket of their own.
+    Returns a list of (start, end) index tuples, end exclusive.
+    """
+    bounds = [(0, 1)]
+    every = (length - 2) / (points - 2)
+    for i in range(points - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        bounds.append((start, min(end, length - 1)))
+    bounds.append((length - 1, length))
+    return bounds
+
+
+def lttb_indices(values, bounds):
+    """
+    Largest-Triangle-Three-Buckets selection for an evenly spaced series.
+    Returns one index per bucket in bounds.
+    """
+    selected = [0]
+    a = 0
+    for bucket in range(1, len(bounds) - 1):
+        start, end = bounds[bucket]
+        next_start, next_end = bounds[bucket + 1]
+
+        # average of the next bucket is the third point of the triangle
+        next_count = next_end - next_start
+        avg_x = (next_start + next_end - 1) / 2.0
+        avg_y = sum(_as_float(values[i]) for i in range(next_start, next_end)) / next_count
+
+        a_y = _as_float(values[a])
+        max_area = -1.0
+        max_index = start
+        for i in range(start, end):
+            area = abs((a - avg_x) * (_as_float(values[i]) - a_y) - (a - i) * (avg_y - a_y))
+            if area > max_area:
+                max_area = area
+                max_index = i
+        selected.append(max_index)
+        a = max_index
+    selected.append(bounds[-1][0])
+    return selected
+
+
+def bucket_max(values, bounds):
+    """Maximum of every bucket, ignoring NULL values."""
+    result = []
+    for start, end in bounds:
+        bucket_values = [v for v in values[start:end] if v is not None]
+        result.append(max(bucket_values) if bucket_values else None)
+    return result
+
+
+def downsample_rows(rows, points, analog_columns=MEASUREMENT_ANALOG_COLUMNS, state_columns=MEASUREMENT_STATE_COLUMNS):
+    """
+    Reduce a list of row tuples to at most `points` rows.
+
+    Every analog column is downsampled with LTTB and every state column with a
+    bucket maximum. All columns share the same bucket boundaries, so the n-th
+    output row always describes the same slice of time. Columns which are
+    neither analog nor state (e.g. timestamps) are taken from the row that was
+    selected for the first analog column.
+    """
+    if points is None or len(rows) <= points or points < 3:
+        return list(rows)
+
+    bounds = bucket_bounds(len(rows), points)
+    columns = list(zip(*rows))
+    column_count = len(columns)
+
+    output_columns = [None] * column_count
+    reference_indices = None
+    for column in analog_columns:
+        if column >= column_count:
+            continue
+        indices = lttb_indices(columns[column], bounds)
+        if reference_indices is None:
+            reference_indices = indices
+        output_columns[column] = [columns[column][i] for i in indices]
+
+    if reference_indices is None:
+        reference_indices = [start for start, _ in bounds]
+
+    for column in state_columns:
+        if column < column_count:
+            output_columns[column] = bucket_max(columns[column], bounds)
+
+    for column in range(column_count):
+        if output_columns[column] is None:
+            output_columns[column] = [columns[column][i] for i in reference_indices]
+
+    return list(zip(*output_columns))
@@ -1,6 +1,7 @@
 import datetime
 import logging
-import mysql.connector
+from include.sensor_sample_store import SENSOR_VALUE_MISSING, SENSOR_VALUE_STALE
+from include.clock import SYSTEM_CLOCK
 from enum import Enum
 
 class ControlMode(Enum):
@@ -9,10 +10,12 @@ class ControlMode(Enum):
     
 
 class Fridge:
-    def __init__(self, db_config):
+    def __init__(self, db_config, sample_store, clock=SYSTEM_CLOCK):
+        self.clock = clock
         self.is_on = False
         self.off_time = None
         self.db_config = db_config
+        self.sample_store = sample_store
         self.controlTemperatureNight = 17.5
         self.controlTemperatureDay = 25.0
         self.temperatureHysteresis = 0.6
@@ -54,30 +57,36 @@ class Fridge:
         
         
     def switch_on(self, mqtt_interface):
-        if self.off_time is None or (datetime.datetime.now() - self.off_time).total_seconds() >= self.timeout:
+        if self.off_time is None or (self.clock.now() - self.off_time).total_seconds() >= self.timeout:
             success = mqtt_interface.setFridgeState(True)        
             if success:
                 self.is_on = True
             
         else:
             print("Fridge cannot be switched on again. It was turned off for less than 1 minute(s).")
-            remaining_time = self.timeout - (datetime.datetime.now() - self.off_time).total_seconds()
+            remaining_time = self.timeout - (self.clock.now() - self.off_time).total_seconds()
             print(f"Please wait for {remaining_time} seconds before switching on again.")
 
     def switch_off(self, mqtt_interface):
         
-        self.off_time = datetime.datetime.now()
+        self.off_time = self.clock.now()
         
         success = mqtt_interface.setFridgeState(False)        
         if success:
             self.is_on = False
         
     def control_fridge(self, sc, mqtt_interface):
+        # polling mode, the sample bus calls control_step() once per new sample instead
+        self.control_step(mqtt_interface)
+        sc.enter(5, 1, self.control_fridge, (sc,mqtt_interface,))
+
+    def control_step(self, mqtt_interface):
         
         if self.controlMode == ControlMode.TEMPERATURE_CONTROL:
             temp = self.get_current_temp()
                     
-            self.sensorChecks(temp, sc, mqtt_interface)      
+            if self.sensorChecks(temp, mqtt_interface):
+                return
             
             if temp > self.controlTemperatureFallbackMaxLevel:
                 # if the temperature is above the fallback temperature we switch on the fridge   
@@ -87,15 +96,14 @@ class Fridge:
                 self.switch_off(mqtt_interface)
             else:
                 # regular operation
-                self.temperature_control(sc, temp, mqtt_interface)
-                
-            sc.enter(5, 1, self.control_fridge, (sc,mqtt_interface,))
+                self.temperature_control(None, temp, mqtt_interface)
         
         elif self.controlMode == ControlMode.HUMIDITY_CONTROL:
             humidity = self.get_current_humidity()
             temp = self.get_current_temp()
             
-            self.sensorChecks(temp, sc, mqtt_interface)     
+            if self.sensorChecks(temp, mqtt_interface):
+                return
             
             if temp > self.controlTemperatureFallbackMaxLevel:
                 # if the temperature is above the fallback temperature we switch on the fridge   
@@ -105,28 +113,22 @@ class Fridge:
                 self.switch_off(mqtt_interface)
             else:
                 # regular operation
-                self.humidity_control(sc, humidity, mqtt_interface)
-                        
-            sc.enter(5, 1, self.control_fridge, (sc,mqtt_interface,))
-            
+                self.humidity_control(None, humidity, mqtt_interface)
             
         else:
             print("Invalid control mode")
-            sc.enter(5, 1, self.control_fridge, (sc,mqtt_interface,))
-            
-                
+
+    def safe_mode(self, mqtt_interface):
+        # no sensor samples, same reaction as for missing or stale data
+        self.switch_off(mqtt_interface)
         
-    def sensorChecks(self, temp, sc, mqtt_interface):
-        if temp == -999:
-            self.switch_off(mqtt_interface)
-            sc.enter(5, 1, self.control_fridge, (sc,mqtt_interface,))
-            
-            return
+    def sensorChecks(self, temp, mqtt_interface):
+        # Returns True if the control cycle has to be skipped because of missing or stale sensor data
+        if temp == SENSOR_VALUE_MISSING or temp == SENSOR_VALUE_STALE:
+            self.safe_mode(mqtt_interface)
+            return True
         
-        if temp == -998:
-            self.switch_off(mqtt_interface)
-            sc.enter(5, 1, self.control_fridge, (sc,mqtt_interface,))
-            return
+        return False
         
     def humidity_control(self, sc, humidity, mqtt_interface):
         if mqtt_interface.getFridgeState() == False:
@@ -193,37 +195,17 @@ class Fridge:
        
         
     def get_current_temp(self):
-
-        conn = mysql.connector.connect(**self.db_config)
-        cursor = conn.cursor()
-
-        query = """
-        SELECT temperature_c
-        FROM measurements
-        WHERE timestamp >= DATE_SUB(NOW(), INTERVAL 24 HOUR)
-        ORDER BY timestamp DESC
-        LIMIT 1;
-        """
-        cursor.execute(query)
-        results = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return results[0][0]
+        sample = self.sample_store.latest()
+        if sample is None:
+            return SENSOR_VALUE_MISSING
+        if self.sample_store.is_stale():
+            return SENSOR_VALUE_STALE
+        return sample.temperature
     
     def get_current_humidity(self):
-
-        conn = mysql.connector.connect(**self.db_config)
-        cursor = conn.cursor()
-
-        query = """
-        SELECT humidity
-        FROM measurements
-        WHERE timestamp >= DATE_SUB(NOW(), INTERVAL 24 HOUR)
-        ORDER BY timestamp DESC
-        LIMIT 1;
-        """
-        cursor.execute(query)
-        results = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return results[0][0]
+        sample = self.sample_store.latest()
+        if sample is None:
+            return SENSOR_VALUE_MISSING
+        if self.sample_store.is_stale():
+            return SENSOR_VALUE_STALE
+        return sample.humidity
@@ -2,6 +2,7 @@ import time
 from datetime import datetime
 from typing import List, Optional
 from .health_monitoring_errors import HealthError, HealthErrorCode, HealthWarningCode, HealthWarning
+from .clock import SYSTEM_CLOCK
 import os
 
 class ControlAccuracyMonitor:
@@ -90,7 +91,9 @@ class ControlAccuracyMonitor:
         return warnings
 
 class HealthMonitor:
-    def __init__(self, config):
+    def __init__(self, config, clock=SYSTEM_CLOCK, check_interval=1):
+        self.clock = clock
+        self.check_interval = check_interval  # seconds between two check_status() runs
         self.systemHealthy = False
         self.systemOverheated = False
         self.initDone = False
@@ -98,15 +101,17 @@ class HealthMonitor:
         # Check if we're in testing mode
         self.testing = os.environ.get('TESTING', '0') == '1'
         # Set timeout based on testing mode
-        self.temperatureFrozenTimeout = 10 if self.testing else 300  # 20s for testing, 5 minutes for production
+        self.temperatureFrozenTimeout = 10 if self.testing else 300  # seconds, 10s for testing, 5 minutes for production
         self.temperatureFrozenCounter = 0
         self.overheatTemperature = 33.5
         self.overheatHysteresis = 1.0
         self.active_errors: List[HealthError] = []
         self.error_history: List[HealthError] = []
         self.warnings = []
+        self._active_warnings = {}  # code -> unresolved warning, self.warnings keeps the history
         self.control_monitor = ControlAccuracyMonitor(config)
         self.debug = False  # Add debug flag
+        self.version = 0  # incremented on every change of the errors and warnings
         
     def set_debug(self, debug_state: bool):
         """Enable or disable debug printing"""
@@ -127,18 +132,20 @@ class HealthMonitor:
         error = HealthError(
             code=code,
             message=message,
-            timestamp=datetime.now()
+            timestamp=self.clock.now()
         )
         self.active_errors.append(error)
         self.error_history.append(error)
+        self.version += 1
         self.debug_print(f"New error added: {code.name} - {message}")
         
     def resolve_error(self, code: HealthErrorCode) -> None:
         for error in self.active_errors:
             if error.code == code and not error.resolved:
                 error.resolved = True
-                error.resolved_timestamp = datetime.now()
+                error.resolved_timestamp = self.clock.now()
                 self.active_errors.remove(error)
+                self.version += 1
                 self.debug_print(f"Error resolved: {code.name}")
 
     def get_active_errors(self) -> List[HealthError]:
@@ -150,38 +157,42 @@ class HealthMonitor:
     def add_warning(self, code: HealthWarningCode, message: str):
         """Add or update a warning"""
         # Check if warning already exists
-        existing_warning = next(
-            (w for w in self.warnings if w.code == code and not w.resolved), 
-            None
-        )
+        existing_warning = self._active_warnings.get(code)
         
         if existing_warning:
-            # Update existing warning with new message and timestamp
-            existing_warning.message = message
-            existing_warning.timestamp = datetime.now()
-            self.debug_print(f"Warning updated: {code.name} - {message}")
+            # Checks re-raise active warnings every second. Only a new message is a change, the
+            # timestamp stays the time the current message was raised, so the /system/warnings
+            # payload and its ETag (self.version) stay the same while nothing changes
+            if existing_warning.message != message:
+                existing_warning.message = message
+                existing_warning.timestamp = self.clock.now()
+                self.version += 1
+                self.debug_print(f"Warning updated: {code.name} - {message}")
             return existing_warning
         else:
             # Create new warning if none exists
             warning = HealthWarning(
                 code=code,
                 message=message,
-                timestamp=datetime.now()
+                timestamp=self.clock.now()
             )
             self.warnings.append(warning)
+            self._active_warnings[code] = warning
+            self.version += 1
             self.debug_print(f"New warning added: {code.name} - {message}")
             return warning
         return existing_warning
 
     def resolve_warning(self, code: HealthWarningCode):
-        for warning in self.warnings:
-            if warning.code == code and not warning.resolved:
-                warning.resolved = True
-                warning.resolved_timestamp = datetime.now()
-                self.debug_print(f"Warning resolved: {code.name}")
+        warning = self._active_warnings.pop(code, None)
+        if warning is not None:
+            warning.resolved = True
+            warning.resolved_timestamp = self.clock.now()
+            self.version += 1
+            self.debug_print(f"Warning resolved: {code.name}")
 
     def get_active_warnings(self):
-        return [w for w in self.warnings if not w.resolved]
+        return list(self._active_warnings.values())
 
     def check_status(self, sc, mqtt_interface, sensorData, zigbeeActivated):
         
@@ -190,7 +201,7 @@ class HealthMonitor:
             self.initDone = True
             self.systemHealthy = True
             self.previousTemperature = sensorData.currentTemperature
-            sc.enter(1, 1, self.check_status, (sc, mqtt_interface, sensorData, zigbeeActivated,))
+            sc.enter(self.check_interval, 1, self.check_status, (sc, mqtt_interface, sensorData, zigbeeActivated,))
             return
         
         
@@ -201,7 +212,7 @@ class HealthMonitor:
                 HealthErrorCode.TEMPERATURE_SENSOR_INVALID,
                 "Temperature sensor data invalid"
             )
-            sc.enter(1, 1, self.check_status, (sc, mqtt_interface, sensorData, zigbeeActivated,))
+            sc.enter(self.check_interval, 1, self.check_status, (sc, mqtt_interface, sensorData, zigbeeActivated,))
             return
         else:
             self.resolve_error(HealthErrorCode.TEMPERATURE_SENSOR_INVALID)
@@ -212,7 +223,7 @@ class HealthMonitor:
                 HealthErrorCode.TIMESTAMP_MISSING,
                 "Sensor data timestamp missing"
             )
-            sc.enter(1, 1, self.check_status, (sc, mqtt_interface, sensorData, zigbeeActivated,))
+            sc.enter(self.check_interval, 1, self.check_status, (sc, mqtt_interface, sensorData, zigbeeActivated,))
             return
         else:
             self.resolve_error(HealthErrorCode.TIMESTAMP_MISSING)
@@ -223,20 +234,20 @@ class HealthMonitor:
                 HealthErrorCode.ZIGBEE_DEVICES_UNHEALTHY,
                 "Zigbee devices not healthy"
             )
-            sc.enter(1, 1, self.check_status, (sc, mqtt_interface, sensorData, zigbeeActivated,))
+            sc.enter(self.check_interval, 1, self.check_status, (sc, mqtt_interface, sensorData, zigbeeActivated,))
             return
         elif zigbeeActivated:
             self.resolve_error(HealthErrorCode.ZIGBEE_DEVICES_UNHEALTHY)
         
         # Check sensor data freshness
-        current_time = time.time()
+        current_time = self.clock.time()
         if sensorData.lastTimestamp and current_time - sensorData.lastTimestamp > 120:
             self.systemHealthy = False
             self.add_error(
                 HealthErrorCode.SENSOR_DATA_NOT_UPDATED,
                 "Sensor data not updated for more than 120 seconds"
             )
-            sc.enter(1, 1, self.check_status, (sc, mqtt_interface, sensorData, zigbeeActivated,))
+            sc.enter(self.check_interval, 1, self.check_status, (sc, mqtt_interface, sensorData, zigbeeActivated,))
             return
         else:
             self.resolve_error(HealthErrorCode.SENSOR_DATA_NOT_UPDATED)
@@ -244,13 +255,13 @@ class HealthMonitor:
         # Detect frozen sensor data
         if sensorData.currentTemperature == self.previousTemperature:
             self.temperatureFrozenCounter += 1
-            if self.temperatureFrozenCounter > self.temperatureFrozenTimeout:
+            if self.temperatureFrozenCounter * self.check_interval > self.temperatureFrozenTimeout:
                 self.systemHealthy = False
                 self.add_error(
                     HealthErrorCode.TEMPERATURE_SENSOR_FROZEN,
                     "Temperature sensor data frozen"
                 )
-                sc.enter(1, 1, self.check_status, (sc, mqtt_interface, sensorData, zigbeeActivated,))
+                sc.enter(self.check_interval, 1, self.check_status, (sc, mqtt_interface, sensorData, zigbeeActivated,))
                 return
         else:
             self.temperatureFrozenCounter = 0
@@ -264,7 +275,7 @@ class HealthMonitor:
                 HealthErrorCode.SYSTEM_OVERHEATED,
                 f"System overheated! Temperature: {sensorData.currentTemperature}°C"
             )
-            sc.enter(1, 1, self.check_status, (sc, mqtt_interface, sensorData, zigbeeActivated,))
+            sc.enter(self.check_interval, 1, self.check_status, (sc, mqtt_interface, sensorData, zigbeeActivated,))
             return
         elif self.systemOverheated and sensorData.currentTemperature < self.overheatTemperature - self.overheatHysteresis:
             self.systemOverheated = False
@@ -307,7 +318,7 @@ class HealthMonitor:
                 self.resolve_warning(code)
 
         # print("System healthy:", self.systemHealthy)
-        sc.enter(1, 1, self.check_status, (sc, mqtt_interface, sensorData, zigbeeActivated,))
+        sc.enter(self.check_interval, 1, self.check_status, (sc, mqtt_interface, sensorData, zigbeeActivated,))
         return
 
     def get_status(self):
@@ -325,6 +336,7 @@ class HealthMonitor:
         # Create a new list with only unresolved errors
         new_history = [error for error in self.error_history if not error.resolved]
         self.error_history = new_history
+        self.version += 1
         
     def print_active_warnings(self):
         """Print all active (unresolved) warnings"""
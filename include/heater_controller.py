@@ -1,6 +1,11 @@
 import datetime
 import logging
-import mysql.connector
+import time
+import numpy as np
+from include.database_pool import DatabasePool
+from include.measurement_storage import MySQLStorage
+from include.sensor_sample_store import SENSOR_VALUE_MISSING, SENSOR_VALUE_STALE
+from include.clock import SYSTEM_CLOCK
 
 # Functionality:
 # The heater should assis
@@ -50,10 +55,19 @@ class Heater:
        - Temperature trend monitoring
        - Regular timeout protection between cycles
     """
-    def __init__(self, db_config):
+    def __init__(self, db_config, sample_store, storage=None, ring_buffer=None, trend_estimator=None, clock=SYSTEM_CLOCK):
+        self.clock = clock
         self.is_on = False
         self.off_time = None
         self.db_config = db_config
+        self.storage = storage if storage is not None else MySQLStorage(DatabasePool(db_config))
+        self.sample_store = sample_store
+        self.ring_buffer = ring_buffer
+        self.trend_minutes = 2
+        # least-squares trend fed by the data writer, without it the trend is read from the ring buffer/database
+        self.trend_estimator = trend_estimator
+        if trend_estimator is not None:
+            trend_estimator.register('temperature', window_seconds=self.trend_minutes * 60)
         self.controlTemperature = 24.5
         self.hysteresis = 0.5
         self.timeout = 30
@@ -73,7 +87,7 @@ class Heater:
         self.hysteresis = float(hysteresis)
         
     def switch_on(self, mqtt_interface):
-        current_time = datetime.datetime.now()
+        current_time = self.clock.now()
         
         # CHECK SWITCH ON ALLOWED
         # Check if we are allowed to switch on (off_time is not none)
@@ -96,7 +110,7 @@ class Heater:
             print("Heater switched ON")
             
     def switch_off(self, mqtt_interface):
-        current_time = datetime.datetime.now()
+        current_time = self.clock.now()
         
         # Check if we're in the initial consideration period
         if self.off_time is None:
@@ -116,7 +130,7 @@ class Heater:
         Check if we should delay the switch on
         Returns True if we should wait, False if we can switch on
         """
-        current_time = datetime.datetime.now()
+        current_time = self.clock.now()
         
         # Start delay if not already started
         if not self.switch_on_delay_active:
@@ -135,17 +149,19 @@ class Heater:
         return False
 
     def control_heater(self, sc, mqtt_interface):
+        # polling mode, the sample bus calls control_step() once per new sample instead
+        self.control_step(mqtt_interface)
+        sc.enter(5, 1, self.control_heater, (sc,mqtt_interface,))
+
+    def safe_mode(self, mqtt_interface):
+        # no sensor samples, same reaction as for missing or stale data
+        self.switch_off(mqtt_interface)
+
+    def control_step(self, mqtt_interface):
         temp = self.get_current_temp()
                 
-        if temp == -999:
-            self.switch_off(mqtt_interface)
-            sc.enter(5, 1, self.control_heater, (sc,mqtt_interface,))
-            
-            return
-        
-        if temp == -998:
-            self.switch_off(mqtt_interface)
-            sc.enter(5, 1, self.control_heater, (sc,mqtt_interface,))
+        if temp == SENSOR_VALUE_MISSING or temp == SENSOR_VALUE_STALE:
+            self.safe_mode(mqtt_interface)
             return
 
         # print(f"temp: {temp}, control temp: {self.controlTemperature}, hysteresis: {self.hysteresis}")
@@ -203,48 +219,48 @@ class Heater:
                     # print("Switching on")
                 else:
                     print("Not supposed to happen!")
-                    
-            
-        sc.enter(5, 1, self.control_heater, (sc,mqtt_interface,))
         
         
     
+    def get_recent_temperatures(self, minutes):
+        """Temperatures of the last n minutes in chronological order"""
+        start = self.clock.time() - minutes * 60
+        if self.ring_buffer is not None and self.ring_buffer.covers(start):
+            temperatures = self.ring_buffer.window(start)['temperature']
+            return temperatures[~np.isnan(temperatures)].tolist()
+        return self.storage.fetch_temperatures(start)
+
+    def get_temperature_change(self, minutes):
+        """
+        Temperature change over the last n minutes, None if there are not enough samples.
+        With a trend estimator this is the least-squares slope times the window, otherwise
+        the difference of the first and the last reading.
+        """
+        if self.trend_estimator is not None:
+            slope = self.trend_estimator.slope_per_minute('temperature')
+            if slope is None:
+                return None
+            return slope * minutes
+
+        results = self.get_recent_temperatures(minutes)
+        if len(results) < 2:  # Need at least 2 points to determine trend
+            return None
+        return results[-1] - results[0]
+
     def is_temperature_falling(self):
         """
         Check if temperature is falling over the last n minutes
         Returns True if falling by at least falling_temp_threshold, False otherwise
         """
-        conn = mysql.connector.connect(**self.db_config)
-        cursor = conn.cursor()
         
-        minutes = 2
+        minutes = self.trend_minutes
                 
-        query = """
-        SELECT temperature_c, timestamp
-        FROM measurements
-        WHERE timestamp >= DATE_SUB(NOW(), INTERVAL %s MINUTE)
-        ORDER BY timestamp ASC;
-        """
-        
-        cursor.execute(query, (minutes,))
-        results = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        
-        
-        if len(results) < 2:  # Need at least 2 points to determine trend
+        temp_diff = self.get_temperature_change(minutes)
+        if temp_diff is None:
             print("Insufficient data points for temperature trend analysis")
             return False
         
-        # Get first and last temperature readings
-        first_temp = results[0][0]
-        last_temp = results[-1][0]
-        
-        # Calculate temperature difference
-        temp_diff = last_temp - first_temp
-        
-        print(f"Temperature trend: {temp_diff:+.2f}°C over last {minutes} minutes "
-              f"(from {first_temp:.1f}°C to {last_temp:.1f}°C)")
+        print(f"Temperature trend: {temp_diff:+.2f}°C over last {minutes} minutes")
         
         print(f"delta needed: {self.falling_temp_threshold * minutes}")
         
@@ -254,59 +270,27 @@ class Heater:
     def is_temperature_rising_faster_than(self, threshold):
         """
         Check if temperature is rising over the last n minutes
-        Returns True if rising faster than threshold [°C/min], False otherwise
+        Returns True if the change over the window exceeds threshold [°C], False otherwise
         """
-        conn = mysql.connector.connect(**self.db_config)
-        cursor = conn.cursor()
         
-        minutes = 2
+        minutes = self.trend_minutes
                 
-        query = """
-        SELECT temperature_c, timestamp
-        FROM measurements
-        WHERE timestamp >= DATE_SUB(NOW(), INTERVAL %s MINUTE)
-        ORDER BY timestamp ASC;
-        """
-        
-        cursor.execute(query, (minutes,))
-        results = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        
-        
-        if len(results) < 2:  # Need at least 2 points to determine trend
+        temp_diff = self.get_temperature_change(minutes)
+        if temp_diff is None:
             print("Insufficient data points for temperature trend analysis")
             return False
         
-        # Get first and last temperature readings
-        first_temp = results[0][0]
-        last_temp = results[-1][0]
-        
-        # Calculate temperature difference
-        temp_diff = last_temp - first_temp
-        
-        print(f"RISING: Temperature trend: {temp_diff:+.2f}°C over last {minutes} minutes "
-              f"(from {first_temp:.1f}°C to {last_temp:.1f}°C)")
+        print(f"RISING: Temperature trend: {temp_diff:+.2f}°C over last {minutes} minutes")
         
         print(f"delta needed: {threshold}")
         
-        # Return True if temperature has decreased by at least the threshold
+        # Return True if temperature has increased by more than the threshold
         return temp_diff > threshold
         
     def get_current_temp(self):
-
-        conn = mysql.connector.connect(**self.db_config)
-        cursor = conn.cursor()
-
-        query = """
-        SELECT temperature_c
-        FROM measurements
-        WHERE timestamp >= DATE_SUB(NOW(), INTERVAL 24 HOUR)
-        ORDER BY timestamp DESC
-        LIMIT 1;
-        """
-        cursor.execute(query)
-        results = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return results[0][0]
\ No newline at end of file
+        sample = self.sample_store.latest()
+        if sample is None:
+            return SENSOR_VALUE_MISSING
+        if self.sample_store.is_stale():
+            return SENSOR_VALUE_STALE
+        return sample.temperature
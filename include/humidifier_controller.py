@@ -1,18 +1,21 @@
 import datetime
 import logging
-import mysql.connector
 from enum import Enum
 from gpiozero import LED
+from include.clock import SYSTEM_CLOCK
 
 class Humidifier:
-    def __init__(self, db_config):
+    def __init__(self, db_config, sample_store, output=None, clock=SYSTEM_CLOCK):
+        self.clock = clock
         self.is_on = False
         self.off_time = None
         self.db_config = db_config
+        self.sample_store = sample_store
         self.controlHumidity = 45
         self.humidityHysteresis = 2
         self.timeout = 30
-        self.humidifier = LED(23)
+        # GPIO output switching the humidifier, anything with on() and off()
+        self.humidifier = output if output is not None else LED(23)
         
     def set_control_mode(self, mode):
         self.controlMode = mode
@@ -29,18 +32,18 @@ class Humidifier:
         
     def switch_on(self):
         print("switch_on")
-        if self.off_time is None or (datetime.datetime.now() - self.off_time).total_seconds() >= self.timeout:
+        if self.off_time is None or (self.clock.now() - self.off_time).total_seconds() >= self.timeout:
             self.humidifier.on()   
             self.is_on = True
             
         else:
             print("self.humidifier cannot be switched on")
-            remaining_time = self.timeout - (datetime.datetime.now() - self.off_time).total_seconds()
+            remaining_time = self.timeout - (self.clock.now() - self.off_time).total_seconds()
             print(f"Please wait for {remaining_time} seconds before switching on again.")
 
     def switch_off(self):
         print("switch off")
-        self.off_time = datetime.datetime.now()
+        self.off_time = self.clock.now()
         print("saved time")
         try:
             self.humidifier.off()  
@@ -50,15 +53,25 @@ class Humidifier:
         self.is_on = False
         
     def control_humidifier(self, sc):
+        # polling mode, the sample bus calls control_step() once per new sample instead
+        self.control_step()
+        sc.enter(5, 1, self.control_humidifier, (sc,))
+
+    def safe_mode(self):
+        self.switch_off()
+
+    def control_step(self):
         print("control humidity")
         humidity = self.get_current_humidity()
         
         print(f"got{humidity}")
         
-        self.humidity_control(sc, humidity)
+        if humidity is None:
+            # no recent sensor data, do not keep humidifying blindly
+            self.switch_off()
+        else:
+            self.humidity_control(None, humidity)
         print("done control loop")
-                    
-        sc.enter(5, 1, self.control_humidifier, (sc,))
         
     def humidity_control(self, sc, humidity):
         
@@ -74,19 +87,8 @@ class Humidifier:
     
     
     def get_current_humidity(self):
-
-        conn = mysql.connector.connect(**self.db_config)
-        cursor = conn.cursor()
-
-        query = """
-        SELECT humidity
-        FROM measurements
-        WHERE timestamp >= DATE_SUB(NOW(), INTERVAL 24 HOUR)
-        ORDER BY timestamp DESC
-        LIMIT 1;
-        """
-        cursor.execute(query)
-        results = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return results[0][0]
+        # None if there is no sample or the newest one is stale
+        sample = self.sample_store.fresh()
+        if sample is None:
+            return None
+        return sample.humidity
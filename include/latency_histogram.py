@@ -0,0 +1,90 @@
+import math
+
+
+class LatencyHistogram:
+    """
+    Bounded histogram of durations in seconds, HDR histogram style
+
+    The range lowest..highest is split into power-of-two bands, each band into
+    sub_buckets linear buckets. Memory is fixed (about 800 counters with the
+    defaults) and every recorded value is kept with a relative error below
+    1 / sub_buckets. Values outside the range are counted in the first or last
+    bucket, min and max are exact.
+
+    Not thread safe, the owner records and reads under its own lock.
+    """
+    def __init__(self, lowest=1e-4, highest=3600.0, sub_buckets=32):
+        self.lowest = lowest
+        self.highest = highest
+        self.sub_buckets = sub_buckets
+        self.bands = max(1, math.ceil(math.log2(highest / lowest)))
+        self.counts = [0] * (self.bands * sub_buckets)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def _index(self, value):
+        if value < self.lowest:
+            return 0
+        band = min(self.bands - 1, int(math.log2(value / self.lowest)))
+        start = self.lowest * 2 ** band
+        sub = min(self.sub_buckets - 1, int((value / start - 1) * self.sub_buckets))
+        return band * self.sub_buckets + sub
+
+    def _bucket_value(self, index):
+        band, sub = divmod(index, self.sub_buckets)
+        return self.lowest * 2 ** band * (1 + (sub + 0.5) / self.sub_buckets)
+
+    def record(self, value):
+        value = max(0.0, value)
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, fraction):
+        """Value below which the given fraction of the recorded values lies, None if empty"""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(fraction * self.count))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(max(self._bucket_value(index), self.min), self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def summary(self, scale=1000.0, digits=1):
+        """count and percentiles, by default in milliseconds"""
+        def scaled(value):
+            return None if value is None else round(value * scale, digits)
+        return {
+            'count': self.count,
+            'mean': scaled(self.mean()),
+            'p50': scaled(self.percentile(0.5)),
+            'p90': scaled(self.percentile(0.9)),
+            'p99': scaled(self.percentile(0.99)),
+            'max': scaled(self.max),
+        }
+
+    def buckets(self, scale=1000.0, digits=3):
+        """Non-empty buckets as [upper bound, count] pairs, by default in milliseconds"""
+        result = []
+        for index, count in enumerate(self.counts):
+            if count:
+                band, sub = divmod(index, self.sub_buckets)
+                upper = self.lowest * 2 ** band * (1 + (sub + 1) / self.sub_buckets)
+                result.append([round(upper * scale, digits), count])
+        return result
@@ -1,15 +1,18 @@
 import datetime
 from gpiozero import PWMLED
+from include.clock import SYSTEM_CLOCK
 
 class Light:
 
-    def __init__(self, db_config,):
+    def __init__(self, db_config, pwm_led=None, clock=SYSTEM_CLOCK):
+        self.clock = clock
+        self.check_interval = 1  # seconds between two check_time_and_control_light() runs
         self.lightState = False
         self.db_config = db_config
         self.light_on_time = datetime.time(1, 0)
         self.light_off_time = datetime.time(2, 0)
         self.lampPower = 9
-        self.pwm_led = PWMLED(12) # This is software PWM, needs to changed to hardware pwm (not support in pi 5 librarires currently)
+        self.pwm_led = pwm_led if pwm_led is not None else PWMLED(12) # This is software PWM, needs to changed to hardware pwm (not support in pi 5 librarires currently)
         self.pwm_led.value = 1-(self.lampPower / 100)
         self.pwm_led.frequency = 100
 
@@ -48,18 +51,18 @@ class Light:
     
     def check_time_and_control_light(self, sc, mqtt_interface):
         try:
-            current_time = datetime.datetime.now().time()
+            current_time = self.clock.now().time()
             # print(f"Checking light state on={self.lightState} from {self.light_on_time} to {self.light_off_time} with time {current_time}")
             if self.is_time_between(self.light_on_time, self.light_off_time, current_time):
                 self.turn_light_on(mqtt_interface)
             else:
                 self.turn_light_off(mqtt_interface)
-            sc.enter(1, 1, self.check_time_and_control_light, (sc,mqtt_interface,))
+            sc.enter(self.check_interval, 1, self.check_time_and_control_light, (sc,mqtt_interface,))
         except Exception as e:
             print(f"An error occurred: {str(e)}")
 
     def is_time_between(self, start_time:datetime.time, end_time:datetime.time, current_time:datetime.time=None):
-        current_time = current_time or datetime.datetime.now().time()
+        current_time = current_time or self.clock.now().time()
         if start_time < end_time:
             return start_time <= current_time <= end_time
         else:  # Time window over midnight
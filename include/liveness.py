@@ -0,0 +1,83 @@
+import logging
+import threading
+import time
+
+
+class LivenessTracker:
+    """
+    Liveness of components derived from the events they publish
+
+    The data writer reports a heartbeat for every sensor reading and every
+    commit, the MySQL pool for every connection returned without an error.
+    A component is alive if its last heartbeat is younger than its timeout and
+    no failure was reported after it, so asking costs no query or I/O.
+
+    State changes are logged once, like the former polling checks did.
+    """
+    def __init__(self, default_timeout=60.0, clock=time.monotonic):
+        self.default_timeout = default_timeout
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._components = {}
+
+    def _component(self, name):
+        component = self._components.get(name)
+        if component is None:
+            component = {'timeout': self.default_timeout, 'last_ok': None, 'last_failure': None,
+                         'error': None, 'alive': False}
+            self._components[name] = component
+        return component
+
+    def register(self, name, timeout):
+        with self._lock:
+            self._component(name)['timeout'] = timeout
+
+    def heartbeat(self, name):
+        with self._lock:
+            component = self._component(name)
+            component['last_ok'] = self.clock()
+            component['error'] = None
+            self._update(name, component)
+
+    def failure(self, name, error=None):
+        with self._lock:
+            component = self._component(name)
+            component['last_failure'] = self.clock()
+            component['error'] = None if error is None else str(error)
+            self._update(name, component)
+
+    def _update(self, name, component):
+        # called with the lock held, logs state changes
+        now = self.clock()
+        alive = (component['last_ok'] is not None
+                 and now - component['last_ok'] <= component['timeout']
+                 and (component['last_failure'] is None or component['last_failure'] <= component['last_ok']))
+        if alive != component['alive']:
+            if alive:
+                logging.info("[LivenessTracker] %s is alive again", name)
+            elif component['error']:
+                logging.error("[LivenessTracker] %s failed: %s", name, component['error'])
+            else:
+                logging.error("[LivenessTracker] %s is offline, no heartbeat for %.0f seconds",
+                              name, component['timeout'])
+            component['alive'] = alive
+        return alive
+
+    def is_alive(self, name):
+        with self._lock:
+            component = self._components.get(name)
+            return component is not None and self._update(name, component)
+
+    def status(self):
+        with self._lock:
+            now = self.clock()
+            return {
+                name: {
+                    'alive': self._update(name, component),
+                    'seconds_since_heartbeat': None if component['last_ok'] is None
+                    else round(now - component['last_ok'], 1),
+                    'timeout': component['timeout'],
+                    'error': component['error'],
+                }
+                for name, component in self._components.items()
+            }
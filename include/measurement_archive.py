@@ -0,0 +1,282 @@
+"""
+Compressed per-day archive of old raw measurements.
+
+Raw rows of finished days older than a few weeks are rarely read, but they
+make up most of the measurements table and its indexes. The compaction job
+packs every such day into one row of measurement_archive and deletes the raw
+rows in the same transaction. The rollup tables are not touched, charts of
+long timespans keep working without decoding anything.
+
+Block layout (everything after the magic is zlib compressed):
+
+- header: sample count, first timestamp in milliseconds
+- timestamps as delta-of-delta, zero for samples at the regular interval
+- analog values quantized to the sensor resolution and delta encoded, plus a
+  bitmap of missing values
+- actuator states as bitmaps
+
+Integer columns are stored with the smallest type which holds all values.
+The storage backends decode blocks transparently in fetch_window() and
+iter_table(), archived rows have no id.
+"""
+import argparse
+import datetime
+import logging
+import struct
+import zlib
+import numpy as np
+
+BLOCK_MAGIC = b'PGA1'
+HEADER = struct.Struct('<Iq')
+SECTION = struct.Struct('<cI')
+
+TIMESTAMP_SCALE = 1000  # milliseconds
+# (column, scale): temperature 0.01 °C, humidity 0.01 %, eco2 1 ppm
+ANALOG_COLUMNS = [('temperature_c', 100), ('humidity', 100), ('eco2', 1)]
+STATE_COLUMNS = ['light_state', 'fridge_state', 'co2_state', 'heater_state']
+
+INT_TYPES = [np.int8, np.int16, np.int32, np.int64]
+
+ARCHIVE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS measurement_archive (
+    day_start BIGINT NOT NULL PRIMARY KEY,
+    day_end BIGINT NOT NULL,
+    samples INT NOT NULL,
+    block MEDIUMBLOB NOT NULL
+)
+"""
+
+SQLITE_ARCHIVE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS measurement_archive (
+    day_start INTEGER NOT NULL PRIMARY KEY,
+    day_end INTEGER NOT NULL,
+    samples INTEGER NOT NULL,
+    block BLOB NOT NULL
+)
+"""
+
+DIALECT_SQL = {
+    'mysql': {
+        'table': ARCHIVE_TABLE_SQL,
+        'days': "SELECT day_start FROM measurement_archive WHERE day_end > %s AND day_start < %s ORDER BY day_start",
+        'block': "SELECT block FROM measurement_archive WHERE day_start = %s",
+        'lock_block': "SELECT block FROM measurement_archive WHERE day_start = %s FOR UPDATE",
+        'upsert': "INSERT INTO measurement_archive (day_start, day_end, samples, block) VALUES (%s, %s, %s, %s) "
+                  "ON DUPLICATE KEY UPDATE day_end = VALUES(day_end), samples = VALUES(samples), block = VALUES(block)",
+        'raw_rows': "SELECT UNIX_TIMESTAMP(timestamp), temperature_c, humidity, eco2, "
+                    "light_state, fridge_state, co2_state, heater_state FROM measurements "
+                    "WHERE timestamp >= FROM_UNIXTIME(%s) AND timestamp < FROM_UNIXTIME(%s) ORDER BY timestamp",
+        'delete_raw': "DELETE FROM measurements WHERE timestamp >= FROM_UNIXTIME(%s) AND timestamp < FROM_UNIXTIME(%s)",
+        'expire': "DELETE FROM measurement_archive WHERE day_start < %s",
+        'oldest_raw': "SELECT UNIX_TIMESTAMP(MIN(timestamp)) FROM measurements",
+    },
+    'sqlite': {
+        'table': SQLITE_ARCHIVE_TABLE_SQL,
+        'days': "SELECT day_start FROM measurement_archive WHERE day_end > ? AND day_start < ? ORDER BY day_start",
+        'block': "SELECT block FROM measurement_archive WHERE day_start = ?",
+        'lock_block': "SELECT block FROM measurement_archive WHERE day_start = ?",
+        'upsert': "INSERT INTO measurement_archive (day_start, day_end, samples, block) VALUES (?, ?, ?, ?) "
+                  "ON CONFLICT(day_start) DO UPDATE SET day_end = excluded.day_end, "
+                  "samples = excluded.samples, block = excluded.block",
+        'raw_rows': "SELECT timestamp, temperature_c, humidity, eco2, "
+                    "light_state, fridge_state, co2_state, heater_state FROM measurements "
+                    "WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp",
+        'delete_raw': "DELETE FROM measurements WHERE timestamp >= ? AND timestamp < ?",
+        'expire': "DELETE FROM measurement_archive WHERE day_start < ?",
+        'oldest_raw': "SELECT MIN(timestamp) FROM measurements",
+    },
+}
+
+
+def _pack_ints(values):
+    values = np.asarray(values, dtype=np.int64)
+    low, high = (int(values.min()), int(values.max())) if len(values) else (0, 0)
+    for int_type in INT_TYPES:
+        info = np.iinfo(int_type)
+        if info.min <= low and high <= info.max:
+            data = values.astype(int_type).tobytes()
+            return SECTION.pack(np.dtype(int_type).char.encode(), len(data)) + data
+
+
+def _pack_bits(flags):
+    data = np.packbits(np.asarray(flags, dtype=bool), bitorder='little').tobytes()
+    return SECTION.pack(b'B', len(data)) + data
+
+
+def _read_section(payload, offset, count):
+    type_char, length = SECTION.unpack_from(payload, offset)
+    offset += SECTION.size
+    data = payload[offset:offset + length]
+    if type_char == b'B':
+        values = np.unpackbits(np.frombuffer(data, dtype=np.uint8), bitorder='little', count=count)
+    else:
+        values = np.frombuffer(data, dtype=np.dtype(type_char.decode())).astype(np.int64)
+    return values, offset + length
+
+
+def encode_block(rows):
+    """
+    Pack rows (unix timestamp, temperature, humidity, eco2, light, fridge, co2, heater)
+    into a compressed block, rows must be in timestamp order
+    """
+    count = len(rows)
+    columns = list(zip(*rows)) if rows else [()] * (1 + len(ANALOG_COLUMNS) + len(STATE_COLUMNS))
+
+    timestamps = np.round(np.asarray(columns[0], dtype=np.float64) * TIMESTAMP_SCALE).astype(np.int64)
+    first = int(timestamps[0]) if count else 0
+    deltas = np.diff(timestamps, prepend=first)
+    parts = [HEADER.pack(count, first), _pack_ints(np.diff(deltas, prepend=0))]
+
+    for i, (_, scale) in enumerate(ANALOG_COLUMNS):
+        values = np.array([np.nan if v is None else float(v) for v in columns[1 + i]], dtype=np.float64)
+        present = ~np.isnan(values)
+        quantized = np.where(present, np.round(np.nan_to_num(values) * scale), 0).astype(np.int64)
+        parts.append(_pack_bits(present))
+        parts.append(_pack_ints(np.diff(quantized, prepend=0)))
+
+    for i in range(len(STATE_COLUMNS)):
+        parts.append(_pack_bits([bool(v) for v in columns[1 + len(ANALOG_COLUMNS) + i]]))
+
+    return BLOCK_MAGIC + zlib.compress(b''.join(parts), 9)
+
+
+def decode_block(block):
+    """Rows of a block as (unix timestamp, temperature, humidity, eco2, light, fridge, co2, heater)"""
+    block = bytes(block)
+    if block[:len(BLOCK_MAGIC)] != BLOCK_MAGIC:
+        raise ValueError("not a measurement archive block")
+    payload = zlib.decompress(block[len(BLOCK_MAGIC):])
+    count, first = HEADER.unpack_from(payload, 0)
+    offset = HEADER.size
+
+    delta_of_delta, offset = _read_section(payload, offset, count)
+    timestamps = first + np.cumsum(np.cumsum(delta_of_delta))
+    columns = [(timestamps / TIMESTAMP_SCALE).tolist()]
+
+    for _, scale in ANALOG_COLUMNS:
+        present, offset = _read_section(payload, offset, count)
+        deltas, offset = _read_section(payload, offset, count)
+        quantized = np.cumsum(deltas)
+        values = (quantized if scale == 1 else quantized / scale).astype(object)
+        values[present == 0] = None
+        columns.append(values.tolist())
+
+    for _ in STATE_COLUMNS:
+        states, offset = _read_section(payload, offset, count)
+        columns.append(states.tolist())
+
+    return list(zip(*columns))
+
+
+def ensure_archive_table(cursor, dialect='mysql'):
+    cursor.execute(DIALECT_SQL[dialect]['table'])
+
+
+def iter_archived_rows(cursor, start_timestamp, end_timestamp, dialect='mysql'):
+    """Decoded rows with start <= timestamp < end, one block (day) at a time"""
+    sql = DIALECT_SQL[dialect]
+    cursor.execute(sql['days'], (start_timestamp, end_timestamp))
+    days = [row[0] for row in cursor.fetchall()]
+    for day_start in days:
+        cursor.execute(sql['block'], (day_start,))
+        row = cursor.fetchone()
+        if row is None:
+            continue  # expired in the meantime
+        rows = [r for r in decode_block(row[0]) if start_timestamp <= r[0] < end_timestamp]
+        if rows:
+            yield rows
+
+
+def archive_day(cursor, day_start, day_end, dialect='mysql'):
+    """
+    Move the raw rows of [day_start, day_end) into the archive block of that day.
+    Rows which arrived after the day was archived are merged into the existing block.
+    The caller commits. Returns the number of raw rows moved.
+    """
+    sql = DIALECT_SQL[dialect]
+    cursor.execute(sql['raw_rows'], (day_start, day_end))
+    rows = [(float(r[0]),) + tuple(r[1:]) for r in cursor.fetchall()]
+    if not rows:
+        return 0
+
+    cursor.execute(sql['lock_block'], (day_start,))
+    existing = cursor.fetchone()
+    merged = rows
+    if existing is not None:
+        merged = sorted(decode_block(existing[0]) + rows, key=lambda r: r[0])
+
+    cursor.execute(sql['upsert'], (day_start, day_end, len(merged), encode_block(merged)))
+    cursor.execute(sql['delete_raw'], (day_start, day_end))
+    return len(rows)
+
+
+def expire_archive(cursor, cutoff_timestamp, dialect='mysql'):
+    cursor.execute(DIALECT_SQL[dialect]['expire'], (cutoff_timestamp,))
+    return cursor.rowcount
+
+
+def oldest_raw_timestamp(cursor, dialect='mysql'):
+    cursor.execute(DIALECT_SQL[dialect]['oldest_raw'])
+    value = cursor.fetchone()[0]
+    return None if value is None else float(value)
+
+
+def day_bounds(day):
+    """Unix timestamps of local midnight at the start and the end of a day"""
+    start = datetime.datetime.combine(day, datetime.time())
+    return int(start.timestamp()), int((start + datetime.timedelta(days=1)).timestamp())
+
+
+class MeasurementArchiver:
+    """
+    Compaction job, packs every finished day older than archive_after_days.
+    At most max_days_per_run days are compacted per run to keep each run short,
+    a backlog of an existing installation is worked off over a few runs.
+    """
+    def __init__(self, storage, archive_after_days=28, max_days_per_run=7):
+        self.storage = storage
+        self.archive_after_days = archive_after_days
+        self.max_days_per_run = max_days_per_run
+
+    def set_archive_after_days(self, days):
+        self.archive_after_days = int(days)
+
+    def compact(self, today=None):
+        today = today or datetime.date.today()
+        cutoff = today - datetime.timedelta(days=self.archive_after_days)
+        oldest = self.storage.oldest_raw_timestamp()
+        if oldest is None:
+            return []
+
+        archived = []
+        day = datetime.date.fromtimestamp(oldest)
+        while day < cutoff and len(archived) < self.max_days_per_run:
+            moved = self.storage.archive_day(day)
+            if moved:
+                logging.info(f"[MeasurementArchiver] Archived {moved} rows of {day.isoformat()}")
+                archived.append(day)
+            day += datetime.timedelta(days=1)
+        return archived
+
+    def run(self, sc, interval=3600):
+        try:
+            self.compact()
+        except Exception as e:
+            logging.error(f"[MeasurementArchiver] Compaction failed: {e}")
+        sc.enter(interval, 1, self.run, (sc, interval,))
+
+
+if __name__ == "__main__":
+    from include.measurement_export import load_storage_config
+    from include.measurement_storage import create_storage
+    from include.database_pool import DEFAULT_DB_CONFIG
+
+    parser = argparse.ArgumentParser(description='Pack old raw measurements into compressed daily blocks')
+    parser.add_argument('--archive-after-days', type=int, default=28)
+    parser.add_argument('--max-days', type=int, default=10000, help='days to compact in this run')
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+    storage = create_storage(load_storage_config(), DEFAULT_DB_CONFIG, pool_size=1)
+    storage.ensure_schema()
+    MeasurementArchiver(storage, args.archive_after_days, args.max_days).compact()
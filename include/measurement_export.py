@@ -0,0 +1,145 @@
+"""
+Export of the measurement history as CSV or Parquet.
+
+Rows are read in batches from the storage backend's streaming cursor and
+written out batch by batch, memory use does not depend on the size of the
+range. Used by the /export route and from the command line:
+
+    python -m include.measurement_export --start 2024-01-01 --end 2024-07-01 -o history.csv
+    python -m include.measurement_export --source measurements_1h --format parquet -o hourly.parquet
+
+Parquet needs the optional pyarrow package.
+"""
+import argparse
+import csv
+import datetime
+import io
+import json
+import os
+import sys
+import time
+from include.database_pool import DEFAULT_DB_CONFIG
+from include.measurement_rollups import ROLLUP_LEVELS, ROLLUP_COLUMNS
+from include.measurement_storage import MEASUREMENT_COLUMNS, create_storage
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+RAW_COLUMNS = MEASUREMENT_COLUMNS.split(', ')
+
+# source -> (time column, value columns)
+EXPORT_SOURCES = {'measurements': ('timestamp', RAW_COLUMNS)}
+EXPORT_SOURCES.update({table: ('bucket_start', ROLLUP_COLUMNS) for table, _ in ROLLUP_LEVELS})
+
+EXPORT_FORMATS = ('csv', 'parquet')
+EXPORT_BATCH_SIZE = 5000
+
+
+def parse_time(value, default):
+    """ISO date/time or unix timestamp to unix timestamp"""
+    if value is None or value == '':
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.datetime.fromisoformat(value).timestamp()
+
+
+def iter_batches(storage, source, start, end, batch_size=EXPORT_BATCH_SIZE):
+    if source not in EXPORT_SOURCES:
+        raise ValueError("unknown export source '{}'".format(source))
+    time_column, columns = EXPORT_SOURCES[source]
+    return storage.iter_table(source, columns, time_column, start, end, batch_size)
+
+
+def export_header(source):
+    time_column, columns = EXPORT_SOURCES[source]
+    return [time_column] + list(columns)
+
+
+def csv_chunks(storage, source, start, end):
+    """CSV text in chunks of one batch each, timestamps as local ISO 8601 time"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(export_header(source))
+    yield buffer.getvalue()
+
+    for rows in iter_batches(storage, source, start, end):
+        buffer.seek(0)
+        buffer.truncate()
+        for row in rows:
+            timestamp = datetime.datetime.fromtimestamp(float(row[0])).isoformat()
+            writer.writerow((timestamp,) + tuple(row[1:]))
+        yield buffer.getvalue()
+
+
+def parquet_schema(source):
+    time_column, columns = EXPORT_SOURCES[source]
+    fields = [pyarrow.field(time_column, pyarrow.timestamp('s', tz='UTC'))]
+    for column in columns:
+        if column.endswith('_state') or column.endswith('_on') or column == 'samples':
+            fields.append(pyarrow.field(column, pyarrow.int32()))
+        else:
+            fields.append(pyarrow.field(column, pyarrow.float64()))
+    return pyarrow.schema(fields)
+
+
+def write_parquet(storage, source, start, end, destination, compression='zstd'):
+    """Write the range to a Parquet file (path or binary file object), one row group per batch"""
+    if pyarrow is None:
+        raise RuntimeError("Parquet export needs the pyarrow package (pip install pyarrow)")
+    schema = parquet_schema(source)
+    written = 0
+    with pyarrow.parquet.ParquetWriter(destination, schema, compression=compression) as writer:
+        for rows in iter_batches(storage, source, start, end):
+            columns = list(zip(*rows))
+            arrays = [pyarrow.array([int(float(t)) for t in columns[0]], type=schema.field(0).type)]
+            for index, values in enumerate(columns[1:], start=1):
+                field_type = schema.field(index).type
+                if pyarrow.types.is_integer(field_type):
+                    values = [None if v is None else int(v) for v in values]
+                else:
+                    values = [None if v is None else float(v) for v in values]
+                arrays.append(pyarrow.array(values, type=field_type))
+            writer.write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+            written += len(rows)
+    return written
+
+
+def load_storage_config(config_file='config/config.json'):
+    if os.path.exists(config_file):
+        with open(config_file, 'r') as file:
+            return json.load(file).get('Storage')
+    return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Export measurements as CSV or Parquet')
+    parser.add_argument('--source', default='measurements', choices=sorted(EXPORT_SOURCES))
+    parser.add_argument('--start', help='ISO date/time or unix timestamp (default: everything)')
+    parser.add_argument('--end', help='ISO date/time or unix timestamp (default: now)')
+    parser.add_argument('--format', default='csv', choices=EXPORT_FORMATS)
+    parser.add_argument('--compression', default='zstd', help='Parquet column compression')
+    parser.add_argument('-o', '--output', help='output file, CSV defaults to stdout')
+    args = parser.parse_args()
+
+    storage = create_storage(load_storage_config(), DEFAULT_DB_CONFIG, pool_size=1)
+    start = parse_time(args.start, 0)
+    end = parse_time(args.end, time.time())
+
+    if args.format == 'parquet':
+        if not args.output:
+            parser.error('--output is required for Parquet')
+        count = write_parquet(storage, args.source, start, end, args.output, args.compression)
+        print(f"Exported {count} rows to {args.output}", file=sys.stderr)
+    else:
+        output = open(args.output, 'w', newline='') if args.output else sys.stdout
+        try:
+            for chunk in csv_chunks(storage, args.source, start, end):
+                output.write(chunk)
+        finally:
+            if args.output:
+                output.close()
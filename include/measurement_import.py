@@ -0,0 +1,171 @@
+"""
+Bulk import of measurement history from CSV or Parquet.
+
+Reads files in the layout written by measurement_export (a timestamp column
+plus the measurement columns, missing columns are empty), e.g. when moving
+to a new box or restoring from another logger:
+
+    python -m include.measurement_import history.csv
+    python -m include.measurement_import --batch-size 10000 2023.parquet 2024.parquet
+
+Rows are validated, rows whose timestamp (whole second) already exists in the
+database or earlier in the input are skipped, so an import can simply be run
+again after an interruption. Every batch is written with one multi-row INSERT
+which also updates the rollup tables.
+"""
+import argparse
+import csv
+import datetime
+import logging
+import math
+import time
+from include.database_pool import DEFAULT_DB_CONFIG
+from include.measurement_export import parse_time, load_storage_config, RAW_COLUMNS
+from include.measurement_storage import create_storage, existing_seconds
+
+try:
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+IMPORT_BATCH_SIZE = 5000
+
+# plausible ranges, rows outside are rejected as invalid
+VALUE_RANGES = {
+    'temperature_c': (-40.0, 85.0),
+    'humidity': (0.0, 100.0),
+    'eco2': (0, 40000),
+}
+STATE_VALUES = {'0': 0, '1': 1, 'false': 0, 'true': 1, '0.0': 0, '1.0': 1}
+
+
+def parse_record(record):
+    """A record (dict column -> value) as an insert row, raises ValueError if it is not valid"""
+    timestamp = record.get('timestamp')
+    if isinstance(timestamp, datetime.datetime):
+        timestamp = timestamp.timestamp()
+    elif isinstance(timestamp, str):
+        timestamp = parse_time(timestamp.strip(), None)
+    if timestamp is None:
+        raise ValueError("missing timestamp")
+    timestamp = float(timestamp)
+
+    row = [timestamp]
+    for column in RAW_COLUMNS:
+        value = record.get(column)
+        if isinstance(value, str):
+            value = value.strip()
+        if value is None or value == '':
+            row.append(None if column in VALUE_RANGES else 0)
+        elif column in VALUE_RANGES:
+            value = float(value)
+            low, high = VALUE_RANGES[column]
+            if math.isnan(value):
+                value = None
+            elif not low <= value <= high:
+                raise ValueError("{} {} out of range".format(column, value))
+            row.append(value)
+        else:
+            if isinstance(value, bool):
+                value = str(int(value))
+            state = STATE_VALUES.get(str(value).lower())
+            if state is None:
+                raise ValueError("{} must be 0 or 1, got {}".format(column, value))
+            row.append(state)
+    if all(value is None for value in row[1:1 + len(VALUE_RANGES)]):
+        raise ValueError("no sensor values")
+    return tuple(row)
+
+
+def read_csv(path, batch_size=IMPORT_BATCH_SIZE):
+    with open(path, newline='') as file:
+        batch = []
+        for record in csv.DictReader(file):
+            batch.append(record)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def read_parquet(path, batch_size=IMPORT_BATCH_SIZE):
+    if pyarrow is None:
+        raise RuntimeError("Parquet import needs the pyarrow package (pip install pyarrow)")
+    for record_batch in pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=batch_size):
+        yield record_batch.to_pylist()
+
+
+def read_file(path, batch_size=IMPORT_BATCH_SIZE):
+    if path.endswith('.parquet'):
+        return read_parquet(path, batch_size)
+    return read_csv(path, batch_size)
+
+
+class MeasurementImporter:
+    def __init__(self, storage, max_invalid_logged=10):
+        self.storage = storage
+        self.max_invalid_logged = max_invalid_logged
+        self.read = 0
+        self.invalid = 0
+        self.duplicates = 0
+        self.inserted = 0
+        self.seconds = 0.0
+
+    def import_batch(self, records):
+        rows = {}
+        for record in records:
+            self.read += 1
+            try:
+                row = parse_record(record)
+            except (TypeError, ValueError) as e:
+                self.invalid += 1
+                if self.invalid <= self.max_invalid_logged:
+                    logging.warning(f"[MeasurementImporter] Skipping row {self.read}: {e}")
+                continue
+            second = round(row[0])
+            if second in rows:
+                self.duplicates += 1
+            else:
+                rows[second] = row
+        if not rows:
+            return 0
+
+        existing = existing_seconds(self.storage, rows)
+        new_rows = [row for second, row in sorted(rows.items()) if second not in existing]
+        self.duplicates += len(rows) - len(new_rows)
+        if new_rows:
+            self.storage.insert_rows(new_rows)
+            self.inserted += len(new_rows)
+        return len(new_rows)
+
+    def import_batches(self, batches):
+        started = time.perf_counter()
+        try:
+            for records in batches:
+                self.import_batch(records)
+        finally:
+            self.seconds += time.perf_counter() - started
+        return self.inserted
+
+    def rows_per_second(self):
+        return self.read / self.seconds if self.seconds > 0 else 0.0
+
+    def summary(self):
+        return (f"{self.read} rows read, {self.inserted} inserted, {self.duplicates} duplicates, "
+                f"{self.invalid} invalid in {self.seconds:.1f} s ({self.rows_per_second():.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Import measurements from CSV or Parquet files')
+    parser.add_argument('files', nargs='+', help='.csv or .parquet files, e.g. written by measurement_export')
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+    storage = create_storage(load_storage_config(), DEFAULT_DB_CONFIG, pool_size=1)
+    storage.ensure_schema()
+    importer = MeasurementImporter(storage)
+    for path in args.files:
+        importer.import_batches(read_file(path, args.batch_size))
+        logging.info(f"[MeasurementImporter] {path}: {importer.summary()}")
@@ -0,0 +1,245 @@
+"""
+Schema migration, daily partitioning and retention for the measurements table.
+
+The measurements table is range partitioned by day on its timestamp, so old
+data can be removed by dropping whole partitions instead of deleting rows one
+by one. MeasurementRetention.run() is scheduled by the web app and
+
+- keeps a few empty partitions ahead of the current day
+- drops partitions which are completely older than the retention period
+- deletes rollup buckets older than the horizon of their table
+
+Existing installations are migrated with (see update.sh):
+
+    python -m include.measurement_retention --migrate
+"""
+import argparse
+import datetime
+import logging
+from include.database_pool import DatabasePool, DEFAULT_DB_CONFIG
+from include.measurement_archive import ensure_archive_table, expire_archive
+from include.measurement_rollups import expire_rollups
+
+TIMESTAMP_INDEX = 'idx_measurements_timestamp'
+
+# Partitioning needs the partition column in every unique key, so the primary key becomes (id, timestamp)
+MIGRATE_KEYS_SQL = """
+ALTER TABLE measurements
+    MODIFY timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (id, timestamp)
+"""
+
+ADD_INDEX_SQL = "ALTER TABLE measurements ADD INDEX {} (timestamp)".format(TIMESTAMP_INDEX)
+
+PARTITIONS_SQL = """
+SELECT PARTITION_NAME, PARTITION_DESCRIPTION
+FROM information_schema.PARTITIONS
+WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'measurements'
+ORDER BY PARTITION_ORDINAL_POSITION
+"""
+
+PRIMARY_KEY_SQL = """
+SELECT COLUMN_NAME
+FROM information_schema.KEY_COLUMN_USAGE
+WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'measurements' AND CONSTRAINT_NAME = 'PRIMARY'
+"""
+
+INDEX_SQL = """
+SELECT COUNT(*)
+FROM information_schema.STATISTICS
+WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'measurements' AND INDEX_NAME = %s
+"""
+
+# Fallback for tables which were not migrated yet, deletes in small chunks to keep locks short
+DELETE_CHUNK_SQL = "DELETE FROM measurements WHERE timestamp < %s ORDER BY timestamp LIMIT %s"
+
+
+def partition_name(day):
+    return day.strftime('p%Y%m%d')
+
+
+def partition_definition(day):
+    # a partition holds all rows before the start of the next day (server time zone)
+    upper = day + datetime.timedelta(days=1)
+    return "PARTITION {} VALUES LESS THAN (UNIX_TIMESTAMP('{} 00:00:00'))".format(
+        partition_name(day), upper.isoformat())
+
+
+def partition_day(name):
+    try:
+        return datetime.datetime.strptime(name, 'p%Y%m%d').date()
+    except (TypeError, ValueError):
+        return None
+
+
+class MeasurementRetention:
+    def __init__(self, db_pool, retention_days=365, partitions_ahead=3, delete_chunk_size=5000):
+        self.db_pool = db_pool
+        self.retention_days = retention_days
+        self.partitions_ahead = partitions_ahead
+        self.delete_chunk_size = delete_chunk_size
+        self.not_partitioned_logged = False
+
+    def set_retention_days(self, days):
+        self.retention_days = int(days)
+
+    def get_partitions(self):
+        """List of (name, description), empty if the table is not partitioned"""
+        rows = self.db_pool.fetchall(PARTITIONS_SQL)
+        return [(name, description) for name, description in rows if name is not None]
+
+    def is_partitioned(self):
+        return len(self.get_partitions()) > 0
+
+    def _execute(self, statement, params=None):
+        with self.db_pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(statement, params)
+            conn.commit()
+            cursor.close()
+
+    def migrate(self, today=None):
+        """Add the timestamp index and partition the table by day. Safe to run more than once."""
+        today = today or datetime.date.today()
+
+        if self.db_pool.fetchone(INDEX_SQL, (TIMESTAMP_INDEX,))[0] == 0:
+            logging.info("[MeasurementRetention] Adding timestamp index")
+            self._execute(ADD_INDEX_SQL)
+
+        if self.is_partitioned():
+            logging.info("[MeasurementRetention] Table is already partitioned")
+            return
+
+        primary_key = [row[0] for row in self.db_pool.fetchall(PRIMARY_KEY_SQL)]
+        if 'timestamp' not in primary_key:
+            logging.info("[MeasurementRetention] Extending primary key with timestamp")
+            self._execute(MIGRATE_KEYS_SQL)
+
+        first = self.db_pool.fetchone("SELECT DATE(MIN(timestamp)) FROM measurements")[0]
+        first_day = first if first is not None else today
+        cutoff = today - datetime.timedelta(days=self.retention_days)
+        first_day = max(first_day, cutoff)
+
+        definitions = []
+        day = first_day
+        while day <= today + datetime.timedelta(days=self.partitions_ahead):
+            definitions.append(partition_definition(day))
+            day += datetime.timedelta(days=1)
+        # rows older than the first day end up in the first partition and are dropped with it
+        definitions.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+
+        logging.info("[MeasurementRetention] Partitioning measurements into %d daily partitions", len(definitions) - 1)
+        self._execute("ALTER TABLE measurements PARTITION BY RANGE (UNIX_TIMESTAMP(timestamp)) ({})".format(
+            ', '.join(definitions)))
+
+    def ensure_partitions(self, partitions, today=None):
+        """Split the catch-all partition so the next days have their own partitions"""
+        today = today or datetime.date.today()
+        days = [partition_day(name) for name, _ in partitions]
+        last_day = max([d for d in days if d is not None], default=today - datetime.timedelta(days=1))
+
+        definitions = []
+        day = max(last_day + datetime.timedelta(days=1), today)
+        while day <= today + datetime.timedelta(days=self.partitions_ahead):
+            definitions.append(partition_definition(day))
+            day += datetime.timedelta(days=1)
+
+        if definitions:
+            definitions.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+            self._execute("ALTER TABLE measurements REORGANIZE PARTITION pmax INTO ({})".format(
+                ', '.join(definitions)))
+            logging.info("[MeasurementRetention] Added %d partitions", len(definitions) - 1)
+
+    def drop_expired_partitions(self, partitions, today=None):
+        today = today or datetime.date.today()
+        cutoff = today - datetime.timedelta(days=self.retention_days)
+        # a partition may only be dropped if its whole day is older than the cutoff
+        expired = [name for name, _ in partitions
+                   if partition_day(name) is not None and partition_day(name) < cutoff]
+        if expired:
+            self._execute("ALTER TABLE measurements DROP PARTITION {}".format(', '.join(expired)))
+            logging.info("[MeasurementRetention] Dropped partitions %s", ', '.join(expired))
+        return expired
+
+    def delete_expired_rows(self, today=None):
+        today = today or datetime.date.today()
+        cutoff = datetime.datetime.combine(today - datetime.timedelta(days=self.retention_days), datetime.time())
+        deleted = 0
+        while True:
+            with self.db_pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(DELETE_CHUNK_SQL, (cutoff, self.delete_chunk_size))
+                count = cursor.rowcount
+                conn.commit()
+                cursor.close()
+            deleted += count
+            if count < self.delete_chunk_size:
+                return deleted
+
+    def rebuild_partition(self, day):
+        """Rebuild the partition of a day (if there is one) to free the space of deleted rows"""
+        name = partition_name(day)
+        if name in [partition for partition, _ in self.get_partitions()]:
+            self._execute("ALTER TABLE measurements REBUILD PARTITION {}".format(name))
+
+    def expire_archive(self, today=None):
+        """Delete compressed day blocks older than the retention period"""
+        today = today or datetime.date.today()
+        cutoff = datetime.datetime.combine(today - datetime.timedelta(days=self.retention_days), datetime.time())
+        with self.db_pool.connection() as conn:
+            cursor = conn.cursor()
+            ensure_archive_table(cursor)
+            deleted = expire_archive(cursor, int(cutoff.timestamp()))
+            conn.commit()
+            cursor.close()
+        if deleted:
+            logging.info("[MeasurementRetention] Deleted %d archived days", deleted)
+        return deleted
+
+    def expire_rollups(self, today=None):
+        """Delete rollup buckets older than the horizon of their table"""
+        today = today or datetime.date.today()
+        with self.db_pool.connection() as conn:
+            cursor = conn.cursor()
+            deleted = expire_rollups(cursor, today)
+            conn.commit()
+            cursor.close()
+        for table, count in deleted.items():
+            if count:
+                logging.info("[MeasurementRetention] Deleted %d expired buckets of %s", count, table)
+        return deleted
+
+    def apply(self, today=None):
+        self.expire_archive(today)
+        self.expire_rollups(today)
+        partitions = self.get_partitions()
+        if partitions:
+            self.ensure_partitions(partitions, today)
+            self.drop_expired_partitions(partitions, today)
+        else:
+            if not self.not_partitioned_logged:
+                logging.warning("[MeasurementRetention] measurements is not partitioned, "
+                                "run 'python -m include.measurement_retention --migrate'")
+                self.not_partitioned_logged = True
+            self.delete_expired_rows(today)
+
+    def run(self, sc, interval=3600):
+        try:
+            self.apply()
+        except Exception as e:
+            logging.error(f"[MeasurementRetention] Retention job failed: {e}")
+        sc.enter(interval, 1, self.run, (sc, interval,))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Partitioning and retention of the measurements table')
+    parser.add_argument('--migrate', action='store_true', help='add the timestamp index and partition the table by day')
+    parser.add_argument('--retention-days', type=int, default=365, help='days of raw measurements to keep')
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+    retention = MeasurementRetention(DatabasePool(DEFAULT_DB_CONFIG, pool_size=1), retention_days=args.retention_days)
+    if args.migrate:
+        retention.migrate()
+    retention.apply()
@@ -0,0 +1,328 @@
+"""
+Aggregate tables for the measurements table.
+
+The data writer keeps one table per resolution up to date while it inserts
+samples, so long timespans can be charted without scanning the raw table.
+Every rollup row stores the number of samples, sums/min/max of the analog
+values and the number of samples each actuator was on. Averages and duty
+cycles are computed when reading. The retention job removes buckets older
+than the horizon of their table (ROLLUP_RETENTION_DAYS).
+
+The statements exist for MySQL/MariaDB and SQLite, functions take a dialect
+('mysql' or 'sqlite') and the cursor of the matching backend.
+"""
+import datetime
+import logging
+
+# (table name, bucket size in seconds), ordered from fine to coarse
+ROLLUP_LEVELS = [
+    ('measurements_1m', 60),
+    ('measurements_10m', 600),
+    ('measurements_1h', 3600),
+]
+
+# Days of buckets kept per rollup table by the retention job, None keeps them for good.
+# Charts of a long timespan only read the coarse tables, so the fine ones expire early.
+ROLLUP_RETENTION_DAYS = {
+    'measurements_1m': 30,
+    'measurements_10m': 365,
+    'measurements_1h': None,
+}
+
+ANALOG_FIELDS = ['temperature', 'humidity', 'eco2']
+STATE_FIELDS = ['light', 'fridge', 'co2', 'heater']
+
+# The explicit DEFAULT keeps MariaDB < 10.10 (explicit_defaults_for_timestamp=OFF) from declaring the first
+# TIMESTAMP column ON UPDATE CURRENT_TIMESTAMP, which would move a bucket to NOW() on every upsert
+ROLLUP_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS {table} (
+    bucket_start TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP PRIMARY KEY,
+    samples INT NOT NULL,
+    temperature_sum DOUBLE,
+    temperature_min FLOAT,
+    temperature_max FLOAT,
+    humidity_sum DOUBLE,
+    humidity_min FLOAT,
+    humidity_max FLOAT,
+    eco2_sum DOUBLE,
+    eco2_min INT,
+    eco2_max INT,
+    light_on INT,
+    fridge_on INT,
+    co2_on INT,
+    heater_on INT
+);
+"""
+
+ROLLUP_COLUMNS = (
+    ['samples']
+    + [f'{field}_{agg}' for field in ANALOG_FIELDS for agg in ('sum', 'min', 'max')]
+    + [f'{field}_on' for field in STATE_FIELDS]
+)
+
+UPSERT_ROLLUP_SQL = """
+INSERT INTO {table} (bucket_start, %s)
+VALUES (FROM_UNIXTIME(%%s), %s)
+ON DUPLICATE KEY UPDATE
+    samples = samples + VALUES(samples),
+    %s
+""" % (
+    ', '.join(ROLLUP_COLUMNS),
+    ', '.join(['%s'] * len(ROLLUP_COLUMNS)),
+    ',\n    '.join(
+        [f'{f}_sum = COALESCE({f}_sum + VALUES({f}_sum), {f}_sum, VALUES({f}_sum))' for f in ANALOG_FIELDS]
+        + [f'{f}_min = COALESCE(LEAST({f}_min, VALUES({f}_min)), {f}_min, VALUES({f}_min))' for f in ANALOG_FIELDS]
+        + [f'{f}_max = COALESCE(GREATEST({f}_max, VALUES({f}_max)), {f}_max, VALUES({f}_max))' for f in ANALOG_FIELDS]
+        + [f'{f}_on = {f}_on + VALUES({f}_on)' for f in STATE_FIELDS]
+    ),
+)
+
+# Rebuild the aggregates of a level from the raw table (used to backfill old data)
+REBUILD_ROLLUP_SQL = """
+INSERT INTO {table} (bucket_start, %s)
+SELECT FROM_UNIXTIME(FLOOR(UNIX_TIMESTAMP(timestamp) / {seconds}) * {seconds}) AS bucket,
+    COUNT(*),
+    SUM(temperature_c), MIN(temperature_c), MAX(temperature_c),
+    SUM(humidity), MIN(humidity), MAX(humidity),
+    SUM(eco2), MIN(eco2), MAX(eco2),
+    SUM(light_state), SUM(fridge_state), SUM(co2_state), SUM(heater_state)
+FROM measurements
+WHERE timestamp >= FROM_UNIXTIME(%%s) AND timestamp < FROM_UNIXTIME(%%s)
+GROUP BY bucket
+ON DUPLICATE KEY UPDATE
+    %s
+""" % (
+    ', '.join(ROLLUP_COLUMNS),
+    ',\n    '.join(f'{c} = VALUES({c})' for c in ROLLUP_COLUMNS),
+)
+
+# Same column order as the raw /data query: averages first, then duty cycles (0..1), then the unix timestamp
+SELECT_ROLLUP_SQL = """
+SELECT temperature_sum / samples, humidity_sum / samples, eco2_sum / samples,
+    light_on / samples, fridge_on / samples, co2_on / samples, heater_on / samples,
+    UNIX_TIMESTAMP(bucket_start)
+FROM {table}
+WHERE bucket_start >= FROM_UNIXTIME(%s)
+ORDER BY bucket_start ASC
+"""
+
+# SQLite stores bucket_start as unix seconds
+SQLITE_ROLLUP_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS {table} (
+    bucket_start INTEGER NOT NULL PRIMARY KEY,
+    samples INTEGER NOT NULL,
+    temperature_sum REAL,
+    temperature_min REAL,
+    temperature_max REAL,
+    humidity_sum REAL,
+    humidity_min REAL,
+    humidity_max REAL,
+    eco2_sum REAL,
+    eco2_min INTEGER,
+    eco2_max INTEGER,
+    light_on INTEGER,
+    fridge_on INTEGER,
+    co2_on INTEGER,
+    heater_on INTEGER
+);
+"""
+
+SQLITE_UPSERT_ROLLUP_SQL = """
+INSERT INTO {table} (bucket_start, %s)
+VALUES (?, %s)
+ON CONFLICT(bucket_start) DO UPDATE SET
+    samples = samples + excluded.samples,
+    %s
+""" % (
+    ', '.join(ROLLUP_COLUMNS),
+    ', '.join(['?'] * len(ROLLUP_COLUMNS)),
+    ',\n    '.join(
+        [f'{f}_sum = COALESCE({f}_sum + excluded.{f}_sum, {f}_sum, excluded.{f}_sum)' for f in ANALOG_FIELDS]
+        + [f'{f}_min = COALESCE(MIN({f}_min, excluded.{f}_min), {f}_min, excluded.{f}_min)' for f in ANALOG_FIELDS]
+        + [f'{f}_max = COALESCE(MAX({f}_max, excluded.{f}_max), {f}_max, excluded.{f}_max)' for f in ANALOG_FIELDS]
+        + [f'{f}_on = {f}_on + excluded.{f}_on' for f in STATE_FIELDS]
+    ),
+)
+
+SQLITE_REBUILD_ROLLUP_SQL = """
+INSERT INTO {table} (bucket_start, %s)
+SELECT CAST(timestamp / {seconds} AS INTEGER) * {seconds} AS bucket,
+    COUNT(*),
+    SUM(temperature_c), MIN(temperature_c), MAX(temperature_c),
+    SUM(humidity), MIN(humidity), MAX(humidity),
+    SUM(eco2), MIN(eco2), MAX(eco2),
+    SUM(light_state), SUM(fridge_state), SUM(co2_state), SUM(heater_state)
+FROM measurements
+WHERE timestamp >= ? AND timestamp < ?
+GROUP BY bucket
+ON CONFLICT(bucket_start) DO UPDATE SET
+    %s
+""" % (
+    ', '.join(ROLLUP_COLUMNS),
+    ',\n    '.join(f'{c} = excluded.{c}' for c in ROLLUP_COLUMNS),
+)
+
+SQLITE_SELECT_ROLLUP_SQL = """
+SELECT CAST(temperature_sum AS REAL) / samples, CAST(humidity_sum AS REAL) / samples, CAST(eco2_sum AS REAL) / samples,
+    CAST(light_on AS REAL) / samples, CAST(fridge_on AS REAL) / samples,
+    CAST(co2_on AS REAL) / samples, CAST(heater_on AS REAL) / samples,
+    bucket_start
+FROM {table}
+WHERE bucket_start >= ?
+ORDER BY bucket_start ASC
+"""
+
+DIALECT_SQL = {
+    'mysql': {
+        'table': ROLLUP_TABLE_SQL,
+        'upsert': UPSERT_ROLLUP_SQL,
+        'rebuild': REBUILD_ROLLUP_SQL,
+        'select': SELECT_ROLLUP_SQL,
+        'tables': "SHOW TABLES",
+        'auto_update': "SELECT TABLE_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() "
+                       "AND COLUMN_NAME = 'bucket_start' AND EXTRA LIKE '%on update%'",
+        'fix_auto_update': "ALTER TABLE {table} MODIFY bucket_start TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP",
+        # buckets moved to NOW() by an upsert no longer start on a bucket boundary
+        'misaligned': "DELETE FROM {table} WHERE UNIX_TIMESTAMP(bucket_start) % {seconds} != 0",
+        'range': "SELECT UNIX_TIMESTAMP(MIN(timestamp)), UNIX_TIMESTAMP(NOW()) + 1 FROM measurements",
+        'expire': "DELETE FROM {table} WHERE bucket_start < FROM_UNIXTIME(%s)",
+    },
+    'sqlite': {
+        'table': SQLITE_ROLLUP_TABLE_SQL,
+        'upsert': SQLITE_UPSERT_ROLLUP_SQL,
+        'rebuild': SQLITE_REBUILD_ROLLUP_SQL,
+        'select': SQLITE_SELECT_ROLLUP_SQL,
+        'tables': "SELECT name FROM sqlite_master WHERE type = 'table'",
+        'range': "SELECT MIN(timestamp), CAST(strftime('%s', 'now') AS INTEGER) + 1 FROM measurements",
+        'expire': "DELETE FROM {table} WHERE bucket_start < ?",
+    },
+}
+
+
+def bucket_start(timestamp, bucket_seconds):
+    return int(timestamp // bucket_seconds) * bucket_seconds
+
+
+def aggregate_samples(samples, bucket_seconds):
+    """
+    Aggregate samples into rollup rows of one level.
+    A sample is (unix timestamp, temperature, humidity, eco2, light, fridge, co2, heater).
+    Returns a dict bucket start -> list of values in ROLLUP_COLUMNS order.
+    """
+    buckets = {}
+    for sample in samples:
+        start = bucket_start(sample[0], bucket_seconds)
+        row = buckets.get(start)
+        if row is None:
+            row = [0] + [None] * (3 * len(ANALOG_FIELDS)) + [0] * len(STATE_FIELDS)
+            buckets[start] = row
+        row[0] += 1
+        for i in range(len(ANALOG_FIELDS)):
+            value = sample[1 + i]
+            if value is None:
+                continue
+            offset = 1 + 3 * i
+            row[offset] = value if row[offset] is None else row[offset] + value
+            row[offset + 1] = value if row[offset + 1] is None else min(row[offset + 1], value)
+            row[offset + 2] = value if row[offset + 2] is None else max(row[offset + 2], value)
+        state_offset = 1 + 3 * len(ANALOG_FIELDS)
+        for i in range(len(STATE_FIELDS)):
+            if sample[1 + len(ANALOG_FIELDS) + i]:
+                row[state_offset + i] += 1
+    return buckets
+
+
+def upsert_rollups(cursor, samples, dialect='mysql'):
+    """Add a batch of samples to all rollup levels. The caller commits."""
+    for table, seconds in ROLLUP_LEVELS:
+        rows = [
+            [start] + values
+            for start, values in sorted(aggregate_samples(samples, seconds).items())
+        ]
+        if rows:
+            cursor.executemany(DIALECT_SQL[dialect]['upsert'].format(table=table), rows)
+
+
+def rebuild_rollups(cursor, start_timestamp, end_timestamp, dialect='mysql'):
+    """Recompute all rollup buckets between two unix timestamps from the raw table."""
+    for table, seconds in ROLLUP_LEVELS:
+        start = bucket_start(start_timestamp, seconds)
+        cursor.execute(DIALECT_SQL[dialect]['rebuild'].format(table=table, seconds=seconds), (start, end_timestamp))
+
+
+def ensure_rollup_tables(cursor, dialect='mysql'):
+    """
+    Create missing rollup tables. A newly created table is backfilled from the
+    raw measurements, so charts of existing installations keep their history.
+    """
+    sql = DIALECT_SQL[dialect]
+    cursor.execute(sql['tables'])
+    existing = {row[0] for row in cursor.fetchall()}
+    repaired = set()
+    if 'auto_update' in sql:
+        cursor.execute(sql['auto_update'])
+        for (table,) in cursor.fetchall():
+            logging.info("Removing ON UPDATE from %s.bucket_start", table)
+            cursor.execute(sql['fix_auto_update'].format(table=table))
+            repaired.add(table)
+    for table, seconds in ROLLUP_LEVELS:
+        if table in repaired:
+            # upserts have moved buckets to NOW(), recompute them from the raw rows still stored
+            logging.info("Rebuilding rollup table %s", table)
+            cursor.execute(sql['misaligned'].format(table=table, seconds=seconds))
+            _rebuild_table(cursor, sql, table, seconds)
+        if table in existing:
+            continue
+        cursor.execute(sql['table'].format(table=table))
+        logging.info("Backfilling rollup table %s", table)
+        _rebuild_table(cursor, sql, table, seconds)
+
+
+def _rebuild_table(cursor, sql, table, seconds):
+    cursor.execute(sql['range'])
+    first, end = cursor.fetchone()
+    if first is not None:
+        start = bucket_start(float(first), seconds)
+        cursor.execute(sql['rebuild'].format(table=table, seconds=seconds), (start, float(end)))
+
+
+def select_rollup_level(timespan_hours, points):
+    """
+    Pick the coarsest rollup table whose buckets are still finer than the
+    requested resolution (timespan / points). Returns None if raw data is needed.
+    Tables whose horizon is shorter than the timespan are skipped, if none of
+    the fine enough tables is left, the next coarser one is used.
+    """
+    if not points:
+        return None
+    resolution = float(timespan_hours) * 3600 / points
+    if resolution < ROLLUP_LEVELS[0][1]:
+        return None
+    selected = None
+    for table, seconds in ROLLUP_LEVELS:
+        days = ROLLUP_RETENTION_DAYS.get(table)
+        if days is not None and timespan_hours > days * 24:
+            continue  # the start of the timespan has expired from this table
+        if seconds > resolution:
+            return selected or table
+        selected = table
+    return selected
+
+
+def expire_rollups(cursor, today, dialect='mysql'):
+    """Delete the buckets older than the horizon of their table, returns table -> deleted rows"""
+    deleted = {}
+    for table, _ in ROLLUP_LEVELS:
+        days = ROLLUP_RETENTION_DAYS.get(table)
+        if days is None:
+            continue
+        cutoff = datetime.datetime.combine(today - datetime.timedelta(days=days), datetime.time())
+        cursor.execute(DIALECT_SQL[dialect]['expire'].format(table=table), (int(cutoff.timestamp()),))
+        deleted[table] = cursor.rowcount
+    return deleted
+
+
+def fetch_rollup_rows(cursor, table, start_timestamp, dialect='mysql'):
+    cursor.execute(DIALECT_SQL[dialect]['select'].format(table=table), (start_timestamp,))
+    # integer divisions come back as Decimal, which would be serialized as strings
+    return [tuple(None if v is None else float(v) for v in row) for row in cursor.fetchall()]
@@ -0,0 +1,106 @@
+import json
+import os
+import threading
+from include.measurement_storage import existing_seconds
+
+
+class MeasurementSpool:
+    """
+    Append-only file for measurements which could not be written to the database
+
+    Every line is one row as JSON list:
+    (unix timestamp, temperature, humidity, eco2, light, fridge, co2, heater).
+    The byte position up to which rows were replayed is kept in a separate
+    offset file. It is written after the database commit, so a crash between
+    the two reads the batch again; replay() skips rows whose timestamp is
+    already stored. The spool is truncated once everything was replayed.
+    """
+    def __init__(self, path='spool/measurements.jsonl'):
+        self.path = path
+        self.offset_path = path + '.offset'
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def append(self, rows):
+        with self._lock:
+            with open(self.path, 'a') as file:
+                for row in rows:
+                    file.write(json.dumps(list(row)) + '\n')
+                file.flush()
+                os.fsync(file.fileno())
+
+    def _read_offset(self):
+        try:
+            with open(self.offset_path, 'r') as file:
+                return int(file.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _write_offset(self, offset):
+        tmp_path = self.offset_path + '.tmp'
+        with open(tmp_path, 'w') as file:
+            file.write(str(offset))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.offset_path)
+
+    def pending(self):
+        """Number of bytes which still have to be replayed"""
+        with self._lock:
+            try:
+                return max(0, os.path.getsize(self.path) - self._read_offset())
+            except OSError:
+                return 0
+
+    def read_batch(self, max_rows):
+        """Next rows to replay in insertion order and the offset after them"""
+        with self._lock:
+            offset = self._read_offset()
+            rows = []
+            try:
+                with open(self.path, 'r') as file:
+                    file.seek(offset)
+                    while len(rows) < max_rows:
+                        line = file.readline()
+                        if not line.endswith('\n'):
+                            # end of file or a partially written line from a crash
+                            break
+                        offset = file.tell()
+                        try:
+                            rows.append(tuple(json.loads(line)))
+                        except ValueError:
+                            continue
+            except OSError:
+                pass
+            return rows, offset
+
+    def commit(self, offset):
+        """Mark everything before offset as replayed"""
+        with self._lock:
+            try:
+                size = os.path.getsize(self.path)
+            except OSError:
+                size = 0
+            if offset >= size:
+                # fully replayed, start with an empty spool again
+                open(self.path, 'w').close()
+                offset = 0
+            self._write_offset(offset)
+
+    def replay(self, storage, batch_size=500):
+        """Insert the spooled rows into storage in recording order, returns the number of inserted rows"""
+        replayed = 0
+        while True:
+            rows, offset = self.read_batch(batch_size)
+            if rows:
+                # rows of a batch which was committed to the database but not to the offset file
+                existing = existing_seconds(storage, [round(row[0]) for row in rows])
+                new_rows = [row for row in rows if round(row[0]) not in existing]
+                if new_rows:
+                    storage.insert_rows(new_rows)
+                    replayed += len(new_rows)
+            self.commit(offset)
+            if len(rows) < batch_size:
+                return replayed
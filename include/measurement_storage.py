@@ -0,0 +1,531 @@
+"""
+Storage backends for the measurements.
+
+The data writer, the /data routes and the controllers only use the methods
+below, so small installations can run on an embedded SQLite file instead of a
+MariaDB server. The backend is selected with the "Storage" section of
+config.json:
+
+    "Storage": {"backend": "sqlite", "sqlitePath": "data/sensor_data.db"}
+
+Rows are exchanged as tuples:
+- inserted rows: (unix timestamp, temperature, humidity, eco2, light, fridge, co2, heater)
+- fetched rows: (temperature, humidity, eco2, light, fridge, co2, heater, unix timestamp, id)
+
+Raw rows of old days are moved into compressed blocks by the compaction job
+(see measurement_archive), fetch_window() and iter_table() decode them
+transparently. Archived rows have no id.
+
+Both backends raise their driver's exception classes, callers catch storage.Error.
+"""
+import datetime
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+import mysql.connector
+from include.database_pool import DatabasePool
+from include.measurement_retention import MeasurementRetention
+from include.measurement_rollups import ensure_rollup_tables, upsert_rollups, fetch_rollup_rows, expire_rollups
+from include.measurement_archive import (ensure_archive_table, iter_archived_rows, archive_day, expire_archive,
+                                         oldest_raw_timestamp, day_bounds)
+
+MEASUREMENT_COLUMNS = "temperature_c, humidity, eco2, light_state, fridge_state, co2_state, heater_state"
+INSERT_COLUMNS = "timestamp, " + MEASUREMENT_COLUMNS
+ARCHIVE_COLUMNS = MEASUREMENT_COLUMNS.split(', ')  # value order of decoded archive rows
+
+
+def merge_archived(cursor, rows, start_timestamp, dialect):
+    """Prepend archived rows in the fetched row format to rows fetched from the raw table"""
+    archived = [
+        tuple(row[1:]) + (row[0], None)
+        for block in iter_archived_rows(cursor, start_timestamp, time.time() + 86400, dialect)
+        for row in block
+    ]
+    if not archived:
+        return rows
+    # rows which arrived for an already archived day stay raw until the next compaction
+    return sorted(archived + list(rows), key=lambda row: row[7])
+
+
+def existing_archived(cursor, start_timestamp, end_timestamp, dialect):
+    return {
+        round(row[0])
+        for block in iter_archived_rows(cursor, start_timestamp, end_timestamp + 1, dialect)
+        for row in block
+    }
+
+
+def existing_seconds(storage, seconds, max_gap=3600):
+    """
+    The whole unix seconds out of seconds which are already stored. The storage is queried once per
+    run of seconds without a gap longer than max_gap, a sparse batch does not load everything in between.
+    """
+    seconds = sorted(set(seconds))
+    existing = set()
+    first = 0
+    for i in range(1, len(seconds) + 1):
+        if i == len(seconds) or seconds[i] - seconds[i - 1] > max_gap:
+            existing.update(storage.existing_timestamps(seconds[first] - 1, seconds[i - 1] + 1))
+            first = i
+    return existing.intersection(seconds)
+
+
+def archived_batches(cursor, columns, start_timestamp, end_timestamp, dialect):
+    """Archived rows as iter_table() batches: unix timestamp followed by the requested columns"""
+    indexes = [ARCHIVE_COLUMNS.index(column) + 1 for column in columns]
+    for block in iter_archived_rows(cursor, start_timestamp, end_timestamp, dialect):
+        yield [(row[0],) + tuple(row[i] for i in indexes) for row in block]
+
+
+class MySQLStorage:
+    dialect = 'mysql'
+    Error = mysql.connector.Error
+
+    def __init__(self, db_pool):
+        self.db_pool = db_pool
+
+    def ensure_schema(self):
+        # the measurements table itself is created by setup.sh
+        with self.db_pool.connection() as conn:
+            cursor = conn.cursor()
+            ensure_rollup_tables(cursor)
+            ensure_archive_table(cursor)
+            conn.commit()
+            cursor.close()
+
+    def insert_rows(self, rows):
+        """Insert rows with one statement and update the rollups in the same transaction"""
+        query = "INSERT INTO measurements ({}) VALUES {}".format(
+            INSERT_COLUMNS, ", ".join(["(FROM_UNIXTIME(%s), %s, %s, %s, %s, %s, %s, %s)"] * len(rows)))
+        with self.db_pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, [value for row in rows for value in row])
+            upsert_rollups(cursor, rows)
+            conn.commit()
+            cursor.close()
+
+    def fetch_window(self, start_timestamp):
+        query = """
+        SELECT {}, UNIX_TIMESTAMP(timestamp), id
+        FROM measurements
+        WHERE timestamp >= FROM_UNIXTIME(%s)
+        ORDER BY timestamp ASC
+        """.format(MEASUREMENT_COLUMNS)
+        with self.db_pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, (start_timestamp,))
+            rows = merge_archived(cursor, cursor.fetchall(), start_timestamp, self.dialect)
+            cursor.close()
+        return rows
+
+    def fetch_after_id(self, last_id, start_timestamp, limit):
+        query = """
+        SELECT {}, UNIX_TIMESTAMP(timestamp), id
+        FROM measurements
+        WHERE id > %s AND timestamp >= FROM_UNIXTIME(%s)
+        ORDER BY id ASC
+        LIMIT %s
+        """.format(MEASUREMENT_COLUMNS)
+        return self.db_pool.fetchall(query, (last_id, start_timestamp, limit))
+
+    def fetch_after_timestamp(self, timestamp, start_timestamp, limit):
+        query = """
+        SELECT {}, UNIX_TIMESTAMP(timestamp), id
+        FROM measurements
+        WHERE timestamp > FROM_UNIXTIME(%s) AND timestamp >= FROM_UNIXTIME(%s)
+        ORDER BY id ASC
+        LIMIT %s
+        """.format(MEASUREMENT_COLUMNS)
+        return self.db_pool.fetchall(query, (timestamp, start_timestamp, limit))
+
+    def fetch_rollups(self, table, start_timestamp):
+        with self.db_pool.connection() as conn:
+            cursor = conn.cursor()
+            rows = fetch_rollup_rows(cursor, table, start_timestamp)
+            cursor.close()
+        return rows
+
+    def iter_table(self, table, columns, time_column, start_timestamp, end_timestamp, batch_size=5000):
+        """
+        Rows of a range as batches, read through an unbuffered (server side) cursor so the result
+        is never held in memory completely. The first column is the unix timestamp.
+        """
+        query = "SELECT UNIX_TIMESTAMP({time}), {columns} FROM {table} " \
+                "WHERE {time} >= FROM_UNIXTIME(%s) AND {time} < FROM_UNIXTIME(%s) ORDER BY {time} ASC".format(
+                    time=time_column, columns=', '.join(columns), table=table)
+        # checked out by hand, an aborted stream must hand the connection back as discarded
+        conn = self.db_pool.acquire()
+        discard = False
+        try:
+            if table == 'measurements':
+                cursor = conn.cursor()
+                yield from archived_batches(cursor, columns, start_timestamp, end_timestamp, self.dialect)
+                cursor.close()
+            cursor = conn.cursor(buffered=False)
+            try:
+                cursor.execute(query, (start_timestamp, end_timestamp))
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield rows
+            finally:
+                try:
+                    cursor.close()
+                except self.Error:
+                    # stream was aborted with unread rows, the connection is not reusable
+                    discard = True
+        except self.Error:
+            discard = True
+            raise
+        finally:
+            self.db_pool.release(conn, discard)
+
+    def fetch_temperatures(self, start_timestamp):
+        query = """
+        SELECT temperature_c, timestamp
+        FROM measurements
+        WHERE timestamp >= FROM_UNIXTIME(%s)
+        ORDER BY timestamp ASC;
+        """
+        rows = self.db_pool.fetchall(query, (start_timestamp,))
+        return [row[0] for row in rows if row[0] is not None]
+
+    def max_id(self):
+        return self.db_pool.fetchone("SELECT MAX(id) FROM measurements")[0]
+
+    def existing_timestamps(self, start_timestamp, end_timestamp):
+        """Whole unix seconds of the raw and archived rows with start <= timestamp <= end"""
+        with self.db_pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT UNIX_TIMESTAMP(timestamp) FROM measurements "
+                "WHERE timestamp >= FROM_UNIXTIME(%s) AND timestamp <= FROM_UNIXTIME(%s)",
+                (start_timestamp, end_timestamp))
+            existing = {round(float(row[0])) for row in cursor.fetchall()}
+            existing.update(existing_archived(cursor, start_timestamp, end_timestamp, self.dialect))
+            cursor.close()
+        return existing
+
+    def oldest_raw_timestamp(self):
+        with self.db_pool.connection() as conn:
+            cursor = conn.cursor()
+            oldest = oldest_raw_timestamp(cursor, self.dialect)
+            cursor.close()
+        return oldest
+
+    def archive_day(self, day):
+        day_start, day_end = day_bounds(day)
+        with self.db_pool.connection() as conn:
+            cursor = conn.cursor()
+            moved = archive_day(cursor, day_start, day_end, self.dialect)
+            conn.commit()
+            cursor.close()
+        if moved:
+            # deleted rows leave their pages allocated, rebuilding the day's partition frees them
+            MeasurementRetention(self.db_pool).rebuild_partition(day)
+        return moved
+
+    def ping(self):
+        self.db_pool.fetchone("SELECT 1")
+
+    def stats(self):
+        return dict(self.db_pool.stats(), backend=self.dialect)
+
+    def retention(self):
+        return MeasurementRetention(self.db_pool)
+
+
+SQLITE_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS measurements (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp REAL NOT NULL,
+    temperature_c REAL,
+    humidity REAL,
+    eco2 INTEGER,
+    tvoc INTEGER,
+    co2_state INTEGER,
+    fridge_state INTEGER,
+    light_state INTEGER,
+    heater_state INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_measurements_timestamp ON measurements (timestamp);
+"""
+
+
+class SQLiteStorage:
+    """
+    Measurements in a single SQLite file
+
+    Same tables as the MySQL schema, timestamps are stored as unix seconds.
+    WAL mode lets the web app read while the data writer commits.
+
+    Connections are checked out from a small pool like the DatabasePool of the
+    MySQL backend: a connection is used by one thread at a time, but not bound
+    to it, so the threads the web server starts per request reuse the idle
+    connections instead of each opening (and leaking) one. At most pool_size
+    idle connections are kept, further ones are closed when returned.
+    """
+    dialect = 'sqlite'
+    Error = sqlite3.Error
+
+    def __init__(self, path='data/sensor_data.db', timeout=5.0, pool_size=4):
+        self.path = path
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._pool_lock = threading.Lock()
+        self._idle = []
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        self.connections_opened = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")  # durable at checkpoints, enough for sensor data
+        with self._pool_lock:
+            self.connections_opened += 1
+        if not self._schema_ready:
+            with self._schema_lock:
+                if not self._schema_ready:
+                    self._create_schema(conn)
+                    self._schema_ready = True
+        return conn
+
+    def _acquire(self):
+        with self._pool_lock:
+            if self._idle:
+                return self._idle.pop()
+        return self._connect()
+
+    def _release(self, conn):
+        if conn.in_transaction:
+            # a failed statement left the transaction open, the next user must not see it
+            conn.rollback()
+        with self._pool_lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    @contextmanager
+    def _connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def close(self):
+        """Close the idle connections, e.g. before the database file is removed"""
+        with self._pool_lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def _create_schema(self, conn):
+        conn.executescript(SQLITE_SCHEMA_SQL)
+        cursor = conn.cursor()
+        ensure_rollup_tables(cursor, self.dialect)
+        ensure_archive_table(cursor, self.dialect)
+        conn.commit()
+        cursor.close()
+
+    def _fetchall(self, query, params=()):
+        with self._connection() as conn:
+            return conn.execute(query, params).fetchall()
+
+    def ensure_schema(self):
+        with self._connection():
+            pass
+
+    def insert_rows(self, rows):
+        with self._connection() as conn:
+            try:
+                cursor = conn.cursor()
+                cursor.executemany(
+                    "INSERT INTO measurements ({}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)".format(INSERT_COLUMNS), rows)
+                upsert_rollups(cursor, rows, self.dialect)
+                conn.commit()
+                cursor.close()
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+
+    def fetch_window(self, start_timestamp):
+        query = """
+        SELECT {}, timestamp, id
+        FROM measurements
+        WHERE timestamp >= ?
+        ORDER BY timestamp ASC
+        """.format(MEASUREMENT_COLUMNS)
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, (start_timestamp,))
+            rows = merge_archived(cursor, cursor.fetchall(), start_timestamp, self.dialect)
+            cursor.close()
+        return rows
+
+    def fetch_after_id(self, last_id, start_timestamp, limit):
+        query = """
+        SELECT {}, timestamp, id
+        FROM measurements
+        WHERE id > ? AND timestamp >= ?
+        ORDER BY id ASC
+        LIMIT ?
+        """.format(MEASUREMENT_COLUMNS)
+        return self._fetchall(query, (last_id, start_timestamp, limit))
+
+    def fetch_after_timestamp(self, timestamp, start_timestamp, limit):
+        query = """
+        SELECT {}, timestamp, id
+        FROM measurements
+        WHERE timestamp > ? AND timestamp >= ?
+        ORDER BY id ASC
+        LIMIT ?
+        """.format(MEASUREMENT_COLUMNS)
+        return self._fetchall(query, (timestamp, start_timestamp, limit))
+
+    def fetch_rollups(self, table, start_timestamp):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            rows = fetch_rollup_rows(cursor, table, start_timestamp, self.dialect)
+            cursor.close()
+        return rows
+
+    def iter_table(self, table, columns, time_column, start_timestamp, end_timestamp, batch_size=5000):
+        """Rows of a range as batches, SQLite steps through the result as it is fetched"""
+        query = "SELECT {time}, {columns} FROM {table} WHERE {time} >= ? AND {time} < ? ORDER BY {time} ASC".format(
+            time=time_column, columns=', '.join(columns), table=table)
+        with self._connection() as conn:
+            if table == 'measurements':
+                cursor = conn.cursor()
+                yield from archived_batches(cursor, columns, start_timestamp, end_timestamp, self.dialect)
+                cursor.close()
+            cursor = conn.execute(query, (start_timestamp, end_timestamp))
+            try:
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield rows
+            finally:
+                cursor.close()
+
+    def fetch_temperatures(self, start_timestamp):
+        rows = self._fetchall(
+            "SELECT temperature_c FROM measurements WHERE timestamp >= ? ORDER BY timestamp ASC", (start_timestamp,))
+        return [row[0] for row in rows if row[0] is not None]
+
+    def max_id(self):
+        return self._fetchall("SELECT MAX(id) FROM measurements")[0][0]
+
+    def existing_timestamps(self, start_timestamp, end_timestamp):
+        """Whole unix seconds of the raw and archived rows with start <= timestamp <= end"""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT timestamp FROM measurements WHERE timestamp >= ? AND timestamp <= ?",
+                           (start_timestamp, end_timestamp))
+            existing = {round(row[0]) for row in cursor.fetchall()}
+            existing.update(existing_archived(cursor, start_timestamp, end_timestamp, self.dialect))
+            cursor.close()
+        return existing
+
+    def ping(self):
+        self._fetchall("SELECT 1")
+
+    def oldest_raw_timestamp(self):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            oldest = oldest_raw_timestamp(cursor, self.dialect)
+            cursor.close()
+        return oldest
+
+    def archive_day(self, day):
+        day_start, day_end = day_bounds(day)
+        with self._connection() as conn:
+            try:
+                cursor = conn.cursor()
+                moved = archive_day(cursor, day_start, day_end, self.dialect)
+                conn.commit()
+                cursor.close()
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+        return moved
+
+    def expire_archive(self, timestamp):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            deleted = expire_archive(cursor, timestamp, self.dialect)
+            conn.commit()
+            cursor.close()
+        return deleted
+
+    def expire_rollups(self, today):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            deleted = expire_rollups(cursor, today, self.dialect)
+            conn.commit()
+            cursor.close()
+        return deleted
+
+    def delete_before(self, timestamp, chunk_size=5000):
+        """Delete raw rows older than a unix timestamp in small transactions"""
+        deleted = 0
+        with self._connection() as conn:
+            while True:
+                cursor = conn.execute(
+                    "DELETE FROM measurements WHERE id IN "
+                    "(SELECT id FROM measurements WHERE timestamp < ? ORDER BY timestamp LIMIT ?)",
+                    (timestamp, chunk_size))
+                conn.commit()
+                deleted += cursor.rowcount
+                if cursor.rowcount < chunk_size:
+                    return deleted
+
+    def stats(self):
+        def size(path):
+            try:
+                return os.path.getsize(path)
+            except OSError:
+                return 0
+        return {
+            'backend': self.dialect,
+            'path': self.path,
+            'size_bytes': size(self.path),
+            'wal_bytes': size(self.path + '-wal'),
+            'connections_opened': self.connections_opened,
+            'connections_idle': len(self._idle),
+        }
+
+    def retention(self):
+        return SQLiteRetention(self)
+
+
+class SQLiteRetention(MeasurementRetention):
+    """Retention for the SQLite backend, which has no partitions to drop"""
+    def __init__(self, storage, retention_days=365, delete_chunk_size=5000):
+        super().__init__(None, retention_days=retention_days, delete_chunk_size=delete_chunk_size)
+        self.storage = storage
+
+    def apply(self, today=None):
+        today = today or datetime.date.today()
+        cutoff = datetime.datetime.combine(today - datetime.timedelta(days=self.retention_days), datetime.time())
+        self.storage.expire_archive(cutoff.timestamp())
+        self.storage.expire_rollups(today)
+        return self.storage.delete_before(cutoff.timestamp(), self.delete_chunk_size)
+
+
+def create_storage(storage_config, db_config, pool_size=6, liveness=None):
+    """Backend for the "Storage" section of the config, MySQL if nothing is configured"""
+    storage_config = storage_config or {}
+    if storage_config.get('backend', 'mysql') == 'sqlite':
+        return SQLiteStorage(storage_config.get('sqlitePath', 'data/sensor_data.db'))
+    return MySQLStorage(DatabasePool(db_config, pool_size=pool_size, checkout_timeout=5.0, recycle_time=1800,
+                                     liveness=liveness))
@@ -7,6 +7,7 @@ import threading
 import os
 
 from enum import Enum
+from include.clock import SYSTEM_CLOCK
 
 class DeviceType(Enum):
     LIGHT = 0
@@ -28,7 +29,8 @@ class SocketDevice:
         return f"Device: {self.friendly_name}, Availability: {self.availability}"
 
 class MQTT_Interface:
-    def __init__(self, broker, port, user, password):
+    def __init__(self, broker, port, user, password, clock=SYSTEM_CLOCK):
+        self.clock = clock
         self.broker = broker
         self.port = port
         self.user = user
@@ -50,6 +52,12 @@ class MQTT_Interface:
         self.zigbeeDevicesAlive = False
         self.availabiltyCheckCounter = 0
         self.scheduler = sched.scheduler(time.time, time.sleep)
+        # last command per socket, repeated commands are only published again shortly before on_time lapses
+        self.command_refresh_margin = 15  # seconds
+        self._command_lock = threading.Lock()
+        self._command_cache = {}  # friendly name -> (state, on_time, published at)
+        self.commands_published = {}
+        self.commands_suppressed = {}
         self.start_mqtt_loop()
         
         # Load device configuration before creating socket devices
@@ -66,6 +74,12 @@ class MQTT_Interface:
         
         # Add a list to store all discovered devices
         self.discovered_devices = []
+        # indexes of the lists above, messages are dispatched without scanning them
+        self._devices_by_name = {}
+        self._devices_by_topic = {}
+        self._discovered_by_name = {}
+        self._discovered_by_address = {}
+        self.index_devices()
 
     def start_mqtt_loop(self):
         mqtt_thread = threading.Thread(target=self.client.loop_forever)
@@ -74,6 +88,8 @@ class MQTT_Interface:
     def on_connect(self, client, userdata, flags, rc):
         if rc == 0:
             print("Connected to MQTT Broker")
+            # commands may have been lost while disconnected
+            self.invalidate_command_cache()
             self.client.subscribe("zigbee2mqtt/+/availability")
             self.client.subscribe("zigbee2mqtt/+/state")
         else:
@@ -113,8 +129,10 @@ class MQTT_Interface:
                             'description': device.get('description', '')
                         }
                         # append if friendly name is not already in list
-                        if device_info['friendly_name'] not in [d['friendly_name'] for d in self.discovered_devices]:
+                        if device_info['friendly_name'] not in self._discovered_by_name:
                             self.discovered_devices.append(device_info) 
+                            self._discovered_by_name[device_info['friendly_name']] = device_info
+                            self._discovered_by_address.setdefault(device_info['ieee_address'], device_info)
 
                         
                 # Verify that configured devices exist in discovered devices
@@ -125,20 +143,21 @@ class MQTT_Interface:
                 # process other messages
                 # my sockets do not attach the "/state" so i have to check for the device name
                 messagePayload = msg.payload.decode()
-                device_name = msg.topic.split('/')[1]
-                for device in self.devices:
-                    if device.friendly_name == device_name:
-                        state = json.loads(messagePayload).get("state")
-                        if state is not None:
-                            if state == "ON":
-                                device.state = True
-                            else:
-                                device.state = False
-                            device.internalLastSeen = time.time()
-                            # print(f"Device: {device.friendly_name}, State: {device.state}, Last seen: {device.internalLastSeen}")
+                device = self._devices_by_topic.get(msg.topic)
+                if device is not None:
+                    state = json.loads(messagePayload).get("state")
+                    if state is not None:
+                        if state == "ON":
+                            device.state = True
                         else:
-                            print("Error: No state found in payload")
-                        break
+                            device.state = False
+                        device.internalLastSeen = time.time()
+                        if not msg.topic.endswith('/availability'):
+                            # availability payloads ({"state": "online"}) say nothing about the relay
+                            self.check_command_cache(device.friendly_name, device.state)
+                        # print(f"Device: {device.friendly_name}, State: {device.state}, Last seen: {device.internalLastSeen}")
+                    else:
+                        print("Error: No state found in payload")
         except Exception as e:
             print(f"Error in on_message: {e}, Topic: {msg.topic}, Payload: {msg.payload}")
             
@@ -166,27 +185,24 @@ class MQTT_Interface:
         return self.discovered_devices
         
     def getDeviceState(self, friendly_name):
-        for device in self.devices:
-            if device.friendly_name == friendly_name:
-                return device.state
+        for device in self._devices_by_name.get(friendly_name, ()):
+            return device.state
         return None
     
     def checkDeviceAvailability(self, friendly_name):
-        for device in self.devices:
-            TIMEOUT_THRESHOLD = 20
-            if device.friendly_name == friendly_name:
-                current_time = time.time()
-                if device.internalLastSeen is not None:
-                    time_difference = current_time - device.internalLastSeen
-                    device.availability = time_difference <= TIMEOUT_THRESHOLD
-                else:
-                    device.availability = False
-
-                # Update discovered device availability
-                for discovered_device in self.discovered_devices:
-                    if discovered_device['friendly_name'] == friendly_name:
-                        discovered_device['available'] = device.availability
-                        break
+        TIMEOUT_THRESHOLD = 20
+        for device in self._devices_by_name.get(friendly_name, ()):
+            current_time = time.time()
+            if device.internalLastSeen is not None:
+                time_difference = current_time - device.internalLastSeen
+                device.availability = time_difference <= TIMEOUT_THRESHOLD
+            else:
+                device.availability = False
+
+            # Update discovered device availability
+            discovered_device = self._discovered_by_name.get(friendly_name)
+            if discovered_device is not None:
+                discovered_device['available'] = device.availability
 
         return None
     
@@ -292,30 +308,29 @@ class MQTT_Interface:
        
        
         deviceFound = False
-        for device in self.devices:
-            if device.friendly_name == ieee_address:
-                device.state = True
-                device.manualOverrideTimer = 10
-                device.manualOverrideActive = True
-                self.client.publish(TOPIC, payload)
-                deviceFound = True
+        self.invalidate_command_cache(ieee_address)
+        # several roles (e.g. fridge and heater) may be assigned to the same socket
+        for device in self._devices_by_name.get(ieee_address, ()):
+            device.state = True
+            device.manualOverrideTimer = 10
+            device.manualOverrideActive = True
+            deviceFound = True
+        self.client.publish(TOPIC, payload)
         if not deviceFound:
-            self.client.publish(TOPIC, payload)
             print("WARN: Device not assigned or not found")
 
     def switch_off(self, ieee_address):
         TOPIC = f"zigbee2mqtt/{ieee_address}/set"
         payload = '{"state": "OFF"}'
         deviceFound = False
-        for device in self.devices:
-            if device.friendly_name == ieee_address:
-                device.state = False
-                device.manualOverrideTimer = 10
-                device.manualOverrideActive = True
-                self.client.publish(TOPIC, payload)
-                deviceFound = True
+        self.invalidate_command_cache(ieee_address)
+        for device in self._devices_by_name.get(ieee_address, ()):
+            device.state = False
+            device.manualOverrideTimer = 10
+            device.manualOverrideActive = True
+            deviceFound = True
+        self.client.publish(TOPIC, payload)
         if not deviceFound:
-            self.client.publish(TOPIC, payload)
             print("WARN: Device not assigned or not found")
 
     def setFridgeState(self, state):
@@ -378,11 +393,17 @@ class MQTT_Interface:
     # {"state" : "ON", "on_time": 300}, 
     # {"state" : "ON", "on_time": 300, "off_wait_time": 120}   
     
+    # The controllers repeat their command every 1-5 seconds. Only a state change is published
+    # right away, an unchanged command is refreshed command_refresh_margin seconds before its on_time
+    # lapses (an OFF as well, in case the socket missed it or restarted). A state report that differs
+    # from the last command, a manual switch or a reconnect clears the socket's entry, so the next
+    # command is sent.
     def switchLedvanceSocket_4058075729261(self, friendly_name, state, on_time, off_wait_time):
         # TOPIC = f"zigbee2mqtt/{self.co2Socket.friendly_name}/set"
         # payload = '{"state": "ON"}' if state else '{"state": "OFF"}'
         
-        
+        if not self.should_publish_command(friendly_name, state, on_time):
+            return
         
         TOPIC = f"zigbee2mqtt/{friendly_name}/set"
         if state:
@@ -394,6 +415,46 @@ class MQTT_Interface:
             payload = '{"state": "OFF"}'
         self.client.publish(TOPIC, payload)
         
+    def should_publish_command(self, friendly_name, state, on_time):
+        now = self.clock.monotonic()
+        state = bool(state)
+        with self._command_lock:
+            cached = self._command_cache.get(friendly_name)
+            if cached is not None and cached[:2] == (state, on_time):
+                if now - cached[2] < float(on_time) - self.command_refresh_margin:
+                    self.commands_suppressed[friendly_name] = self.commands_suppressed.get(friendly_name, 0) + 1
+                    return False
+            self._command_cache[friendly_name] = (state, on_time, now)
+            self.commands_published[friendly_name] = self.commands_published.get(friendly_name, 0) + 1
+            return True
+
+    def check_command_cache(self, friendly_name, reported_state):
+        """Forget the last command if the socket reports another state, e.g. after a lost message"""
+        with self._command_lock:
+            cached = self._command_cache.get(friendly_name)
+            if cached is not None and cached[0] != reported_state:
+                del self._command_cache[friendly_name]
+
+    def invalidate_command_cache(self, friendly_name=None):
+        with self._command_lock:
+            if friendly_name is None:
+                self._command_cache.clear()
+            else:
+                self._command_cache.pop(friendly_name, None)
+
+    def command_stats(self):
+        with self._command_lock:
+            published = sum(self.commands_published.values())
+            suppressed = sum(self.commands_suppressed.values())
+            return {
+                'published': published,
+                'suppressed': suppressed,
+                'suppressed_ratio': round(suppressed / (published + suppressed), 3) if published + suppressed else 0.0,
+                'sockets': {name: {'published': self.commands_published.get(name, 0),
+                                   'suppressed': self.commands_suppressed.get(name, 0)}
+                            for name in set(self.commands_published) | set(self.commands_suppressed)},
+            }
+
     def switchNousSocket_A1Z(self, friendly_name, state, off_wait_time):
         # TOPIC = f"zigbee2mqtt/{self.co2Socket.friendly_name}/set"
         # payload = '{"state": "ON"}' if state else '{"state": "OFF"}'
@@ -448,17 +509,16 @@ class MQTT_Interface:
         return device
 
     def verify_configured_devices(self):
-        discovered_addresses = [device['ieee_address'] for device in self.discovered_devices]
-        
         for device in self.devices:
             if device.friendly_name:
-                if device.friendly_name not in discovered_addresses:
+                if device.friendly_name not in self._discovered_by_address:
                     print(f"Warning: Configured device {device.device_type.name} "
                           f"with address {device.friendly_name} not found in network")
 
     def reload_device_config(self):
         # Load new device configuration
         self.device_config = self.load_device_config()
+        self.invalidate_command_cache()
         
         # Update friendly names for existing socket devices
         for device in self.devices:
@@ -472,6 +532,20 @@ class MQTT_Interface:
                 device.internalLastSeen = None
                 device.manualOverrideTimer = 0
                 device.manualOverrideActive = False
+        self.index_devices()
+
+    def index_devices(self):
+        # state reports arrive on zigbee2mqtt/<name>, the subscriptions also deliver /availability and /state.
+        # Names map to all devices with that name, a socket may be assigned to more than one role.
+        self._devices_by_name = {}
+        self._devices_by_topic = {}
+        for device in self.devices:
+            if not device.friendly_name:
+                continue
+            self._devices_by_name.setdefault(device.friendly_name, []).append(device)
+            base_topic = f"zigbee2mqtt/{device.friendly_name}"
+            for topic in (base_topic, f"{base_topic}/availability", f"{base_topic}/state"):
+                self._devices_by_topic.setdefault(topic, device)
 
     # def get_devices(self):
     #     return self.devices
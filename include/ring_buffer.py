@@ -0,0 +1,168 @@
+import threading
+import time
+import numpy as np
+
+# One row per sensor reading, states as 0/1, missing analog values as NaN
+SAMPLE_DTYPE = np.dtype([
+    ('timestamp', '<f8'),  # unix time
+    ('temperature', '<f4'),
+    ('humidity', '<f4'),
+    ('co2', '<f4'),
+    ('light_state', 'u1'),
+    ('fridge_state', 'u1'),
+    ('co2_state', 'u1'),
+    ('heater_state', 'u1'),
+])
+
+ANALOG_FIELDS = ('temperature', 'humidity', 'co2')
+STATE_FIELDS = ('light_state', 'fridge_state', 'co2_state', 'heater_state')
+
+DEFAULT_SPAN = 24 * 3600  # seconds the buffer should cover
+DEFAULT_CAPACITY = int(DEFAULT_SPAN / 5 * 1.25)  # samples every 5 seconds plus margin
+
+
+class SampleRingBuffer:
+    """
+    Preallocated ring buffer with the most recent sensor samples
+
+    The data writer appends every reading, the web app and the controllers read
+    time windows from it instead of querying the database. Rows are kept in
+    timestamp order, so a window is found with a binary search and returned as
+    a slice of at most two contiguous segments.
+
+    covered_since is the unix time from which the buffer holds every sample.
+    It starts with the first appended sample, load_history() extends it into
+    the past with rows from the database. Windows starting before it have to
+    be read from MySQL.
+    """
+    def __init__(self, capacity=DEFAULT_CAPACITY, span=DEFAULT_SPAN):
+        self.capacity = capacity
+        self.span = span
+        self._lock = threading.Lock()
+        self._buffer = np.zeros(capacity, dtype=SAMPLE_DTYPE)
+        self._head = 0  # index of the next write
+        self._count = 0
+        self._version = 0
+        self.covered_since = None
+
+    @staticmethod
+    def _to_record(row):
+        # row: (unix timestamp, temperature, humidity, co2, light, fridge, co2 valve, heater)
+        values = [np.nan if v is None else v for v in row[:4]] + [1 if v else 0 for v in row[4:8]]
+        return tuple(values)
+
+    def _segments(self):
+        """Stored rows as one or two views in chronological order, called with the lock held"""
+        if self._count < self.capacity:
+            return [self._buffer[:self._count]]
+        return [self._buffer[self._head:], self._buffer[:self._head]]
+
+    def _oldest_timestamp(self):
+        if self._count == 0:
+            return None
+        index = 0 if self._count < self.capacity else self._head
+        return float(self._buffer['timestamp'][index])
+
+    def _latest_timestamp(self):
+        if self._count == 0:
+            return None
+        return float(self._buffer['timestamp'][(self._head - 1) % self.capacity])
+
+    def append(self, row):
+        """Add a sample, samples older than the newest stored one are ignored"""
+        record = self._to_record(row)
+        with self._lock:
+            latest = self._latest_timestamp()
+            if latest is not None and record[0] < latest:
+                return False
+            self._buffer[self._head] = record
+            self._head = (self._head + 1) % self.capacity
+            if self._count < self.capacity:
+                self._count += 1
+            if self.covered_since is None:
+                self.covered_since = record[0]
+            elif self._count == self.capacity:
+                # the oldest sample was overwritten
+                self.covered_since = max(self.covered_since, self._oldest_timestamp())
+            self._version += 1
+            return True
+
+    def load_history(self, rows, since):
+        """
+        Prepend rows from the database which are older than the stored samples.
+        since is the start of the range the rows were queried for.
+        """
+        records = [self._to_record(row) for row in rows]
+        with self._lock:
+            oldest = self._oldest_timestamp()
+            if oldest is not None:
+                records = [r for r in records if r[0] < oldest]
+            history = np.array(records, dtype=SAMPLE_DTYPE)
+            current = np.concatenate(self._segments()) if self._count else np.zeros(0, dtype=SAMPLE_DTYPE)
+            combined = np.concatenate((history, current))[-self.capacity:]
+
+            self._buffer[:len(combined)] = combined
+            self._count = len(combined)
+            self._head = self._count % self.capacity
+            self.covered_since = since
+            if len(combined) == self.capacity:
+                self.covered_since = max(since, float(combined['timestamp'][0]))
+            self._version += 1
+
+    def covers(self, start):
+        with self._lock:
+            return self.covered_since is not None and self.covered_since <= start
+
+    def window(self, start, end=None, include_start=True):
+        """Copy of the samples with start <= timestamp (< end), in chronological order"""
+        with self._lock:
+            parts = []
+            for segment in self._segments():
+                timestamps = segment['timestamp']
+                lo = np.searchsorted(timestamps, start, side='left' if include_start else 'right')
+                hi = len(segment) if end is None else np.searchsorted(timestamps, end, side='left')
+                if hi > lo:
+                    parts.append(segment[lo:hi])
+            if not parts:
+                return np.zeros(0, dtype=SAMPLE_DTYPE)
+            return np.concatenate(parts)
+
+    def last(self, seconds, now=None):
+        now = time.time() if now is None else now
+        return self.window(now - seconds)
+
+    def latest(self):
+        """Newest sample as a structured scalar or None"""
+        with self._lock:
+            if self._count == 0:
+                return None
+            return self._buffer[(self._head - 1) % self.capacity].copy()
+
+    def latest_timestamp(self):
+        with self._lock:
+            return self._latest_timestamp()
+
+    @property
+    def version(self):
+        with self._lock:
+            return self._version
+
+    def __len__(self):
+        with self._lock:
+            return self._count
+
+
+def samples_to_rows(samples):
+    """
+    Structured samples as /data rows:
+    (temperature, humidity, co2, light, fridge, co2 valve, heater, unix timestamp), NaN as None
+    """
+    columns = []
+    for field in ANALOG_FIELDS:
+        values = samples[field].astype(object)
+        values[np.isnan(samples[field])] = None
+        columns.append(values.tolist())
+    for field in STATE_FIELDS:
+        columns.append(samples[field].tolist())
+    columns.append(samples['timestamp'].tolist())
+    return list(zip(*columns))
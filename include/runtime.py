@@ -0,0 +1,191 @@
+"""
+One asyncio event loop hosting all periodic jobs of the web app.
+
+The controllers, uploaders and maintenance jobs were written for
+sched.scheduler: a callback does its work and re-arms itself with
+sc.enter(delay, priority, action, argument). Runtime.scheduler() returns a
+JobScheduler with the same enter() method, so the callbacks run unchanged.
+
+- the timers of all jobs live in the event loop (one thread)
+- the callbacks themselves are blocking and run in a small thread pool,
+  'control' for the controllers and 'io' for uploads and the camera, so a
+  slow HTTP request does not delay the fridge or the heater
+- callbacks of one JobScheduler never run concurrently, like with their own
+  sched.scheduler thread. Different schedulers run in parallel.
+- a callback that raises is logged and, as before, not re-armed
+
+Every run is timed: the start lag (actual start minus the time the job was
+due), the execution time and overruns, runs longer than the job's budget.
+The budget is given per scheduler or defaults to the delay the job last
+re-armed itself with, i.e. its period. Delays entered from outside a run,
+like the start-up delay of the first run, do not count. Lags and durations go into bounded
+histograms. Runtime.jobs() lists every scheduler with its next run and these
+statistics, Runtime.log_summary() is a periodic job logging them.
+"""
+import asyncio
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from include.latency_histogram import LatencyHistogram
+
+
+class JobScheduler:
+    """enter()-compatible stand-in for sched.scheduler, priority is accepted but not used"""
+    def __init__(self, runtime, name, executor='control', budget=None):
+        self.runtime = runtime
+        self.name = name
+        self.executor = executor
+        self.budget = budget  # seconds, None: the delay the job re-arms itself with
+        self._period = None
+        self._lock = threading.Lock()
+        self._pending = {}  # token -> due (unix time)
+        self._run_lock = None  # asyncio.Lock, created in the loop
+        self.running = None
+        self.runs = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_start = None
+        self.last_duration = None
+        self.max_duration = 0.0
+        self.overruns = 0
+        self.start_lag = LatencyHistogram()
+        self.duration = LatencyHistogram()
+
+    def enter(self, delay, priority, action, argument=(), kwargs=None):
+        token = object()
+        with self._lock:
+            self._pending[token] = None  # due is set when the loop arms the timer
+            if delay > 0 and self.running is not None:
+                # entered by the running job itself
+                self._period = delay
+        self.runtime.loop.call_soon_threadsafe(self._arm, delay, token, action, argument, kwargs or {})
+        return token
+
+    def _arm(self, delay, token, action, argument, kwargs):
+        with self._lock:
+            self._pending[token] = time.time() + delay
+        self.runtime.loop.call_later(
+            delay, lambda: self.runtime.loop.create_task(self._execute(token, action, argument, kwargs)))
+
+    async def _execute(self, token, action, argument, kwargs):
+        if self._run_lock is None:
+            self._run_lock = asyncio.Lock()
+        async with self._run_lock:
+            name = getattr(action, '__qualname__', repr(action))
+            started = time.monotonic()
+            with self._lock:
+                due = self._pending.pop(token, None)
+                self.running = name
+                self.last_start = time.time()
+                if due is not None:
+                    self.start_lag.record(self.last_start - due)
+            try:
+                await self.runtime.loop.run_in_executor(
+                    self.runtime.executors[self.executor], functools.partial(action, *argument, **kwargs))
+            except Exception as e:
+                logging.error(f"[Runtime] Job {self.name} ({name}) failed: {e}")
+                with self._lock:
+                    self.failures += 1
+                    self.last_error = f"{name}: {e}"
+            finally:
+                duration = time.monotonic() - started
+                with self._lock:
+                    self.running = None
+                    self.runs += 1
+                    self.last_duration = duration
+                    self.max_duration = max(self.max_duration, duration)
+                    self.duration.record(duration)
+                    budget = self._budget()
+                    if budget is not None and duration > budget:
+                        self.overruns += 1
+
+    def _budget(self):
+        return self.budget if self.budget is not None else self._period
+
+    def status(self, buckets=False):
+        with self._lock:
+            due = [d for d in self._pending.values() if d is not None]
+            budget = self._budget()
+            status = {
+                'name': self.name,
+                'executor': self.executor,
+                'pending': len(self._pending),
+                'next_run_in_s': round(min(due) - time.time(), 1) if due else None,
+                'running': self.running,
+                'runs': self.runs,
+                'failures': self.failures,
+                'last_error': self.last_error,
+                'last_duration_ms': None if self.last_duration is None else round(1000 * self.last_duration, 1),
+                'max_duration_ms': round(1000 * self.max_duration, 1),
+                'budget_ms': None if budget is None else round(1000 * budget, 1),
+                'overruns': self.overruns,
+                'start_lag_ms': self.start_lag.summary(),
+                'duration_ms': self.duration.summary(),
+            }
+            if buckets:
+                status['start_lag_buckets_ms'] = self.start_lag.buckets()
+                status['duration_buckets_ms'] = self.duration.buckets()
+            return status
+
+
+class Runtime:
+    def __init__(self, control_workers=4, io_workers=2):
+        self.loop = asyncio.new_event_loop()
+        self.executors = {
+            'control': ThreadPoolExecutor(control_workers, thread_name_prefix='runtime-control'),
+            'io': ThreadPoolExecutor(io_workers, thread_name_prefix='runtime-io'),
+        }
+        self.schedulers = []
+        self.thread = None
+
+    def scheduler(self, name, executor='control', budget=None):
+        if executor not in self.executors:
+            raise ValueError("executor must be one of {}".format(', '.join(self.executors)))
+        scheduler = JobScheduler(self, name, executor, budget)
+        self.schedulers.append(scheduler)
+        return scheduler
+
+    def start(self):
+        """Start the loop thread, jobs entered before only start counting their delay now"""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name='runtime', daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+        # stopped: cancel jobs waiting for their scheduler, callbacks already running finish in their thread
+        pending = asyncio.all_tasks(self.loop)
+        for task in pending:
+            task.cancel()
+        self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        self.loop.close()
+
+    def stop(self):
+        if self.thread is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+        for executor in self.executors.values():
+            executor.shutdown(wait=False)
+
+    def jobs(self, buckets=False):
+        return [scheduler.status(buckets) for scheduler in self.schedulers]
+
+    def log_summary(self, sc, interval=900):
+        """Periodic job, one log line per scheduler with its timing percentiles"""
+        for status in self.jobs():
+            lag = status['start_lag_ms']
+            duration = status['duration_ms']
+            if not duration['count']:
+                continue
+            message = (f"[Runtime] Job {status['name']}: {status['runs']} runs, "
+                       f"start lag p50 {lag['p50']} / p99 {lag['p99']} / max {lag['max']} ms, "
+                       f"duration p50 {duration['p50']} / p99 {duration['p99']} / max {duration['max']} ms, "
+                       f"{status['overruns']} overruns, {status['failures']} failures")
+            if status['overruns'] or status['failures']:
+                logging.warning(message)
+            else:
+                logging.info(message)
+        sc.enter(interval, 1, self.log_summary, (sc, interval,))
@@ -0,0 +1,108 @@
+import logging
+import threading
+import time
+
+
+class SampleBus:
+    """
+    Runs the controllers once per new sensor sample instead of on their own 5 second clocks
+
+    The bus listens to the LatestSampleStore. For every published sample each
+    subscriber's on_sample(sample) is entered into the subscriber's scheduler
+    (a JobScheduler of the runtime or a sched.scheduler), so a controller never
+    runs concurrently with itself and a slow one does not delay the others.
+    If a subscriber is still busy when further samples arrive, they are
+    coalesced: it runs once more with the newest sample, never with an old one.
+
+    watchdog() is a periodic job. If no sample arrived for timeout seconds, every
+    subscriber's safe_mode() is run on each check until samples come back.
+    """
+    def __init__(self, sample_store, timeout=15.0, check_interval=5.0, clock=time.time):
+        self.sample_store = sample_store
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self.safe_mode_active = False
+        self.published = 0
+        self.safe_mode_entries = 0
+        sample_store.subscribe(self.publish)
+
+    def subscribe(self, name, scheduler, on_sample, safe_mode):
+        subscriber = {'name': name, 'scheduler': scheduler, 'on_sample': on_sample, 'safe_mode': safe_mode,
+                      'queued': False, 'delivered_version': 0, 'runs': 0, 'coalesced': 0, 'safe_mode_runs': 0,
+                      'last_lag': None}
+        with self._lock:
+            self._subscribers.append(subscriber)
+
+    def publish(self, sample, version):
+        """Listener of the sample store, called in the sensor thread"""
+        with self._lock:
+            self.published += 1
+            if self.safe_mode_active:
+                logging.info("[SampleBus] Samples are back, leaving safe mode")
+                self.safe_mode_active = False
+            due = []
+            for subscriber in self._subscribers:
+                if subscriber['queued']:
+                    subscriber['coalesced'] += 1
+                else:
+                    subscriber['queued'] = True
+                    due.append(subscriber)
+        for subscriber in due:
+            try:
+                subscriber['scheduler'].enter(0, 1, self._deliver, (subscriber,))
+            except Exception as e:
+                with self._lock:
+                    subscriber['queued'] = False
+                logging.error(f"[SampleBus] Could not dispatch sample to {subscriber['name']}: {e}")
+
+    def _deliver(self, subscriber):
+        sample, version = self.sample_store.snapshot()
+        with self._lock:
+            subscriber['queued'] = False
+            if sample is None or version == subscriber['delivered_version']:
+                return
+            subscriber['delivered_version'] = version
+            subscriber['runs'] += 1
+            subscriber['last_lag'] = self.clock() - sample.timestamp
+        subscriber['on_sample'](sample)
+
+    def watchdog(self, sc):
+        age = self.sample_store.age(self.clock())
+        if age is None or age > self.timeout:
+            with self._lock:
+                if not self.safe_mode_active:
+                    self.safe_mode_active = True
+                    self.safe_mode_entries += 1
+                    if age is None:
+                        logging.error("[SampleBus] No sensor sample yet, controllers run in safe mode")
+                    else:
+                        logging.error(f"[SampleBus] No sensor sample for {age:.0f} seconds, controllers run in safe mode")
+                subscribers = list(self._subscribers)
+            for subscriber in subscribers:
+                subscriber['scheduler'].enter(0, 1, self._run_safe_mode, (subscriber,))
+        sc.enter(self.check_interval, 1, self.watchdog, (sc,))
+
+    def _run_safe_mode(self, subscriber):
+        with self._lock:
+            if not self.safe_mode_active:
+                return
+            subscriber['safe_mode_runs'] += 1
+        subscriber['safe_mode']()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'published': self.published,
+                'safe_mode': self.safe_mode_active,
+                'safe_mode_entries': self.safe_mode_entries,
+                'subscribers': [{
+                    'name': s['name'],
+                    'runs': s['runs'],
+                    'coalesced': s['coalesced'],
+                    'safe_mode_runs': s['safe_mode_runs'],
+                    'last_lag_ms': None if s['last_lag'] is None else round(1000 * s['last_lag'], 1),
+                } for s in self._subscribers],
+            }
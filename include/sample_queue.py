@@ -0,0 +1,100 @@
+import threading
+import time
+from collections import deque
+
+DROP_OLDEST = 'drop_oldest'
+COALESCE = 'coalesce'
+POLICIES = (DROP_OLDEST, COALESCE)
+
+
+class SampleQueue:
+    """
+    Bounded queue between the sensor acquisition loop and the database writer thread
+
+    put() never blocks, the sampling cadence must not depend on the database.
+    If the writer falls behind until the queue is full:
+
+    - drop_oldest: the oldest queued sample is discarded
+    - coalesce: the newest queued sample is replaced by the incoming one, the
+      older backlog is kept and only the most recent readings are thinned out
+
+    The writer takes batches with get_batch(). Latencies from the reading to
+    the commit are reported back with record_latency() for the metrics.
+    """
+    def __init__(self, maxsize=720, policy=DROP_OLDEST, latency_window=500):
+        if policy not in POLICIES:
+            raise ValueError("policy must be one of {}".format(', '.join(POLICIES)))
+        self.maxsize = maxsize
+        self.policy = policy
+        self._items = deque()
+        self._condition = threading.Condition()
+        self._latencies = deque(maxlen=latency_window)
+        self.max_depth = 0
+        self.enqueued = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.written = 0
+
+    def put(self, sample):
+        with self._condition:
+            if len(self._items) >= self.maxsize:
+                if self.policy == DROP_OLDEST:
+                    self._items.popleft()
+                    self.dropped += 1
+                else:
+                    self._items.pop()
+                    self.coalesced += 1
+            self._items.append(sample)
+            self.enqueued += 1
+            self.max_depth = max(self.max_depth, len(self._items))
+            self._condition.notify()
+
+    def get_batch(self, max_items, timeout):
+        """
+        Wait until max_items samples are queued or timeout seconds have passed,
+        then take up to max_items. Returns an empty list if nothing arrived.
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while len(self._items) < max_items:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            count = min(max_items, len(self._items))
+            return [self._items.popleft() for _ in range(count)]
+
+    def record_latency(self, samples, now=None):
+        """End-to-end latency of written samples, from the sensor reading to the commit"""
+        now = time.time() if now is None else now
+        with self._condition:
+            self.written += len(samples)
+            self._latencies.extend(now - sample.timestamp for sample in samples)
+
+    def __len__(self):
+        with self._condition:
+            return len(self._items)
+
+    def stats(self):
+        with self._condition:
+            latencies = sorted(self._latencies)
+            depth = len(self._items)
+
+        def percentile(fraction):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(fraction * len(latencies)))], 3)
+
+        return {
+            'depth': depth,
+            'max_depth': self.max_depth,
+            'capacity': self.maxsize,
+            'policy': self.policy,
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+            'latency_p50_s': percentile(0.5),
+            'latency_p95_s': percentile(0.95),
+            'latency_max_s': round(latencies[-1], 3) if latencies else None,
+        }
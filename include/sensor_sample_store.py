@@ -0,0 +1,91 @@
+import threading
+import time
+from dataclasses import dataclass
+from include.clock import SYSTEM_CLOCK
+
+# Values returned by the controllers' sensor getters if no usable sample exists
+SENSOR_VALUE_MISSING = -999
+SENSOR_VALUE_STALE = -998
+
+
+@dataclass(frozen=True)
+class SensorSample:
+    """One reading of the environment sensor together with the actuator states"""
+    timestamp: float  # unix time of the reading
+    temperature: float
+    humidity: float
+    co2: float
+    light_state: bool = False
+    fridge_state: bool = False
+    co2_state: bool = False
+    heater_state: bool = False
+
+    def age(self, now=None):
+        now = time.time() if now is None else now
+        return now - self.timestamp
+
+
+class LatestSampleStore:
+    """
+    Thread safe store for the most recent sensor sample
+
+    The data writer publishes every new reading, the controllers and the web app
+    read it instead of querying the newest row from the database. Samples are
+    immutable, so a reader always gets a consistent snapshot without copying.
+
+    Listeners added with subscribe() are called with every published sample and
+    its version, in the publishing thread, so they must return quickly.
+    """
+    def __init__(self, max_age=60, clock=SYSTEM_CLOCK):
+        self.max_age = max_age  # seconds after which a sample is considered stale
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._sample = None
+        self._version = 0
+        self._listeners = []
+
+    def subscribe(self, listener):
+        with self._lock:
+            self._listeners.append(listener)
+
+    def publish(self, sample):
+        with self._lock:
+            self._sample = sample
+            self._version += 1
+            version = self._version
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(sample, version)
+
+    def latest(self):
+        """Newest sample or None if nothing was published yet"""
+        with self._lock:
+            return self._sample
+
+    def snapshot(self):
+        """Newest sample and the number of samples published so far"""
+        with self._lock:
+            return self._sample, self._version
+
+    @property
+    def version(self):
+        with self._lock:
+            return self._version
+
+    def age(self, now=None):
+        sample = self.latest()
+        if sample is None:
+            return None
+        return sample.age(self.clock.time() if now is None else now)
+
+    def is_stale(self, max_age=None, now=None):
+        max_age = self.max_age if max_age is None else max_age
+        age = self.age(now)
+        return age is None or age > max_age
+
+    def fresh(self, max_age=None):
+        """Newest sample if it is not stale, otherwise None"""
+        sample = self.latest()
+        if sample is None or sample.age(self.clock.time()) > (self.max_age if max_age is None else max_age):
+            return None
+        return sample
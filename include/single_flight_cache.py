@@ -0,0 +1,78 @@
+import threading
+from collections import OrderedDict
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlightCache:
+    """
+    Small LRU cache of computed results where concurrent misses of the same key
+    are coalesced: the first caller computes, the others wait for its result.
+
+    Keys should contain the version of the data the result is computed from,
+    entries of old versions are never hit again and are evicted by the LRU.
+    Errors are passed to all waiting callers but not cached.
+    """
+    def __init__(self, max_entries=16):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, key, compute):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._in_flight[key] = call
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = compute()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+                if call.error is None:
+                    self._entries[key] = call.value
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            call.done.set()
+        return call.value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'in_flight': len(self._in_flight),
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+            }
@@ -0,0 +1,154 @@
+import math
+import threading
+from collections import deque
+
+
+class RollingTrend:
+    """
+    Trend of one signal over a time based window
+
+    Keeps running sums for a least-squares line through the samples of the
+    last window_seconds, so adding a sample and reading the slope are O(1)
+    (amortized, old samples are evicted as new ones arrive). The least-squares
+    slope uses every sample in the window and is not thrown off by a single
+    noisy reading like a first/last difference.
+
+    In addition an exponentially weighted moving average of the sample to
+    sample derivative reacts faster to recent changes.
+    """
+    def __init__(self, window_seconds=120, ewma_halflife=60, min_samples=3, rebuild_every=1000):
+        self.window_seconds = window_seconds
+        self.ewma_halflife = ewma_halflife
+        self.min_samples = min_samples
+        self.rebuild_every = rebuild_every
+        self._samples = deque()
+        self._reference = None  # timestamps are summed relative to this to keep precision
+        self._n = 0
+        self._sum_t = 0.0
+        self._sum_v = 0.0
+        self._sum_tt = 0.0
+        self._sum_tv = 0.0
+        self._adds_since_rebuild = 0
+        self._ewma = None
+        self._last = None
+
+    def _rebuild(self):
+        # recompute the sums from scratch so floating point errors of add/remove do not accumulate
+        self._reference = self._samples[0][0] if self._samples else None
+        self._n = 0
+        self._sum_t = self._sum_v = self._sum_tt = self._sum_tv = 0.0
+        for t, v in self._samples:
+            self._accumulate(t, v, 1)
+        self._adds_since_rebuild = 0
+
+    def _accumulate(self, t, v, sign):
+        x = t - self._reference
+        self._n += sign
+        self._sum_t += sign * x
+        self._sum_v += sign * v
+        self._sum_tt += sign * x * x
+        self._sum_tv += sign * x * v
+
+    def add(self, timestamp, value):
+        if value is None or (isinstance(value, float) and math.isnan(value)):
+            return
+        if self._last is not None:
+            dt = timestamp - self._last[0]
+            if dt <= 0:
+                return  # samples must arrive in time order
+            derivative = (value - self._last[1]) / dt
+            if self._ewma is None:
+                self._ewma = derivative
+            else:
+                alpha = 1.0 - math.exp(-dt * math.log(2) / self.ewma_halflife)
+                self._ewma += alpha * (derivative - self._ewma)
+        self._last = (timestamp, value)
+
+        if self._reference is None:
+            self._reference = timestamp
+        self._samples.append((timestamp, value))
+        self._accumulate(timestamp, value, 1)
+        self._adds_since_rebuild += 1
+
+        while self._samples and self._samples[0][0] < timestamp - self.window_seconds:
+            old_t, old_v = self._samples.popleft()
+            self._accumulate(old_t, old_v, -1)
+
+        if self._adds_since_rebuild >= self.rebuild_every:
+            self._rebuild()
+
+    def count(self):
+        return self._n
+
+    def span(self):
+        """Seconds between the oldest and the newest sample in the window"""
+        if not self._samples:
+            return 0.0
+        return self._samples[-1][0] - self._samples[0][0]
+
+    def slope(self):
+        """Least-squares slope in units per second, None with too few samples"""
+        if self._n < self.min_samples:
+            return None
+        denominator = self._n * self._sum_tt - self._sum_t * self._sum_t
+        if denominator <= 0:
+            return None
+        return (self._n * self._sum_tv - self._sum_t * self._sum_v) / denominator
+
+    def ewma_slope(self):
+        """Smoothed sample to sample derivative in units per second"""
+        return self._ewma
+
+
+class TrendEstimator:
+    """
+    Thread safe collection of RollingTrend instances, one per registered signal
+
+    The data writer adds every sample, the controllers ask for slopes in units
+    per minute (e.g. °C/min) without touching the database.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._trends = {}
+
+    def register(self, name, window_seconds=120, ewma_halflife=60, min_samples=3):
+        with self._lock:
+            if name not in self._trends:
+                self._trends[name] = RollingTrend(window_seconds, ewma_halflife, min_samples)
+            return self._trends[name]
+
+    def add(self, name, timestamp, value):
+        with self._lock:
+            trend = self._trends.get(name)
+            if trend is not None:
+                trend.add(timestamp, value)
+
+    def add_sample(self, timestamp, **values):
+        """Add the values of one reading to all registered signals of the same name"""
+        with self._lock:
+            for name, value in values.items():
+                trend = self._trends.get(name)
+                if trend is not None:
+                    trend.add(timestamp, value)
+
+    def slope_per_minute(self, name):
+        with self._lock:
+            trend = self._trends.get(name)
+            slope = trend.slope() if trend is not None else None
+        return None if slope is None else slope * 60.0
+
+    def ewma_slope_per_minute(self, name):
+        with self._lock:
+            trend = self._trends.get(name)
+            slope = trend.ewma_slope() if trend is not None else None
+        return None if slope is None else slope * 60.0
+
+    def window_seconds(self, name):
+        with self._lock:
+            trend = self._trends.get(name)
+            return None if trend is None else trend.window_seconds
+
+    def sample_count(self, name):
+        with self._lock:
+            trend = self._trends.get(name)
+            return 0 if trend is None else trend.count()
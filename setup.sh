@@ -63,8 +63,8 @@ EOF
 sudo mariadb -u root -ppassword <<EOF
 USE sensor_data;
 CREATE TABLE IF NOT EXISTS measurements (
-    id INT AUTO_INCREMENT PRIMARY KEY,
-    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    id INT AUTO_INCREMENT,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     temperature_c FLOAT,
     humidity FLOAT,
     eco2 INT,
@@ -72,7 +72,12 @@ CREATE TABLE IF NOT EXISTS measurements (
     co2_state TINYINT,
     fridge_state TINYINT,
     light_state TINYINT,
-    heater_state TINYINT
+    heater_state TINYINT,
+    PRIMARY KEY (id, timestamp),
+    INDEX idx_measurements_timestamp (timestamp)
+)
+PARTITION BY RANGE (UNIX_TIMESTAMP(timestamp)) (
+    PARTITION pmax VALUES LESS THAN MAXVALUE
 );
 EOF
 
@@ -406,6 +406,10 @@ function zigbeePairing(state) {
 
 
 var timespan = 1; // default timespan to 1 hour
+var chartPointBudget = 1000; // the server downsamples the history to this number of points
+var dataCursor = null; // newest measurement id the charts contain, null forces a full reload
+var chartColumns = null; // columns of the charted window, the last one holds the unix timestamps
+var appendedRows = 0; // rows appended since the last full reload
 
 function movingAverage(data, period) {
     let result = [];
@@ -450,6 +454,7 @@ function averageData(data, interval) {
 function updateTimespan() {
     var newTimespan = document.getElementById('timespan').value;
     timespan = parseInt(newTimespan, 10);
+    dataCursor = null;
     fetchData(); // Immediately fetch new data with the updated timespan
 }
 
@@ -585,7 +590,7 @@ function getTimespanLabel() {
     }
 }
 
-function updateChart(chart, data) {
+function updateChart(chart, data, timestamps) {
     if (data[0].length === 0) {
         console.log("Data array is empty, resetting chart data.");
         chart.data.labels = [];
@@ -595,9 +600,11 @@ function updateChart(chart, data) {
     } else {
         // Sample data if there are too many points and timespan > 2h
         let sampledData = data;
+        let sampledTimestamps = timestamps;
         if (timespan > 2 && data[0].length > 3600) {
             const sampleRate = Math.ceil(data[0].length / 3600);
             sampledData = data.map(dataset => sampleData(dataset, sampleRate));
+            sampledTimestamps = timestamps ? sampleData(timestamps, sampleRate) : timestamps;
         }
 
         const totalPoints = sampledData[0].length;
@@ -605,9 +612,11 @@ function updateChart(chart, data) {
         chart.options.scales.x.max = 0;               // Current time is always 0
 
         // Update datasets with their respective data
+        const newest = sampledTimestamps ? sampledTimestamps[sampledTimestamps.length - 1] : 0;
         chart.data.datasets.forEach((dataset, index) => {
             dataset.data = sampledData[index].map((value, i) => ({
-                x: -(timespan * 60 * (1 - i/totalPoints)),  // Calculate x value in minutes
+                // minutes before the newest sample
+                x: sampledTimestamps ? (sampledTimestamps[i] - newest) / 60 : -(timespan * 60 * (1 - i/totalPoints)),
                 y: value
             }));
         });
@@ -922,35 +931,137 @@ function fetchFridgeState() {
     });
 }
 
+// Decodes the columnar /data format (see include/columnar_format.py) into one plain array per column
+function decodeColumnar(buffer) {
+    const view = new DataView(buffer);
+    const magic = String.fromCharCode(view.getUint8(0), view.getUint8(1), view.getUint8(2), view.getUint8(3));
+    if (magic !== 'PGC1') {
+        throw new Error('Unexpected columnar header ' + magic);
+    }
+    const rows = view.getUint32(4, true);
+    const columnCount = view.getUint32(8, true);
+    let offset = 12;
+    const columns = [];
+    for (let c = 0; c < columnCount; c++) {
+        const type = view.getUint32(offset, true);
+        const length = view.getUint32(offset + 4, true);
+        offset += 8;
+        if (type === 1) {
+            const bytes = new Uint8Array(buffer, offset, length);
+            const bits = new Array(rows);
+            for (let i = 0; i < rows; i++) {
+                bits[i] = (bytes[i >> 3] >> (i & 7)) & 1;
+            }
+            columns.push(bits);
+        } else if (type === 2) {
+            // float64 timestamps, copied because a Float64Array view needs 8 byte alignment
+            columns.push(Array.from(new Float64Array(buffer.slice(offset, offset + length))));
+        } else {
+            const values = Array.from(new Float32Array(buffer, offset, rows));
+            columns.push(values.map(v => (isNaN(v) ? null : v)));
+        }
+        offset += length + ((4 - (length % 4)) % 4);
+    }
+    return columns;
+}
+
 function fetchData() {
+    // after a full load only rows newer than the cursor are fetched, until the appended rows
+    // would exceed a tenth of the point budget and the window is reloaded (and downsampled) again.
+    // Windows of rollup buckets come without a cursor and are always reloaded.
+    if (dataCursor !== null && chartColumns !== null && appendedRows < chartPointBudget / 10) {
+        fetchDataDelta();
+    } else {
+        fetchDataWindow();
+    }
+}
+
+function fetchDataWindow() {
+    fetch('/data?timespan=' + timespan + '&points=' + chartPointBudget, {
+        headers: {'Accept': 'application/vnd.plantgeek.columnar, application/json;q=0.5'}
+    })
+    .then(response => {
+        if (!response.ok) {
+            throw new Error(response.statusText);
+        }
+        const cursor = response.headers.get('X-Data-Cursor');
+        const contentType = response.headers.get('Content-Type') || '';
+        let columns;
+        if (contentType.startsWith('application/vnd.plantgeek.columnar')) {
+            columns = response.arrayBuffer().then(decodeColumnar);
+        } else {
+            // JSON rows
+            columns = response.text().then(text => {
+                const rows = text ? JSON.parse(text) : [];
+                return rows.length > 0 ? rows[0].map((_, c) => rows.map(row => row[c])) : [];
+            });
+        }
+        return columns.then(columns => ({columns: columns, cursor: cursor || null}));
+    })
+    .then(result => {
+        chartColumns = result.columns.length > 0 ? result.columns : null;
+        dataCursor = result.cursor;
+        appendedRows = 0;
+        renderCharts();
+    })
+    .catch(error => {
+        console.error("Failed to fetch data:", error);
+    });
+}
+
+function fetchDataDelta() {
     $.ajax({
-        url: '/data?timespan=' + timespan,
+        url: '/data?timespan=' + timespan + '&points=' + chartPointBudget + '&since=' + encodeURIComponent(dataCursor),
         success: function(data) {
-            if (data && data.length > 0) {
-                var temps = data.map(d => d[0]);
-                var humids = data.map(d => d[1]);
-                var eco2s = data.map(d => d[2]);
-                var light_state = data.map(d => d[3]);
-                var fridge_state = data.map(d => d[4]);
-                var co2_state = data.map(d => d[5]);
-                var heater_state = data.map(d => d[6]);
-
-                updateChart(temperatureChart, [temps, light_state, fridge_state, heater_state]);
-                updateChart(humidityChart, [humids]);
-                updateChart(eco2Chart, [eco2s, co2_state]);
-            } else {
-                console.log("No data received, clearing charts");
-                updateChart(temperatureChart, [[], [], [], []]);
-                updateChart(humidityChart, [[]]);
-                updateChart(eco2Chart, [[], []]);
+            if (!data || data.truncated || Array.isArray(data)) {
+                // the client is too far behind, or the window is now served from rollups (full payload)
+                dataCursor = null;
+                return;
+            }
+            dataCursor = data.cursor === null ? null : String(data.cursor);
+            if (data.rows.length === 0) {
+                return;
             }
+            data.rows.forEach(row => row.forEach((value, c) => chartColumns[c].push(value)));
+            appendedRows += data.rows.length;
+            sortAndTrimChartColumns();
+            renderCharts();
         },
         error: function(xhr, status, error) {
             console.error("Failed to fetch data:", error);
+            dataCursor = null;
         }
     });
 }
 
+function sortAndTrimChartColumns() {
+    const timestamps = chartColumns[chartColumns.length - 1];
+    let order = timestamps.map((_, i) => i);
+    // rows replayed from the writer's spool can be older than rows already shown
+    const sorted = timestamps.every((t, i) => i === 0 || timestamps[i - 1] <= t);
+    if (!sorted) {
+        order.sort((a, b) => timestamps[a] - timestamps[b]);
+    }
+    const windowStart = timestamps[order[order.length - 1]] - timespan * 3600;
+    order = order.filter(i => timestamps[i] >= windowStart);
+    chartColumns = chartColumns.map(column => order.map(i => column[i]));
+}
+
+function renderCharts() {
+    if (chartColumns !== null && chartColumns[0].length > 0) {
+        const [temps, humids, eco2s, light_state, fridge_state, co2_state, heater_state, timestamps] = chartColumns;
+
+        updateChart(temperatureChart, [temps, light_state, fridge_state, heater_state], timestamps);
+        updateChart(humidityChart, [humids], timestamps);
+        updateChart(eco2Chart, [eco2s, co2_state], timestamps);
+    } else {
+        console.log("No data received, clearing charts");
+        updateChart(temperatureChart, [[], [], [], []]);
+        updateChart(humidityChart, [[]]);
+        updateChart(eco2Chart, [[], []]);
+    }
+}
+
 function setTimeSpanDataBaseRetrieval(timeSpan) {
     timespan = timeSpan; // Update the global timespan variable
     
@@ -960,20 +1071,9 @@ function setTimeSpanDataBaseRetrieval(timeSpan) {
         chart.update();
     });
 
-    $.ajax({
-        url: '/dataFetchTimeSpan',
-        type: 'POST',
-        contentType: 'application/json',
-        data: JSON.stringify({timeSpan: timeSpan}),
-        success: function(response) {
-            fetchData(); // Fetch new data with updated timespan
-        },
-        error: function(xhr, status, error) {
-            console.log("Error: " + error);
-            console.log("Status: " + status);
-            console.dir(xhr);
-        }
-    });
+    // the timespan is sent with every /data request
+    dataCursor = null;
+    fetchData(); // Fetch new data with updated timespan
 }
 
 function rebootSystem() {
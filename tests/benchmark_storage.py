@@ -0,0 +1,113 @@
+"""
+Insert and window query latency of the storage backends.
+
+    python -m tests.benchmark_storage                  # SQLite only
+    python -m tests.benchmark_storage --mysql          # SQLite and MySQL
+
+The MySQL run uses its own database (default sensor_data_benchmark), the
+user from DEFAULT_DB_CONFIG needs the privilege to create it. Both runs insert
+the same synthetic day of 5 second samples in batches like the data writer.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from include.database_pool import DatabasePool, DEFAULT_DB_CONFIG
+from include.measurement_storage import MySQLStorage, SQLiteStorage
+
+MYSQL_BENCHMARK_TABLE_SQL = """
+CREATE TABLE measurements (
+    id INT AUTO_INCREMENT,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    temperature_c FLOAT,
+    humidity FLOAT,
+    eco2 INT,
+    tvoc INT,
+    co2_state TINYINT,
+    fridge_state TINYINT,
+    light_state TINYINT,
+    heater_state TINYINT,
+    PRIMARY KEY (id, timestamp),
+    INDEX idx_measurements_timestamp (timestamp)
+)
+"""
+
+
+def make_rows(count, end):
+    start = end - 5 * count
+    return [
+        (start + 5 * i, 22.0 + (i % 100) * 0.01, 55.0, 800 + i % 50, i % 2, 0, (i // 10) % 2, 0)
+        for i in range(count)
+    ]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def report(name, timings):
+    print(f"  {name:<28} median {1000 * statistics.median(timings):8.2f} ms   "
+          f"p95 {1000 * percentile(timings, 0.95):8.2f} ms   n={len(timings)}")
+
+
+def run(storage, rows, batch_size, queries):
+    print(f"{storage.dialect}:")
+    storage.ensure_schema()
+
+    insert_timings = []
+    started = time.perf_counter()
+    for i in range(0, len(rows), batch_size):
+        t0 = time.perf_counter()
+        storage.insert_rows(rows[i:i + batch_size])
+        insert_timings.append(time.perf_counter() - t0)
+    total = time.perf_counter() - started
+    report(f"insert batch of {batch_size}", insert_timings)
+    print(f"  {'insert throughput':<28} {len(rows) / total:10.0f} rows/s")
+
+    end = rows[-1][0]
+    for hours in (1, 6, 24):
+        timings = []
+        for _ in range(queries):
+            t0 = time.perf_counter()
+            storage.fetch_window(end - hours * 3600)
+            timings.append(time.perf_counter() - t0)
+        report(f"window {hours:>2} h", timings)
+
+    for table in ('measurements_1m', 'measurements_10m'):
+        timings = []
+        for _ in range(queries):
+            t0 = time.perf_counter()
+            storage.fetch_rollups(table, end - 24 * 3600)
+            timings.append(time.perf_counter() - t0)
+        report(f"rollup 24 h {table}", timings)
+
+
+def mysql_storage(database):
+    admin = DatabasePool(DEFAULT_DB_CONFIG, pool_size=1)
+    with admin.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"DROP DATABASE IF EXISTS {database}")
+        cursor.execute(f"CREATE DATABASE {database}")
+        cursor.execute(f"USE {database}")
+        cursor.execute(MYSQL_BENCHMARK_TABLE_SQL)
+        conn.commit()
+        cursor.close()
+    return MySQLStorage(DatabasePool(dict(DEFAULT_DB_CONFIG, database=database), pool_size=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the measurement storage backends')
+    parser.add_argument('--rows', type=int, default=17280, help='number of samples (default: one day)')
+    parser.add_argument('--batch-size', type=int, default=12)
+    parser.add_argument('--queries', type=int, default=20, help='repetitions of every query')
+    parser.add_argument('--mysql', action='store_true', help='also benchmark MySQL/MariaDB')
+    parser.add_argument('--mysql-database', default='sensor_data_benchmark')
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows, time.time())
+    with tempfile.TemporaryDirectory() as tmpdir:
+        run(SQLiteStorage(os.path.join(tmpdir, 'benchmark.db')), rows, args.batch_size, args.queries)
+    if args.mysql:
+        run(mysql_storage(args.mysql_database), rows, args.batch_size, args.queries)
@@ -0,0 +1,6 @@
+"""Synthetic measurements in the inserted row format, shared by the storage tests"""
+
+
+def make_rows(start, count, step=5):
+    """count rows, one every step seconds from start: (timestamp, temperature, humidity, eco2, light, fridge, co2, heater)"""
+    return [(start + step * i, round(20.0 + (i % 10) * 0.1, 2), 50.0, 800 + i, i % 2, 0, 1, 0) for i in range(count)]
@@ -0,0 +1,298 @@
+"""
+Physics-lite simulator of the grow box for closed-loop benchmarks without hardware.
+
+Every state variable is a NumPy array with one entry per simulated box, so
+thousands of boxes advance with a few vector operations per step:
+
+- air temperature: lamp and heater heat, fridge compressor cooling, leakage
+  to the ambient temperature through the walls
+- humidity as vapour density: humidifier output, transpiration while the lamp
+  is on, condensation on the fridge coil, air exchange with the room
+- CO2: injection through the valve, uptake while the lamp is on, air exchange
+
+Each linear equation is integrated exactly over a step with constant inputs,
+so large steps stay stable.
+
+The sockets respond to the zigbee2mqtt messages MQTT_Interface sends through
+switchLedvanceSocket_4058075729261: {"state": "ON", "on_time": 60, ...} switches
+a socket on and off again after on_time seconds unless it is refreshed,
+{"state": "OFF"} switches it off. SimulatedMqttClient stands in for the paho
+client of one box and reports the new state back like the socket does. The
+humidifier hangs on a GPIO pin, SimulatedOutput replaces gpiozero's LED.
+
+    python -m tests.plant_simulator --boxes 3000 --hours 24
+
+benchmarks thermostat variants vectorised over the boxes. ReplayHarness.run()
+accepts a simulator as plant for a closed loop through the real controllers.
+"""
+import argparse
+import json
+import math
+import os
+import time
+import numpy as np
+from include.sensor_sample_store import SensorSample
+
+ACTUATORS = ('light', 'fridge', 'heater', 'co2', 'humidifier')
+# device types of config/device_setup.json -> actuators
+SOCKET_TYPES = {'LIGHT': 'light', 'FRIDGE': 'fridge', 'HEATER': 'heater', 'CO2': 'co2'}
+TEST_DEVICE_SETUP = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_configs', 'device_setup.json')
+
+DEFAULT_PARAMETERS = {
+    'volume': 0.3,              # m³ of air
+    'heat_capacity': 20000.0,   # J/K, air, walls and pots
+    'wall_conductance': 8.0,    # W/K to the room
+    'lamp_heat': 100.0,         # W
+    'heater_power': 60.0,       # W
+    'fridge_cooling': 120.0,    # W removed by the compressor
+    'air_exchange': 1.0 / 3600,  # 1/s, share of the air replaced by room air
+    'humidifier_output': 0.005,  # g/s water vapour
+    'transpiration': 0.002,     # g/s while the lamp is on
+    'condensation': 0.004,      # g/s removed at the fridge coil
+    'co2_injection': 5.0,       # ppm/s while the valve is open
+    'co2_uptake': 0.3,          # ppm/s while the lamp is on
+    'ambient_temperature': 21.0,
+    'ambient_humidity': 50.0,   # % RH
+    'ambient_co2': 420.0,
+}
+SENSOR_NOISE = {'temperature': 0.05, 'humidity': 0.3, 'co2': 5.0}
+
+
+def saturation_vapour_density(temperature):
+    """g/m³ of water vapour in saturated air (Magnus formula)"""
+    pressure = 6.112 * np.exp(17.62 * temperature / (243.12 + temperature))  # hPa
+    return 216.7 * pressure / (temperature + 273.15)
+
+
+def load_socket_names(path=TEST_DEVICE_SETUP):
+    """friendly name -> actuator from a device_setup.json"""
+    with open(path, 'r') as file:
+        devices = json.load(file)['devices']
+    return {device['friendly_name']: SOCKET_TYPES[name] for name, device in devices.items() if name in SOCKET_TYPES}
+
+
+def relax(value, equilibrium, rate, dt):
+    """Exact step of dv/dt = rate * (equilibrium - v) with constant inputs"""
+    return equilibrium + (value - equilibrium) * np.exp(-rate * dt)
+
+
+class PlantSimulator:
+    """
+    n grow boxes in simulated time
+
+    Parameters are scalars or arrays with one value per box, spread > 0 varies
+    the physical parameters (not the room conditions) per box by that relative
+    standard deviation. The result only depends on the seed.
+    """
+    def __init__(self, n=1, parameters=None, spread=0.0, seed=0, start=0.0, socket_names=None,
+                 temperature=None, humidity=None, co2=None):
+        self.n = n
+        self.rng = np.random.default_rng(seed)
+        self.parameters = {}
+        for name, value in dict(DEFAULT_PARAMETERS, **(parameters or {})).items():
+            value = np.broadcast_to(np.asarray(value, dtype=float), (n,)).copy()
+            if spread > 0 and not name.startswith('ambient_'):
+                value *= np.clip(1 + self.rng.normal(0, spread, n), 0.1, None)
+            self.parameters[name] = value
+        p = self.parameters
+        self.time = float(start)
+        self.socket_names = socket_names if socket_names is not None else load_socket_names()
+
+        self.temperature = np.full(n, p['ambient_temperature']) if temperature is None \
+            else np.broadcast_to(np.asarray(temperature, dtype=float), (n,)).copy()
+        relative = p['ambient_humidity'] if humidity is None else np.asarray(humidity, dtype=float)
+        self.vapour = relative / 100 * saturation_vapour_density(self.temperature)
+        self.co2 = np.full(n, p['ambient_co2']) if co2 is None \
+            else np.broadcast_to(np.asarray(co2, dtype=float), (n,)).copy()
+
+        self.on = {name: np.zeros(n, dtype=bool) for name in ACTUATORS}
+        self.off_at = {name: np.full(n, np.inf) for name in ACTUATORS}
+        self.switches = {name: np.zeros(n, dtype=np.int64) for name in ACTUATORS}
+        self.messages = 0
+
+    @property
+    def humidity(self):
+        return np.clip(100 * self.vapour / saturation_vapour_density(self.temperature), 0, 100)
+
+    def set_actuator(self, name, state, boxes=slice(None), on_time=None):
+        """Switch an actuator of some boxes, on_time seconds arms the socket's automatic switch-off"""
+        state = np.broadcast_to(np.asarray(state, dtype=bool), self.on[name][boxes].shape)
+        self.switches[name][boxes] += self.on[name][boxes] != state
+        self.on[name][boxes] = state
+        off_at = np.inf if on_time is None else self.time + float(on_time)
+        self.off_at[name][boxes] = np.where(state, off_at, np.inf)
+
+    def handle_message(self, topic, payload, box=0):
+        """
+        A zigbee2mqtt set command for box, returns (state topic, state payload)
+        the socket reports back or None if the topic is not one of its sockets
+        """
+        parts = topic.split('/')
+        if len(parts) != 3 or parts[0] != 'zigbee2mqtt' or parts[2] != 'set':
+            return None
+        actuator = self.socket_names.get(parts[1])
+        if actuator is None:
+            return None
+        self.messages += 1
+        command = json.loads(payload)
+        state = command.get('state')
+        if state == 'TOGGLE':
+            state = 'OFF' if self.on[actuator][box] else 'ON'
+        self.set_actuator(actuator, state == 'ON', box, command.get('on_time') if state == 'ON' else None)
+        return f"zigbee2mqtt/{parts[1]}", json.dumps({'state': 'ON' if self.on[actuator][box] else 'OFF'})
+
+    def step(self, dt):
+        """Advance all boxes by dt seconds with the current actuator states"""
+        p = self.parameters
+        end = self.time + dt
+        for name in ACTUATORS:
+            expired = self.on[name] & (self.off_at[name] <= end)
+            if expired.any():
+                # the socket's on_time ran out without a refresh
+                self.on[name][expired] = False
+                self.switches[name][expired] += 1
+                self.off_at[name][expired] = np.inf
+        light, fridge, heater = self.on['light'], self.on['fridge'], self.on['heater']
+
+        heat = light * p['lamp_heat'] + heater * p['heater_power'] - fridge * p['fridge_cooling']
+        temperature = relax(self.temperature, p['ambient_temperature'] + heat / p['wall_conductance'],
+                            p['wall_conductance'] / p['heat_capacity'], dt)
+
+        ambient_vapour = p['ambient_humidity'] / 100 * saturation_vapour_density(p['ambient_temperature'])
+        source = (self.on['humidifier'] * p['humidifier_output'] + light * p['transpiration']
+                  - fridge * p['condensation']) / p['volume']
+        vapour = relax(self.vapour, ambient_vapour + source / p['air_exchange'], p['air_exchange'], dt)
+        # water beyond saturation condenses on the walls
+        vapour = np.clip(vapour, 0, saturation_vapour_density(temperature))
+
+        co2_source = self.on['co2'] * p['co2_injection'] - light * p['co2_uptake']
+        co2 = relax(self.co2, p['ambient_co2'] + co2_source / p['air_exchange'], p['air_exchange'], dt)
+
+        self.temperature, self.vapour, self.co2 = temperature, vapour, np.maximum(co2, 0)
+        self.time = end
+
+    def advance_to(self, timestamp, max_step=5.0):
+        while self.time < timestamp:
+            self.step(min(max_step, timestamp - self.time))
+
+    def read(self, noise=True):
+        """Sensor readings of all boxes (temperature, humidity, co2)"""
+        readings = [self.temperature, self.humidity, self.co2]
+        if noise:
+            readings = [value + self.rng.normal(0, SENSOR_NOISE[name], self.n)
+                        for value, name in zip(readings, ('temperature', 'humidity', 'co2'))]
+        return readings
+
+    def sample(self, timestamp, states, box=0):
+        """
+        Plant interface of the replay harness: apply the actuator states the
+        controllers left since the last sample, advance and read box
+        """
+        for name, state in states.items():
+            if name in self.on and bool(self.on[name][box]) != bool(state):
+                self.set_actuator(name, bool(state), box)
+        if timestamp > self.time:
+            self.advance_to(timestamp)
+        else:
+            self.time = float(timestamp)
+        temperature, humidity, co2 = self.read()
+        return SensorSample(timestamp, float(temperature[box]), float(humidity[box]), float(co2[box]))
+
+
+class SimulatedMqttClient:
+    """
+    paho client stand-in for one box: publish() goes to the simulated sockets,
+    their state reports are delivered to on_message like from the broker
+    """
+    class Message:
+        def __init__(self, topic, payload):
+            self.topic = topic
+            self.payload = payload.encode()
+
+    def __init__(self, simulator, box=0, on_message=None):
+        self.simulator = simulator
+        self.box = box
+        self.on_message = on_message
+        self.published = []
+
+    def publish(self, topic, payload):
+        self.published.append((topic, payload))
+        report = self.simulator.handle_message(topic, payload, self.box)
+        if report is not None and self.on_message is not None:
+            self.on_message(self, None, self.Message(*report))
+
+
+class SimulatedOutput:
+    """gpiozero output stand-in switching the humidifier of one box"""
+    def __init__(self, simulator, box=0, actuator='humidifier'):
+        self.simulator = simulator
+        self.box = box
+        self.actuator = actuator
+
+    def on(self):
+        self.simulator.set_actuator(self.actuator, True, self.box)
+
+    def off(self):
+        self.simulator.set_actuator(self.actuator, False, self.box)
+
+
+def benchmark_thermostats(boxes=3000, hours=24, dt=5.0, hysteresis=(0.2, 0.5, 1.0), target=24.0, seed=0):
+    """
+    Day/night lamp plus a hysteresis thermostat, heating around target and cooling
+    around target + 1 K, the boxes are split
+    evenly between the hysteresis variants. Returns per variant the share of
+    samples within ±1 °C of target + 0.5 and the switch counts per box.
+    """
+    simulator = PlantSimulator(boxes, spread=0.1, seed=seed)
+    variant = np.arange(boxes) % len(hysteresis)
+    band = np.asarray(hysteresis)[variant]
+    in_band = np.zeros(boxes)
+    steps = int(hours * 3600 / dt)
+    started = time.perf_counter()
+    for i in range(steps):
+        t = i * dt
+        temperature, _, _ = simulator.read()
+        simulator.set_actuator('light', (t % 86400) < 18 * 3600, on_time=60)
+        heater = simulator.on['heater']
+        fridge = simulator.on['fridge']
+        simulator.set_actuator('heater', np.where(heater, temperature < target + band, temperature < target - band),
+                               on_time=60)
+        simulator.set_actuator('fridge', np.where(fridge, temperature > target + 1 - band, temperature > target + 1 + band),
+                               on_time=60)
+        in_band += np.abs(temperature - target - 0.5) <= 1.0
+        simulator.step(dt)
+    elapsed = time.perf_counter() - started
+    results = {}
+    for index, width in enumerate(hysteresis):
+        boxes_of_variant = variant == index
+        results[width] = {
+            'time_in_band': float(in_band[boxes_of_variant].mean() / steps),
+            'heater_switches': float(simulator.switches['heater'][boxes_of_variant].mean()),
+            'fridge_switches': float(simulator.switches['fridge'][boxes_of_variant].mean()),
+        }
+    return {
+        'boxes': boxes,
+        'simulated_seconds': steps * dt,
+        'wall_seconds': elapsed,
+        'speedup': boxes * steps * dt / elapsed if elapsed > 0 else math.inf,
+        'variants': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark thermostat variants on simulated grow boxes")
+    parser.add_argument('--boxes', type=int, default=3000)
+    parser.add_argument('--hours', type=float, default=24)
+    parser.add_argument('--step', type=float, default=5.0)
+    args = parser.parse_args()
+
+    result = benchmark_thermostats(args.boxes, args.hours, args.step)
+    print(f"{result['boxes']} boxes x {result['simulated_seconds'] / 3600:.0f} h in {result['wall_seconds']:.2f} s, "
+          f"{result['speedup']:,.0f}x real time")
+    for width, variant in result['variants'].items():
+        print(f"  hysteresis {width:.1f} K: {100 * variant['time_in_band']:5.1f} % within 1 K, "
+              f"{variant['heater_switches']:.0f} heater / {variant['fridge_switches']:.0f} fridge switches per box")
+
+
+if __name__ == '__main__':
+    main()
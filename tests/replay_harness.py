@@ -0,0 +1,448 @@
+"""
+Deterministic replay of sensor traces through the controllers in virtual time.
+
+Fridge, Heater, Humidifier, CO2, Light and HealthMonitor run with a
+VirtualClock, one virtual scheduler, a fake MQTT interface, fake GPIO outputs
+and a fake measurement store, so a day of operation replays in a fraction of
+a second and every run gives the same result:
+
+    python -m tests.replay_harness                      # synthetic day
+    python -m tests.replay_harness history.csv          # recorded trace (export/import format)
+    python -m tests.replay_harness --mode polling       # controllers on their own 5 s clocks
+
+Traces are open loop, the recorded values do not react to the actuators. A
+plant model with sample(timestamp, actuator_states) can be passed instead to
+close the loop.
+
+Idle ticks are skipped: HealthMonitor checks every tick seconds instead of
+every second, by default once a minute, as its conditions (stale or frozen
+data, averaged control accuracy) span minutes. The light schedule has minute
+resolution, so Light checks once a minute, one second into it. The
+controllers' debug prints are silenced during a run.
+
+Each run reports switch counts, commands and on-time per actuator, the share
+of samples within the control bands and the decision latency: the time from
+a sample to the actuator change it caused.
+"""
+import argparse
+import contextlib
+import heapq
+import itertools
+import json
+import math
+import os
+import random
+import time
+from collections import Counter
+from datetime import datetime
+from unittest.mock import patch
+from include import co2_controller, fridge_controller, health_monitoring, heater_controller, \
+    humidifier_controller, light_controller
+from include.clock import VirtualClock
+from include.co2_controller import CO2
+from include.fridge_controller import Fridge, ControlMode
+from include.health_monitoring import HealthMonitor
+from include.heater_controller import Heater
+from include.humidifier_controller import Humidifier
+from include.light_controller import Light
+from include.sample_bus import SampleBus
+from include.sensor_sample_store import LatestSampleStore, SensorSample
+from include.trend_estimator import TrendEstimator
+
+CONFIG_TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'config', 'config.json.template')
+ACTUATORS = ('light', 'fridge', 'heater', 'co2', 'humidifier')
+# half widths of the bands around the targets for time-in-band
+DEFAULT_BANDS = {'temperature': 1.0, 'humidity': 5.0, 'co2': 100.0}
+# synthetic traces start at a fixed local midnight, so the light schedule is the same on every run
+SYNTHETIC_START = datetime(2024, 6, 1).timestamp()
+# Light checks one second into every minute: switched on 1 s after the on time, off like at 1 Hz
+LIGHT_TICK = 60.0
+LIGHT_PHASE = 1.0
+CONTROLLER_MODULES = (co2_controller, fridge_controller, health_monitoring, heater_controller,
+                      humidifier_controller, light_controller)
+
+
+def silence(*args, **kwargs):
+    pass
+
+
+class VirtualScheduler:
+    """sched.scheduler replacement running due jobs when virtual time is advanced"""
+    def __init__(self, clock):
+        self.clock = clock
+        self._queue = []
+        self._sequence = itertools.count()
+
+    def enter(self, delay, priority, action, argument=()):
+        heapq.heappush(self._queue, (self.clock.time() + delay, priority, next(self._sequence), action, argument))
+
+    def run_until(self, timestamp):
+        """Run all jobs due before timestamp, then move the clock to it. Jobs due at
+        the timestamp itself run after whatever happens at it, e.g. a new sample."""
+        queue = self._queue
+        while queue and queue[0][0] < timestamp:
+            due, _, _, action, argument = heapq.heappop(queue)
+            if due > self.clock.time():
+                self.clock.set(due)
+            action(*argument)
+        if timestamp > self.clock.time():
+            self.clock.set(timestamp)
+
+
+class FakeMQTT:
+    """Records actuator commands in virtual time instead of publishing them"""
+    def __init__(self, clock, sample_store):
+        self.clock = clock
+        self.sample_store = sample_store
+        self.devicesHealthy = True
+        self.states = dict.fromkeys(ACTUATORS, False)
+        self.commands = Counter()
+        self.switches = Counter()
+        self.on_seconds = Counter()
+        self.decision_latencies = []
+        self._changed_at = {}
+
+    def record(self, device, state):
+        now = self.clock.time()
+        state = bool(state)
+        self.commands[device] += 1
+        if state != self.states[device]:
+            self._close(device, now)
+            self.states[device] = state
+            self.switches[device] += 1
+            sample = self.sample_store.latest()
+            # the light follows the clock, all other actuators react to samples
+            if device != 'light' and sample is not None:
+                self.decision_latencies.append(now - sample.timestamp)
+        return True
+
+    def _close(self, device, now):
+        if self.states[device]:
+            self.on_seconds[device] += now - self._changed_at.get(device, now)
+        self._changed_at[device] = now
+
+    def finish(self):
+        now = self.clock.time()
+        for device in ACTUATORS:
+            self._close(device, now)
+
+    def setLightState(self, state):
+        return self.record('light', state)
+
+    def setFridgeState(self, state):
+        return self.record('fridge', state)
+
+    def setHeaterState(self, state):
+        return self.record('heater', state)
+
+    def setCO2State(self, state):
+        return self.record('co2', state)
+
+    def getLightState(self):
+        return self.states['light']
+
+    def getFridgeState(self):
+        return self.states['fridge']
+
+    def getHeaterState(self):
+        return self.states['heater']
+
+    def getCO2State(self):
+        return self.states['co2']
+
+
+class FakeOutput:
+    """GPIO output (humidifier) reporting to the fake MQTT recorder"""
+    def __init__(self, mqtt_interface, device):
+        self.mqtt_interface = mqtt_interface
+        self.device = device
+
+    def on(self):
+        self.mqtt_interface.record(self.device, True)
+
+    def off(self):
+        self.mqtt_interface.record(self.device, False)
+
+
+class FakePWMLED:
+    def __init__(self):
+        self.value = 0
+        self.frequency = 0
+
+
+class FakeStorage:
+    """The part of the measurement storage the heater reads, served from the replayed samples"""
+    dialect = 'replay'
+
+    def __init__(self):
+        self.samples = []
+
+    def append(self, sample):
+        self.samples.append(sample)
+
+    def fetch_temperatures(self, start):
+        return [s.temperature for s in self.samples if s.timestamp >= start and s.temperature is not None]
+
+
+class FakeSensorData:
+    """The attributes of SensorDataLogger read by the health monitor and the polling CO2 controller"""
+    def __init__(self):
+        self.currentTemperature = None
+        self.currentHumidity = None
+        self.currentCO2 = None
+        self.lastTimestamp = None
+
+    def update(self, sample):
+        self.currentTemperature = sample.temperature
+        self.currentHumidity = sample.humidity
+        self.currentCO2 = sample.co2
+        self.lastTimestamp = sample.timestamp
+
+
+def load_config(path=CONFIG_TEMPLATE):
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+def synthetic_trace(start=None, hours=24, interval=5.0, seed=0):
+    """Daily temperature, humidity and CO2 waves with sensor noise, same output for the same seed"""
+    rng = random.Random(seed)
+    start = SYNTHETIC_START if start is None else start
+    for i in range(int(hours * 3600 / interval)):
+        t = start + i * interval
+        phase = 2 * math.pi * (t - start) / 86400
+        yield SensorSample(t,
+                           22.0 + 3.0 * math.sin(phase) + rng.gauss(0, 0.1),
+                           45.0 + 8.0 * math.sin(phase + 1.0) + rng.gauss(0, 0.5),
+                           800.0 + 150.0 * math.sin(2 * phase) + rng.gauss(0, 10.0))
+
+
+def load_trace(path):
+    """Recorded measurements in the export/import format (CSV or Parquet), invalid rows are skipped"""
+    from include.measurement_import import read_file, parse_record
+    samples = []
+    for batch in read_file(path):
+        for record in batch:
+            try:
+                row = parse_record(record)
+            except ValueError:
+                continue
+            samples.append(SensorSample(*row[:4]))
+    samples.sort(key=lambda sample: sample.timestamp)
+    return samples
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class ReplayHarness:
+    """
+    Replays one trace per run() through freshly built controllers
+
+    mode 'bus' runs the sample driven controllers through the SampleBus like
+    the app, 'polling' through their control_* loops on 5 second clocks which
+    start polling_phase seconds after the first sample.
+    """
+    def __init__(self, config=None, mode='bus', bands=None, sample_interval=5.0, tick=60.0, polling_phase=2.5):
+        if mode not in ('bus', 'polling'):
+            raise ValueError("mode must be 'bus' or 'polling'")
+        self.config = config if config is not None else load_config()
+        self.mode = mode
+        self.bands = dict(DEFAULT_BANDS, **(bands or {}))
+        self.sample_interval = sample_interval
+        self.tick = tick
+        self.polling_phase = polling_phase
+
+    def _build(self, start):
+        config = self.config
+        self.clock = VirtualClock(start)
+        self.scheduler = VirtualScheduler(self.clock)
+        self.sample_store = LatestSampleStore(max_age=60, clock=self.clock)
+        self.mqtt = FakeMQTT(self.clock, self.sample_store)
+        self.storage = FakeStorage()
+        self.sensor_data = FakeSensorData()
+        self.trend_estimator = TrendEstimator()
+
+        self.fridge = Fridge(None, self.sample_store, clock=self.clock)
+        self.fridge.set_control_temperature_day(config['TemperatureControl']['targetDayTemperature'])
+        self.fridge.set_control_temperature_night(config['TemperatureControl']['targetNightTemperature'])
+        self.fridge.set_temperature_hysteresis(config['TemperatureControl']['hysteresis'])
+        self.fridge.set_control_humidity(config['HumidityControl']['targetHumidity'])
+        self.fridge.set_humidity_hysteresis(config['HumidityControl']['hysteresis'])
+        if 'controlMode' in config.get('FridgeControl', {}):
+            self.fridge.set_control_mode(ControlMode[config['FridgeControl']['controlMode']])
+
+        self.heater = Heater(None, self.sample_store, storage=self.storage,
+                             trend_estimator=self.trend_estimator, clock=self.clock)
+        self.heater.set_control_temperature(config['TemperatureControl']['targetDayTemperature'])
+        self.heater.set_hysteresis(config['TemperatureControl']['hysteresis'])
+
+        self.humidifier = Humidifier(None, self.sample_store, output=FakeOutput(self.mqtt, 'humidifier'),
+                                     clock=self.clock)
+        self.humidifier.set_control_humidity(config['HumidityControl']['targetHumidity'])
+        self.humidifier.set_humidity_hysteresis(config['HumidityControl']['hysteresis'])
+
+        self.co2 = CO2()
+        self.co2.set_co2_target_value(config['CO2Control']['targetValue'])
+        self.co2.set_co2_hysteresis(config['CO2Control']['hysteresis'])
+
+        self.light = Light(None, pwm_led=FakePWMLED(), clock=self.clock)
+        self.light.set_light_times(config['LightControl']['switchOnTime'], config['LightControl']['switchOffTime'])
+        self.light.check_interval = LIGHT_TICK
+
+        self.health = HealthMonitor(config, clock=self.clock, check_interval=self.tick)
+
+        sc, mqtt = self.scheduler, self.mqtt
+        sc.enter((LIGHT_PHASE - start) % LIGHT_TICK, 1, self.light.check_time_and_control_light, (sc, mqtt,))
+        sc.enter(0, 1, self.health.check_status, (sc, mqtt, self.sensor_data, True,))
+        if self.mode == 'bus':
+            self.sample_bus = SampleBus(self.sample_store, timeout=15, check_interval=5, clock=self.clock.time)
+            self.sample_bus.subscribe('fridge', sc, lambda sample: self.fridge.control_step(mqtt),
+                                      lambda: self.fridge.safe_mode(mqtt))
+            self.sample_bus.subscribe('heater', sc, lambda sample: self.heater.control_step(mqtt),
+                                      lambda: self.heater.safe_mode(mqtt))
+            self.sample_bus.subscribe('humidifier', sc, lambda sample: self.humidifier.control_step(),
+                                      self.humidifier.safe_mode)
+            self.sample_bus.subscribe('co2', sc, lambda sample: self.co2.control_step(mqtt, sample.co2),
+                                      lambda: self.co2.safe_mode(mqtt))
+            sc.enter(self.sample_bus.timeout, 1, self.sample_bus.watchdog, (sc,))
+        else:
+            phase = self.polling_phase
+            sc.enter(phase, 1, self.fridge.control_fridge, (sc, mqtt,))
+            sc.enter(phase, 1, self.heater.control_heater, (sc, mqtt,))
+            sc.enter(phase, 1, self.humidifier.control_humidifier, (sc,))
+            sc.enter(phase, 1, self.co2.control_co2, (sc, mqtt, self.sensor_data,))
+
+    def _publish(self, sample):
+        # what the data writer does with a new reading
+        states = self.mqtt.states
+        sample = SensorSample(sample.timestamp, sample.temperature, sample.humidity, sample.co2,
+                              states['light'], states['fridge'], states['co2'], states['heater'])
+        self.storage.append(sample)
+        self.sensor_data.update(sample)
+        self.trend_estimator.add_sample(sample.timestamp, temperature=sample.temperature,
+                                        humidity=sample.humidity, co2=sample.co2)
+        self.sample_store.publish(sample)
+        self._score(sample)
+
+    def _score(self, sample):
+        # the temperature target follows the light like the fridge's day/night targets
+        day = self.mqtt.states['light']
+        for name, value in (('temperature', sample.temperature), ('humidity', sample.humidity), ('co2', sample.co2)):
+            if value is None:
+                continue
+            day_target, night_target = self._targets[name]
+            self._scored[name] += 1
+            if abs(value - (day_target if day else night_target)) <= self.bands[name]:
+                self._in_band[name] += 1
+
+    def run(self, trace=None, plant=None, start=None, hours=24):
+        """
+        Replay trace (SensorSamples in time order) or, with a plant model, simulate
+        hours of operation. Without either a synthetic day is replayed.
+        """
+        if trace is None and plant is None:
+            trace = synthetic_trace(start=start, hours=hours, interval=self.sample_interval)
+        if trace is not None:
+            trace = iter(trace)
+            first = next(trace, None)
+            if first is None:
+                raise ValueError("empty trace")
+            trace = itertools.chain([first], trace)
+            start = first.timestamp
+        elif start is None:
+            start = time.time()
+
+        wall_start = time.perf_counter()
+        self._scored = Counter()
+        self._in_band = Counter()
+        temperature = self.config['TemperatureControl']
+        humidity = float(self.config['HumidityControl']['targetHumidity'])
+        co2 = float(self.config['CO2Control']['targetValue'])
+        self._targets = {
+            'temperature': (float(temperature['targetDayTemperature']), float(temperature['targetNightTemperature'])),
+            'humidity': (humidity, humidity),
+            'co2': (co2, co2),
+        }
+        samples = 0
+        with contextlib.ExitStack() as stack:
+            for module in CONTROLLER_MODULES:
+                stack.enter_context(patch.object(module, 'print', silence, create=True))
+            self._build(start)
+            if trace is not None:
+                # jobs entered by a sample (the sample bus) run at its timestamp, before the next one
+                for sample in trace:
+                    self.scheduler.run_until(sample.timestamp)
+                    self._publish(sample)
+                    samples += 1
+                self.scheduler.run_until(self.clock.time() + self.sample_interval)
+            else:
+                end = start + hours * 3600
+                t = start
+                while t < end:
+                    self.scheduler.run_until(t)
+                    self._publish(plant.sample(t, dict(self.mqtt.states)))
+                    samples += 1
+                    t += self.sample_interval
+                self.scheduler.run_until(t)
+            self.mqtt.finish()
+
+        duration = self.clock.time() - start
+        latencies = self.mqtt.decision_latencies
+        return {
+            'mode': self.mode,
+            'samples': samples,
+            'virtual_seconds': round(duration, 1),
+            'wall_seconds': round(time.perf_counter() - wall_start, 3),
+            'switches': {device: self.mqtt.switches[device] for device in ACTUATORS},
+            'commands': {device: self.mqtt.commands[device] for device in ACTUATORS},
+            'on_fraction': {device: round(self.mqtt.on_seconds[device] / duration, 3) if duration else 0.0
+                            for device in ACTUATORS},
+            'time_in_band': {name: round(self._in_band[name] / self._scored[name], 3) if self._scored[name]
+                             else None for name in DEFAULT_BANDS},
+            'decision_latency_s': {
+                'count': len(latencies),
+                'p50': percentile(latencies, 0.5),
+                'p99': percentile(latencies, 0.99),
+                'max': max(latencies) if latencies else None,
+            },
+            'health_errors': len(self.health.error_history),
+            'health_warnings': len(self.health.warnings),
+        }
+
+
+def format_report(report):
+    lines = [f"{report['mode']}: {report['samples']} samples, {report['virtual_seconds'] / 3600:.1f} h "
+             f"replayed in {report['wall_seconds']:.3f} s"]
+    for device in ACTUATORS:
+        lines.append(f"  {device:<10} {report['switches'][device]:5d} switches "
+                     f"{report['commands'][device]:6d} commands  on {100 * report['on_fraction'][device]:5.1f} %")
+    for name, share in report['time_in_band'].items():
+        lines.append(f"  {name:<10} in band {'-' if share is None else f'{100 * share:.1f} %'}")
+    latency = report['decision_latency_s']
+    if latency['count']:
+        lines.append(f"  decision latency p50 {latency['p50']:.1f} s, p99 {latency['p99']:.1f} s, "
+                     f"max {latency['max']:.1f} s ({latency['count']} decisions)")
+    lines.append(f"  health: {report['health_errors']} errors, {report['health_warnings']} warnings")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a sensor trace through the controllers in virtual time")
+    parser.add_argument('trace', nargs='?', help="CSV or Parquet file, a synthetic day if omitted")
+    parser.add_argument('--mode', choices=('bus', 'polling'), default='bus')
+    parser.add_argument('--hours', type=float, default=24, help="length of the synthetic trace")
+    parser.add_argument('--tick', type=float, default=60.0, help="check interval of the health monitor")
+    args = parser.parse_args()
+
+    harness = ReplayHarness(mode=args.mode, tick=args.tick)
+    trace = load_trace(args.trace) if args.trace else None
+    print(format_report(harness.run(trace, hours=args.hours)))
+
+
+if __name__ == '__main__':
+    main()
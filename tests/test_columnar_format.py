@@ -0,0 +1,38 @@
+import unittest
+import math
+import struct
+from include.columnar_format import encode_columnar, decode_columnar, column_types, COLUMN_BITS, COLUMN_FLOAT32, COLUMN_FLOAT64
+
+
+class TestColumnarFormat(unittest.TestCase):
+    def test_round_trip(self):
+        rows = [(20.0 + i * 0.25, 50.5, 800 + i, i % 2, 0, 1 if i == 9 else 0, 1) for i in range(11)]
+        types = column_types(7, (3, 4, 5, 6))
+        columns = decode_columnar(encode_columnar(rows, types))
+
+        self.assertEqual(len(columns), 7)
+        self.assertEqual(columns[0], [row[0] for row in rows])
+        self.assertEqual(columns[2], [float(row[2]) for row in rows])
+        for index in (3, 4, 5, 6):
+            self.assertEqual(columns[index], [row[index] for row in rows])
+
+    def test_layout_is_aligned_and_compact(self):
+        rows = [(21.0, 1)] * 1000
+        buffer = encode_columnar(rows, [COLUMN_FLOAT32, COLUMN_BITS])
+        # header + (type, length) per column + 4000 bytes float32 + 125 bytes bits padded to 128
+        self.assertEqual(len(buffer), 12 + 8 + 4000 + 8 + 128)
+        self.assertEqual(struct.unpack_from('<II', buffer, 4), (1000, 2))
+
+    def test_timestamps_keep_full_precision(self):
+        rows = [(22.0, 1700000000.0 + 5 * i) for i in range(3)]
+        columns = decode_columnar(encode_columnar(rows, [COLUMN_FLOAT32, COLUMN_FLOAT64]))
+        self.assertEqual(columns[1], [1700000000.0, 1700000005.0, 1700000010.0])
+
+    def test_missing_values_become_nan(self):
+        columns = decode_columnar(encode_columnar([(None,), (1.5,)], [COLUMN_FLOAT32]))
+        self.assertTrue(math.isnan(columns[0][0]))
+        self.assertEqual(columns[0][1], 1.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+from flask import Flask, jsonify, request, Response
+from include.conditional_get import conditional_get
+from include.columnar_format import supported_mimetypes, column_types, encode_columnar, COLUMNAR_MIMETYPE
+from include.ring_buffer import SampleRingBuffer
+
+
+class FakeWriter:
+    write_version = 0
+
+
+def create_app(ring_buffer, writer, health):
+    """The polled routes of app.py with the same validators and Accept negotiation"""
+    app = Flask(__name__)
+    app.calls = 0
+
+    @app.route('/data')
+    @conditional_get(lambda: (ring_buffer.version, writer.write_version))
+    def data():
+        app.calls += 1
+        rows = [(22.0, 50.0, 800, 1, 0, 0, 0, 1700000000.0)]
+        if request.accept_mimetypes.best_match(supported_mimetypes()) == COLUMNAR_MIMETYPE:
+            response = Response(encode_columnar(rows, column_types(8)), mimetype=COLUMNAR_MIMETYPE)
+        else:
+            response = jsonify(rows)
+        response.vary.add('Accept')
+        return response
+
+    @app.route('/system/warnings')
+    @conditional_get(lambda: health['version'])
+    def get_warnings():
+        app.calls += 1
+        return jsonify(health['warnings'])
+
+    return app
+
+
+class TestConditionalGet(unittest.TestCase):
+    def setUp(self):
+        self.ring_buffer = SampleRingBuffer(capacity=16)
+        self.writer = FakeWriter()
+        self.health = {'version': 0, 'warnings': []}
+        self.app = create_app(self.ring_buffer, self.writer, self.health)
+        self.client = self.app.test_client()
+
+    def get(self, path, etag=None, accept='application/json'):
+        headers = {'Accept': accept}
+        if etag is not None:
+            headers['If-None-Match'] = etag
+        return self.client.get(path, headers=headers)
+
+    def test_not_modified(self):
+        response = self.get('/data?timespan=4')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+        etag = response.headers['ETag']
+
+        response = self.get('/data?timespan=4', etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+        self.assertEqual(response.headers['ETag'], etag)
+        # the view (and its queries) did not run for the 304
+        self.assertEqual(self.app.calls, 1)
+
+    def test_etag_changes_with_version(self):
+        etag = self.get('/data').headers['ETag']
+        self.ring_buffer.append((1700000005.0, 22.0, 50.0, 800, 1, 0, 0, 0))
+        response = self.get('/data', etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+        etag = response.headers['ETag']
+        self.writer.write_version += 1
+        self.assertEqual(self.get('/data', etag).status_code, 200)
+
+    def test_etag_differs_by_accept(self):
+        json_response = self.get('/data')
+        columnar_response = self.get('/data', accept=COLUMNAR_MIMETYPE)
+        self.assertEqual(columnar_response.mimetype, COLUMNAR_MIMETYPE)
+        self.assertNotEqual(json_response.headers['ETag'], columnar_response.headers['ETag'])
+        # a cached JSON body must not be confirmed for a columnar request
+        response = self.get('/data', json_response.headers['ETag'], accept=COLUMNAR_MIMETYPE)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, COLUMNAR_MIMETYPE)
+
+    def test_etag_differs_by_query_string(self):
+        etag = self.get('/data?timespan=4').headers['ETag']
+        response = self.get('/data?timespan=24', etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertEqual(self.get('/data?timespan=24&points=500', response.headers['ETag']).status_code, 200)
+
+    def test_one_of_several_etags(self):
+        etag = self.get('/data').headers['ETag']
+        response = self.get('/data', f'"outdated", {etag}')
+        self.assertEqual(response.status_code, 304)
+
+    def test_system_endpoint(self):
+        response = self.get('/system/warnings')
+        self.assertEqual(response.json, [])
+        etag = response.headers['ETag']
+        self.assertEqual(self.get('/system/warnings', etag).status_code, 304)
+
+        self.health['warnings'] = [{'code': 1}]
+        self.health['version'] += 1
+        response = self.get('/system/warnings', etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, [{'code': 1}])
+        # different routes never share an ETag
+        self.assertNotEqual(self.get('/data').headers['ETag'], response.headers['ETag'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -19,6 +19,10 @@ python3 -m pytest tests/test_fridge_controller_temp_day.py -v
 echo "Running test_heater_controller tests..."
 python3 -m pytest tests/test_heater_controller.py -v
 
+# All other unit test suites (storage, import/export, runtime, MQTT, ...) in one run, new test files are picked up automatically
+echo "Running unit tests..."
+python3 -m pytest tests -v --ignore=tests/test_sensors.py --ignore=tests/test_fridge_controller_temp_day.py --ignore=tests/test_heater_controller.py
+
 echo "All controller tests completed."
 
 # Deactivate virtual environment if it was activated
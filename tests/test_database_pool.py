@@ -0,0 +1,158 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+import mysql.connector
+from include.database_pool import DatabasePool, DatabasePoolTimeout
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def make_connection(**config):
+    conn = MagicMock()
+    conn.in_transaction = False
+    conn.is_connected.return_value = True
+    return conn
+
+
+@patch('include.database_pool.mysql.connector.connect')
+class TestDatabasePool(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeTime()
+        patcher = patch('include.database_pool.time.monotonic', self.clock.monotonic)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pool = DatabasePool({'host': 'dummy'}, pool_size=2, recycle_time=1800, ping_after=30.0)
+
+    def test_connections_are_reused(self, connect):
+        connect.side_effect = make_connection
+        with self.pool.connection() as first:
+            pass
+        with self.pool.connection() as second:
+            pass
+        self.assertIs(first, second)
+        self.assertEqual(connect.call_count, 1)
+        self.assertEqual(connect.call_args.kwargs, {'host': 'dummy'})
+        stats = self.pool.stats()
+        self.assertEqual((stats['open'], stats['idle'], stats['in_use']), (1, 1, 0))
+        self.assertEqual(stats['checkouts'], 2)
+
+    def test_exhausted_pool_times_out(self, connect):
+        connect.side_effect = make_connection
+        held = [self.pool.acquire(), self.pool.acquire()]
+        with self.assertRaises(DatabasePoolTimeout):
+            self.pool.acquire(timeout=0)
+        # the timeout is a mysql.connector.Error, callers handle it like a database error
+        self.assertTrue(issubclass(DatabasePoolTimeout, mysql.connector.Error))
+        stats = self.pool.stats()
+        self.assertEqual((stats['timeouts'], stats['in_use'], stats['connections_created']), (1, 2, 2))
+        for conn in held:
+            self.pool.release(conn)
+
+    def test_waiting_checkout_gets_released_connection(self, connect):
+        connect.side_effect = make_connection
+        self.pool.checkout_timeout = 5.0
+        held = [self.pool.acquire(), self.pool.acquire()]
+        result = []
+        waiter = threading.Thread(target=lambda: result.append(self.pool.acquire()))
+        waiter.start()
+        while not self.pool._condition._waiters:
+            time.sleep(0.001)
+        self.pool.release(held[0])
+        waiter.join(5)
+        self.assertIs(result[0], held[0])
+        self.assertEqual(self.pool.stats()['waits'], 1)
+
+    def test_old_connections_are_recycled(self, connect):
+        connect.side_effect = make_connection
+        with self.pool.connection() as first:
+            pass
+        self.clock.now += 1801
+        with self.pool.connection() as second:
+            pass
+        self.assertIsNot(first, second)
+        first.close.assert_called_once()
+        stats = self.pool.stats()
+        self.assertEqual((stats['connections_recycled'], stats['connections_created'], stats['open']), (1, 2, 1))
+
+    def test_idle_connections_are_pinged(self, connect):
+        connect.side_effect = make_connection
+        with self.pool.connection() as first:
+            pass
+        self.clock.now += 10
+        with self.pool.connection():
+            pass
+        first.is_connected.assert_not_called()
+
+        self.clock.now += 31
+        first.is_connected.return_value = False
+        with self.pool.connection() as second:
+            pass
+        first.is_connected.assert_called_once()
+        self.assertIsNot(first, second)
+        self.assertEqual(self.pool.stats()['connections_recycled'], 1)
+
+    def test_connection_which_raised_is_discarded(self, connect):
+        connect.side_effect = make_connection
+        with self.assertRaises(mysql.connector.errors.OperationalError):
+            with self.pool.connection() as broken:
+                raise mysql.connector.errors.OperationalError(msg="Lost connection")
+        broken.close.assert_called_once()
+        stats = self.pool.stats()
+        self.assertEqual((stats['connections_discarded'], stats['open'], stats['idle']), (1, 0, 0))
+        with self.pool.connection() as conn:
+            pass
+        self.assertIsNot(conn, broken)
+
+    def test_other_exceptions_keep_the_connection(self, connect):
+        connect.side_effect = make_connection
+        with self.assertRaises(KeyError):
+            with self.pool.connection() as first:
+                raise KeyError('not a database error')
+        with self.pool.connection() as second:
+            pass
+        self.assertIs(first, second)
+
+    def test_open_transaction_is_rolled_back_on_release(self, connect):
+        connect.side_effect = make_connection
+        with self.pool.connection() as conn:
+            conn.in_transaction = True
+        conn.rollback.assert_called_once()
+        self.assertEqual(self.pool.stats()['idle'], 1)
+
+        # a connection which cannot even roll back is dropped
+        conn.rollback.side_effect = mysql.connector.errors.OperationalError(msg="gone")
+        with self.pool.connection():
+            pass
+        self.assertEqual(self.pool.stats()['connections_discarded'], 1)
+
+    def test_failed_connect_frees_the_slot(self, connect):
+        connect.side_effect = mysql.connector.errors.InterfaceError(msg="Can't connect")
+        for _ in range(3):
+            with self.assertRaises(mysql.connector.errors.InterfaceError):
+                self.pool.acquire()
+        self.assertEqual(self.pool.stats()['open'], 0)
+        connect.side_effect = make_connection
+        self.pool.release(self.pool.acquire())
+        self.assertEqual(self.pool.stats()['connections_created'], 1)
+
+    def test_fetch_helpers(self, connect):
+        conn = make_connection()
+        connect.return_value = conn
+        cursor = conn.cursor.return_value
+        cursor.fetchall.return_value = [(1,), (2,)]
+        cursor.fetchone.return_value = (1,)
+        self.assertEqual(self.pool.fetchall("SELECT id FROM t WHERE x = %s", (3,)), [(1,), (2,)])
+        cursor.execute.assert_called_with("SELECT id FROM t WHERE x = %s", (3,))
+        self.assertEqual(self.pool.fetchone("SELECT 1"), (1,))
+        self.assertEqual(cursor.close.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
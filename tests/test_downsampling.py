@@ -0,0 +1,62 @@
+import unittest
+import math
+from include.downsampling import downsample_rows, bucket_bounds
+
+
+def make_rows(count):
+    rows = []
+    for i in range(count):
+        temperature = 22.0 + 3.0 * math.sin(i / 200.0)
+        humidity = 50.0 + 10.0 * math.cos(i / 300.0)
+        eco2 = 800 + (i % 100)
+        light_state = 1 if (i // 1000) % 2 == 0 else 0
+        fridge_state = 1 if i == 5001 else 0  # single sample pulse
+        rows.append((temperature, humidity, eco2, light_state, fridge_state, 0, 0))
+    return rows
+
+
+class TestDownsampling(unittest.TestCase):
+    def test_small_series_is_returned_unchanged(self):
+        rows = make_rows(100)
+        self.assertEqual(downsample_rows(rows, 500), rows)
+
+    def test_point_budget_is_respected(self):
+        rows = make_rows(17280)  # 24h at 5s cadence
+        result = downsample_rows(rows, 1000)
+        self.assertEqual(len(result), 1000)
+        self.assertEqual(len(result[0]), 7)
+
+    def test_first_and_last_rows_are_kept(self):
+        rows = make_rows(5000)
+        result = downsample_rows(rows, 300)
+        self.assertEqual(result[0], rows[0])
+        self.assertEqual(result[-1], rows[-1])
+
+    def test_extremes_are_preserved(self):
+        rows = make_rows(17280)
+        result = downsample_rows(rows, 1000)
+        raw_max = max(r[0] for r in rows)
+        sampled_max = max(r[0] for r in result)
+        self.assertAlmostEqual(raw_max, sampled_max, places=2)
+
+    def test_state_pulses_survive(self):
+        rows = make_rows(17280)
+        result = downsample_rows(rows, 500)
+        self.assertEqual(sum(r[4] for r in result), 1)
+
+    def test_buckets_cover_series(self):
+        bounds = bucket_bounds(1003, 10)
+        self.assertEqual(bounds[0], (0, 1))
+        self.assertEqual(bounds[-1], (1002, 1003))
+        for (_, end), (start, _) in zip(bounds, bounds[1:]):
+            self.assertEqual(end, start)
+
+    def test_null_values(self):
+        rows = [(None, 50.0, 800, 0, 0, 0, None)] * 50
+        result = downsample_rows(rows, 10)
+        self.assertEqual(len(result), 10)
+        self.assertIsNone(result[3][6])
+
+
+if __name__ == '__main__':
+    unittest.main()
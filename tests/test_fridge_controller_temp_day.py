@@ -1,8 +1,9 @@
 import unittest
-from unittest.mock import MagicMock, patch
+from unittest.mock import MagicMock
 from datetime import datetime, timedelta
 import time
 from include.fridge_controller import Fridge, ControlMode
+from include.sensor_sample_store import LatestSampleStore, SensorSample
 
 class MockMQTTInterface:
     def __init__(self):
@@ -31,7 +32,8 @@ class TestFridgeController(unittest.TestCase):
             'password': 'dummy',
             'database': 'dummy'
         }
-        self.fridge = Fridge(self.db_config)
+        self.sample_store = LatestSampleStore()
+        self.fridge = Fridge(self.db_config, self.sample_store)
         self.mqtt = MockMQTTInterface()
         
         # Set control parameters for temperature control
@@ -42,12 +44,7 @@ class TestFridgeController(unittest.TestCase):
         self.fridge.set_timeout(3)
         self.fridge.additionalTemperatureMargin = 0.5
 
-    @patch('mysql.connector.connect')
-    def test_temperature_control_cycle(self, mock_connect):
-        # Create a mock cursor and connection
-        mock_cursor = MagicMock()
-        mock_connect.return_value.cursor.return_value = mock_cursor
-        
+    def test_temperature_control_cycle(self):
         # Test scenario: Detailed temperature cycling with 0.1°C steps
         test_temperatures = [
             # From 23 to 26 (increasing)
@@ -138,8 +135,8 @@ class TestFridgeController(unittest.TestCase):
                 print(f"\n=== {test_sections[current_section][2]} ===")
                 current_section += 1
             
-            # Setup mock database response
-            mock_cursor.fetchall.return_value = [(temp,)]
+            # Publish the sensor sample the controller reads
+            self.sample_store.publish(SensorSample(time.time(), temp, 50.0, 800))
             
             # Run fridge control cycle
             self.fridge.control_fridge(mock_scheduler, self.mqtt)
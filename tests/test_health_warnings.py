@@ -0,0 +1,48 @@
+import unittest
+from include.clock import VirtualClock
+from include.health_monitoring import HealthMonitor
+from include.health_monitoring_errors import HealthWarningCode
+
+CONFIG = {
+    'TemperatureControl': {'targetDayTemperature': 25.0, 'targetNightTemperature': 20.0},
+    'CO2Control': {'targetValue': 800},
+    'HumidityControl': {'targetHumidity': 65},
+}
+
+
+class TestHealthWarningVersion(unittest.TestCase):
+    def setUp(self):
+        self.clock = VirtualClock(start=1700000000)
+        self.health = HealthMonitor(CONFIG, clock=self.clock)
+
+    def test_repeated_warning_keeps_version(self):
+        warning = self.health.add_warning(HealthWarningCode.CO2_CONTROL_LOW, "CO2 control below target")
+        version = self.health.version
+        raised_at = warning.timestamp
+        for _ in range(10):
+            self.clock.advance(1)
+            self.health.add_warning(HealthWarningCode.CO2_CONTROL_LOW, "CO2 control below target")
+        self.assertEqual(self.health.version, version)
+        # the payload of /system/warnings is unchanged as well
+        self.assertEqual(warning.timestamp, raised_at)
+        self.assertEqual(len(self.health.warnings), 1)
+
+    def test_new_message_and_resolve_bump_version(self):
+        self.health.add_warning(HealthWarningCode.CO2_CONTROL_LOW, "CO2 control below target: 300ppm")
+        version = self.health.version
+        self.clock.advance(1)
+        warning = self.health.add_warning(HealthWarningCode.CO2_CONTROL_LOW, "CO2 control below target: 200ppm")
+        self.assertEqual(self.health.version, version + 1)
+        self.assertEqual(warning.timestamp, self.clock.now())
+
+        self.health.add_warning(HealthWarningCode.TEMPERATURE_CONTROL_HIGH, "Temperature control above target")
+        self.assertEqual(self.health.version, version + 2)
+        self.health.resolve_warning(HealthWarningCode.CO2_CONTROL_LOW)
+        self.assertEqual(self.health.version, version + 3)
+        # resolving twice is no change
+        self.health.resolve_warning(HealthWarningCode.CO2_CONTROL_LOW)
+        self.assertEqual(self.health.version, version + 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,6 +3,7 @@ from unittest.mock import MagicMock, patch
 from datetime import datetime, timedelta
 import time
 from include.heater_controller import Heater
+from include.sensor_sample_store import LatestSampleStore, SensorSample
 
 class MockMQTTInterface:
     def __init__(self):
@@ -23,7 +24,8 @@ class TestHeaterController(unittest.TestCase):
             'password': 'dummy',
             'database': 'dummy'
         }
-        self.heater = Heater(self.db_config)
+        self.sample_store = LatestSampleStore()
+        self.heater = Heater(self.db_config, self.sample_store)
         self.heater.set_timeout(3)  # Set timeout to 3 seconds for faster testing
         self.mqtt = MockMQTTInterface()
         
@@ -136,7 +138,8 @@ class TestHeaterController(unittest.TestCase):
                 print(f"\n=== {test_sections[current_section][2]} ===")
                 current_section += 1
             
-            # Setup mock database response
+            # Publish the sensor sample, the trend query still reads the mocked database
+            self.sample_store.publish(SensorSample(time.time(), temp, 50.0, 800))
             mock_cursor.fetchall.return_value = [(temp,)]
             
             # Run heater control cycle
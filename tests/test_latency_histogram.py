@@ -0,0 +1,48 @@
+import random
+import unittest
+from include.latency_histogram import LatencyHistogram
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    def test_empty(self):
+        histogram = LatencyHistogram()
+        self.assertIsNone(histogram.percentile(0.5))
+        self.assertEqual(histogram.summary()['count'], 0)
+        self.assertEqual(histogram.buckets(), [])
+
+    def test_percentiles_within_relative_error(self):
+        histogram = LatencyHistogram(sub_buckets=32)
+        rng = random.Random(1)
+        values = sorted(rng.lognormvariate(-3, 1.5) for _ in range(5000))
+        for value in values:
+            histogram.record(value)
+        for fraction in (0.5, 0.9, 0.99):
+            exact = values[int(fraction * len(values)) - 1]
+            self.assertAlmostEqual(histogram.percentile(fraction), exact, delta=exact / 16)
+        self.assertEqual(histogram.max, values[-1])
+        self.assertEqual(histogram.percentile(1.0), values[-1])
+
+    def test_memory_is_bounded(self):
+        histogram = LatencyHistogram(lowest=1e-4, highest=3600.0, sub_buckets=32)
+        size = len(histogram.counts)
+        for value in (0.0, 1e-6, 5.0, 1e6):
+            histogram.record(value)
+        self.assertEqual(len(histogram.counts), size)
+        self.assertEqual(histogram.count, 4)
+        self.assertEqual(histogram.max, 1e6)
+        self.assertEqual(sum(count for _, count in histogram.buckets()), 4)
+
+    def test_summary_in_milliseconds(self):
+        histogram = LatencyHistogram()
+        for _ in range(10):
+            histogram.record(0.2)
+        summary = histogram.summary()
+        self.assertEqual(summary['count'], 10)
+        self.assertEqual(summary['max'], 200.0)
+        self.assertAlmostEqual(summary['p50'], 200.0, delta=200.0 / 32)
+        histogram.reset()
+        self.assertEqual(histogram.count, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+from include.liveness import LivenessTracker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestLivenessTracker(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.liveness = LivenessTracker(clock=self.clock)
+        self.liveness.register('sensors', timeout=60)
+
+    def test_unknown_until_first_heartbeat(self):
+        self.assertFalse(self.liveness.is_alive('sensors'))
+        self.assertFalse(self.liveness.is_alive('camera'))
+
+    def test_heartbeat_timeout(self):
+        self.liveness.heartbeat('sensors')
+        self.clock.now += 59
+        self.assertTrue(self.liveness.is_alive('sensors'))
+        self.clock.now += 2
+        self.assertFalse(self.liveness.is_alive('sensors'))
+        self.liveness.heartbeat('sensors')
+        self.assertTrue(self.liveness.is_alive('sensors'))
+
+    def test_failure_until_next_heartbeat(self):
+        self.liveness.heartbeat('database')
+        self.clock.now += 1
+        self.liveness.failure('database', RuntimeError('Lost connection'))
+        self.assertFalse(self.liveness.is_alive('database'))
+        self.assertEqual(self.liveness.status()['database']['error'], 'Lost connection')
+        self.clock.now += 1
+        self.liveness.heartbeat('database')
+        self.assertTrue(self.liveness.is_alive('database'))
+        self.assertIsNone(self.liveness.status()['database']['error'])
+
+
+if __name__ == '__main__':
+    unittest.main()
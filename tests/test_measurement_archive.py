@@ -0,0 +1,69 @@
+import unittest
+import datetime
+import os
+import tempfile
+from include.measurement_archive import encode_block, decode_block, MeasurementArchiver, day_bounds
+from include.measurement_storage import SQLiteStorage
+from include.measurement_export import iter_batches
+from tests.measurement_rows import make_rows
+
+
+class TestArchiveBlock(unittest.TestCase):
+    def test_round_trip(self):
+        rows = make_rows(1700000000, 500)
+        rows[10] = (rows[10][0] + 0.25, None, None, None, 1, 1, 1, 1)  # jitter and missing values
+        decoded = decode_block(encode_block(rows))
+        self.assertEqual(len(decoded), len(rows))
+        for original, restored in zip(rows, decoded):
+            self.assertAlmostEqual(restored[0], original[0], places=3)
+            for a, b in zip(original[1:], restored[1:]):
+                if a is None:
+                    self.assertIsNone(b)
+                else:
+                    self.assertAlmostEqual(a, b, places=2)
+
+    def test_compression(self):
+        rows = make_rows(1700000000, 17280)
+        # a day of 5 second samples packs into a few bytes per sample
+        self.assertLess(len(encode_block(rows)), 17280 * 2)
+
+
+class TestArchiveCompaction(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.storage = SQLiteStorage(os.path.join(self.tmpdir.name, 'sensor_data.db'))
+        self.today = datetime.date.today()
+        self.old_day = self.today - datetime.timedelta(days=40)
+        self.day_start, _ = day_bounds(self.old_day)
+        self.storage.insert_rows(make_rows(self.day_start, 720))
+        self.storage.insert_rows(make_rows(day_bounds(self.today)[0], 10))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_compact_and_read(self):
+        before = self.storage.fetch_window(self.day_start - 1)
+        archived = MeasurementArchiver(self.storage, archive_after_days=28).compact(self.today)
+        self.assertEqual(archived, [self.old_day])
+        self.assertEqual(self.storage._fetchall("SELECT COUNT(*) FROM measurements")[0][0], 10)
+
+        after = self.storage.fetch_window(self.day_start - 1)
+        self.assertEqual(len(after), len(before))
+        self.assertEqual([row[7] for row in after], [row[7] for row in before])
+        self.assertIsNone(after[0][8])  # archived rows have no id
+
+        batches = list(iter_batches(self.storage, 'measurements', self.day_start, self.day_start + 3600))
+        self.assertEqual(sum(len(batch) for batch in batches), 720)
+
+    def test_late_rows_are_merged(self):
+        archiver = MeasurementArchiver(self.storage, archive_after_days=28)
+        archiver.compact(self.today)
+        self.storage.insert_rows([(self.day_start + 7200, 21.0, 50.0, 900, 1, 0, 0, 0)])
+        archiver.compact(self.today)
+        rows = self.storage.fetch_window(self.day_start)
+        self.assertEqual(len(rows), 731)
+        self.assertEqual(self.storage._fetchall("SELECT samples FROM measurement_archive")[0][0], 721)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+import csv
+import io
+import os
+import tempfile
+from include.measurement_storage import SQLiteStorage
+from include.measurement_export import csv_chunks, iter_batches, export_header
+from tests.measurement_rows import make_rows
+
+
+class TestMeasurementExport(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.storage = SQLiteStorage(os.path.join(self.tmpdir.name, 'sensor_data.db'))
+        self.start = 1700000000
+        self.storage.insert_rows(make_rows(self.start, 100))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_batches_cover_range(self):
+        batches = list(iter_batches(self.storage, 'measurements', self.start + 50, self.start + 300, batch_size=20))
+        self.assertEqual([len(batch) for batch in batches], [20, 20, 10])
+        self.assertEqual(batches[0][0][0], self.start + 50)
+        self.assertEqual(batches[-1][-1][0], self.start + 295)  # end is exclusive
+
+    def test_csv(self):
+        text = ''.join(csv_chunks(self.storage, 'measurements', self.start, self.start + 3600))
+        rows = list(csv.reader(io.StringIO(text)))
+        self.assertEqual(rows[0], export_header('measurements'))
+        self.assertEqual(len(rows), 101)
+        self.assertEqual(rows[1][3], '800')
+
+    def test_rollup_source(self):
+        text = ''.join(csv_chunks(self.storage, 'measurements_1h', self.start - 3600, self.start + 3600))
+        rows = list(csv.reader(io.StringIO(text)))
+        self.assertEqual(rows[0][0], 'bucket_start')
+        self.assertEqual(sum(int(row[1]) for row in rows[1:]), 100)
+
+    def test_unknown_source(self):
+        with self.assertRaises(ValueError):
+            iter_batches(self.storage, 'users', 0, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+import os
+import tempfile
+from include.measurement_storage import SQLiteStorage, existing_seconds
+from include.measurement_export import csv_chunks
+from include.measurement_import import MeasurementImporter, parse_record, read_csv
+from tests.measurement_rows import make_rows
+
+
+class TestMeasurementImport(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.source = SQLiteStorage(os.path.join(self.tmpdir.name, 'source.db'))
+        self.target = SQLiteStorage(os.path.join(self.tmpdir.name, 'target.db'))
+        self.start = 1700000000
+        self.source.insert_rows(make_rows(self.start, 300))
+        self.csv_path = os.path.join(self.tmpdir.name, 'history.csv')
+        with open(self.csv_path, 'w', newline='') as file:
+            for chunk in csv_chunks(self.source, 'measurements', 0, self.start + 3600):
+                file.write(chunk)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_round_trip_and_dedupe(self):
+        importer = MeasurementImporter(self.target)
+        importer.import_batches(read_csv(self.csv_path, batch_size=64))
+        self.assertEqual(importer.inserted, 300)
+        self.assertEqual(self.target.fetch_window(0), self.source.fetch_window(0))
+        # rollups are updated like for live samples
+        self.assertEqual(self.target.fetch_rollups('measurements_1h', 0), self.source.fetch_rollups('measurements_1h', 0))
+
+        again = MeasurementImporter(self.target)
+        again.import_batches(read_csv(self.csv_path, batch_size=64))
+        self.assertEqual(again.inserted, 0)
+        self.assertEqual(again.duplicates, 300)
+
+    def test_validation(self):
+        self.assertEqual(parse_record({'timestamp': '1700000000', 'temperature_c': '21.5', 'light_state': 'true'}),
+                         (1700000000.0, 21.5, None, None, 1, 0, 0, 0))
+        for record in ({'temperature_c': '21.5'},
+                       {'timestamp': '1700000000', 'temperature_c': '150'},
+                       {'timestamp': '1700000000', 'temperature_c': '21', 'fridge_state': '2'},
+                       {'timestamp': '1700000000'}):
+            with self.assertRaises(ValueError):
+                parse_record(record)
+
+        importer = MeasurementImporter(self.target)
+        importer.import_batch([{'timestamp': '1700000000', 'temperature_c': '21'},
+                               {'timestamp': '1700000000.2', 'temperature_c': '21'},
+                               {'timestamp': 'yesterday', 'temperature_c': '21'}])
+        self.assertEqual((importer.inserted, importer.duplicates, importer.invalid), (1, 1, 1))
+
+    def test_sparse_batch_queries_only_its_own_ranges(self):
+        queried = []
+        existing_timestamps = self.target.existing_timestamps
+
+        def recording(start, end):
+            queried.append((start, end))
+            return existing_timestamps(start, end)
+
+        self.target.existing_timestamps = recording
+        self.target.insert_rows(make_rows(self.start, 10))
+        year = 365 * 86400
+        importer = MeasurementImporter(self.target)
+        # unsorted, two rows a year apart around a stored run
+        importer.import_batch([{'timestamp': str(self.start + year), 'temperature_c': '21'},
+                               {'timestamp': str(self.start + 5), 'temperature_c': '21'},
+                               {'timestamp': str(self.start - year), 'temperature_c': '21'},
+                               {'timestamp': str(self.start + 60), 'temperature_c': '21'}])
+        self.assertEqual((importer.inserted, importer.duplicates), (3, 1))
+        self.assertEqual(queried, [(self.start - year - 1, self.start - year + 1),
+                                   (self.start + 4, self.start + 61),
+                                   (self.start + year - 1, self.start + year + 1)])
+
+    def test_existing_seconds(self):
+        self.target.insert_rows(make_rows(self.start, 10))
+        seconds = [self.start, self.start + 7, self.start + 45, self.start + 86400]
+        self.assertEqual(existing_seconds(self.target, seconds), {self.start, self.start + 45})
+        self.assertEqual(existing_seconds(self.target, []), set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,179 @@
+import datetime
+import unittest
+from contextlib import contextmanager
+from include.measurement_retention import (
+    MeasurementRetention, DELETE_CHUNK_SQL, INDEX_SQL, PARTITIONS_SQL, PRIMARY_KEY_SQL, MIGRATE_KEYS_SQL, ADD_INDEX_SQL,
+)
+
+
+class FakeCursor:
+    def __init__(self, database):
+        self.database = database
+        self.rowcount = 0
+
+    def execute(self, statement, params=None):
+        self.database.statements.append((statement, params))
+        if statement == DELETE_CHUNK_SQL:
+            self.rowcount = self.database.delete_counts.pop(0)
+        else:
+            self.rowcount = 0
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, database):
+        self.database = database
+
+    def cursor(self):
+        return FakeCursor(self.database)
+
+    def commit(self):
+        self.database.commits += 1
+
+
+class FakeDatabasePool:
+    """Answers the information_schema queries of MeasurementRetention and records all other statements"""
+    def __init__(self, partitions=(), primary_key=('id',), index_exists=False, first_day=None, delete_counts=()):
+        self.partitions = list(partitions)
+        self.primary_key = primary_key
+        self.index_exists = index_exists
+        self.first_day = first_day
+        self.delete_counts = list(delete_counts)
+        self.statements = []
+        self.commits = 0
+
+    @contextmanager
+    def connection(self):
+        yield FakeConnection(self)
+
+    def fetchall(self, query, params=None):
+        if query == PARTITIONS_SQL:
+            return self.partitions or [(None, None)]
+        if query == PRIMARY_KEY_SQL:
+            return [(column,) for column in self.primary_key]
+        raise AssertionError(query)
+
+    def fetchone(self, query, params=None):
+        if query == INDEX_SQL:
+            return (1 if self.index_exists else 0,)
+        if 'MIN(timestamp)' in query:
+            return (self.first_day,)
+        raise AssertionError(query)
+
+    def ddl(self):
+        return [statement for statement, _ in self.statements if statement.lstrip().startswith('ALTER TABLE')]
+
+
+def partitions(*days):
+    return [(day.strftime('p%Y%m%d'), '0') for day in days] + [('pmax', 'MAXVALUE')]
+
+
+class TestMeasurementRetention(unittest.TestCase):
+    def setUp(self):
+        self.today = datetime.date(2024, 6, 10)
+
+    def test_migrate_partitions_by_day(self):
+        pool = FakeDatabasePool(first_day=datetime.date(2024, 6, 8))
+        MeasurementRetention(pool, retention_days=365, partitions_ahead=3).migrate(self.today)
+        ddl = pool.ddl()
+        self.assertEqual(ddl[0], ADD_INDEX_SQL)
+        self.assertEqual(ddl[1], MIGRATE_KEYS_SQL)
+        self.assertTrue(ddl[2].startswith("ALTER TABLE measurements PARTITION BY RANGE (UNIX_TIMESTAMP(timestamp))"))
+        # first stored day up to three days ahead, then the catch-all
+        self.assertIn("PARTITION p20240608 VALUES LESS THAN (UNIX_TIMESTAMP('2024-06-09 00:00:00'))", ddl[2])
+        self.assertIn("PARTITION p20240613 VALUES LESS THAN (UNIX_TIMESTAMP('2024-06-14 00:00:00'))", ddl[2])
+        self.assertEqual(ddl[2].count("PARTITION p2024"), 6)
+        self.assertTrue(ddl[2].endswith("PARTITION pmax VALUES LESS THAN MAXVALUE)"))
+
+    def test_migrate_starts_at_retention_cutoff(self):
+        pool = FakeDatabasePool(first_day=datetime.date(2020, 1, 1), primary_key=('id', 'timestamp'),
+                                index_exists=True)
+        MeasurementRetention(pool, retention_days=5, partitions_ahead=1).migrate(self.today)
+        ddl = pool.ddl()
+        self.assertEqual(len(ddl), 1)
+        self.assertIn("PARTITION p20240605 ", ddl[0])
+        self.assertNotIn("p20240604", ddl[0])
+        self.assertEqual(ddl[0].count("PARTITION p2024"), 7)
+
+    def test_migrate_is_idempotent(self):
+        pool = FakeDatabasePool(partitions=partitions(self.today), index_exists=True)
+        MeasurementRetention(pool).migrate(self.today)
+        self.assertEqual(pool.ddl(), [])
+
+    def test_ensure_partitions_reorganizes_pmax(self):
+        pool = FakeDatabasePool()
+        retention = MeasurementRetention(pool, partitions_ahead=3)
+        retention.ensure_partitions(partitions(datetime.date(2024, 6, 10), datetime.date(2024, 6, 11)), self.today)
+        self.assertEqual(pool.ddl(), [
+            "ALTER TABLE measurements REORGANIZE PARTITION pmax INTO ("
+            "PARTITION p20240612 VALUES LESS THAN (UNIX_TIMESTAMP('2024-06-13 00:00:00')), "
+            "PARTITION p20240613 VALUES LESS THAN (UNIX_TIMESTAMP('2024-06-14 00:00:00')), "
+            "PARTITION pmax VALUES LESS THAN MAXVALUE)"])
+        self.assertEqual(pool.commits, 1)
+
+    def test_ensure_partitions_skips_past_days(self):
+        # the job did not run for a while, no partitions are created for days which are over
+        pool = FakeDatabasePool()
+        MeasurementRetention(pool, partitions_ahead=0).ensure_partitions(partitions(datetime.date(2024, 6, 1)), self.today)
+        self.assertEqual(pool.ddl(), [
+            "ALTER TABLE measurements REORGANIZE PARTITION pmax INTO ("
+            "PARTITION p20240610 VALUES LESS THAN (UNIX_TIMESTAMP('2024-06-11 00:00:00')), "
+            "PARTITION pmax VALUES LESS THAN MAXVALUE)"])
+
+    def test_ensure_partitions_when_up_to_date(self):
+        pool = FakeDatabasePool()
+        days = [self.today + datetime.timedelta(days=i) for i in range(4)]
+        MeasurementRetention(pool, partitions_ahead=3).ensure_partitions(partitions(*days), self.today)
+        self.assertEqual(pool.ddl(), [])
+
+    def test_only_partitions_older_than_the_horizon_are_dropped(self):
+        pool = FakeDatabasePool()
+        retention = MeasurementRetention(pool, retention_days=10)
+        # cutoff is 2024-05-31 00:00, the partition of that day still holds rows inside the retention period
+        days = [datetime.date(2024, 5, 29), datetime.date(2024, 5, 30), datetime.date(2024, 5, 31), self.today]
+        dropped = retention.drop_expired_partitions(partitions(*days), self.today)
+        self.assertEqual(dropped, ['p20240529', 'p20240530'])
+        self.assertEqual(pool.ddl(), ["ALTER TABLE measurements DROP PARTITION p20240529, p20240530"])
+
+    def test_nothing_to_drop(self):
+        pool = FakeDatabasePool()
+        dropped = MeasurementRetention(pool, retention_days=10).drop_expired_partitions(
+            partitions(datetime.date(2024, 5, 31)) + [('p_custom', '0')], self.today)
+        self.assertEqual(dropped, [])
+        self.assertEqual(pool.ddl(), [])
+
+    def test_fallback_deletes_in_bounded_chunks(self):
+        pool = FakeDatabasePool(delete_counts=[100, 100, 37])
+        retention = MeasurementRetention(pool, retention_days=10, delete_chunk_size=100)
+        retention.apply(self.today)
+        deletes = [params for statement, params in pool.statements if statement == DELETE_CHUNK_SQL]
+        self.assertEqual(deletes, [(datetime.datetime(2024, 5, 31), 100)] * 3)
+        self.assertIn("LIMIT %s", DELETE_CHUNK_SQL)
+        # one transaction per chunk, plus the archive and the rollup expiry
+        self.assertEqual(pool.commits, 5)
+        self.assertEqual(pool.ddl(), [])
+
+    def test_rollups_expire_after_their_horizon(self):
+        pool = FakeDatabasePool(partitions=partitions(self.today))
+        MeasurementRetention(pool, retention_days=10).apply(self.today)
+        expired = [(statement, params) for statement, params in pool.statements
+                   if statement.startswith('DELETE FROM measurements_')]
+        self.assertEqual(expired, [
+            ("DELETE FROM measurements_1m WHERE bucket_start < FROM_UNIXTIME(%s)",
+             (int(datetime.datetime(2024, 5, 11).timestamp()),)),
+            ("DELETE FROM measurements_10m WHERE bucket_start < FROM_UNIXTIME(%s)",
+             (int(datetime.datetime(2023, 6, 11).timestamp()),)),
+        ])
+
+    def test_apply_on_partitioned_table(self):
+        days = [datetime.date(2024, 5, 30)] + [self.today + datetime.timedelta(days=i) for i in range(4)]
+        pool = FakeDatabasePool(partitions=partitions(*days))
+        MeasurementRetention(pool, retention_days=10, partitions_ahead=3).apply(self.today)
+        self.assertEqual(pool.ddl(), ["ALTER TABLE measurements DROP PARTITION p20240530"])
+        self.assertFalse(any(statement == DELETE_CHUNK_SQL for statement, _ in pool.statements))
+
+
+if __name__ == '__main__':
+    unittest.main()
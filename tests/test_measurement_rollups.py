@@ -0,0 +1,118 @@
+import unittest
+from include.measurement_rollups import (
+    ROLLUP_COLUMNS, aggregate_samples, bucket_start, ensure_rollup_tables, select_rollup_level,
+)
+
+
+class FakeCursor:
+    """Records the statements of ensure_rollup_tables and answers its queries"""
+    def __init__(self, tables, auto_update=(), raw_range=(1000.0, 5000.0)):
+        self.tables = tables
+        self.auto_update = auto_update
+        self.raw_range = raw_range
+        self.statements = []
+        self._result = []
+
+    def execute(self, statement, params=None):
+        self.statements.append((statement, params))
+        if statement == "SHOW TABLES":
+            self._result = [(table,) for table in self.tables]
+        elif 'information_schema' in statement:
+            self._result = [(table,) for table in self.auto_update]
+        elif 'MIN(timestamp)' in statement:
+            self._result = [self.raw_range]
+        else:
+            self._result = []
+
+    def fetchall(self):
+        return self._result
+
+    def fetchone(self):
+        return self._result[0]
+
+
+class TestMeasurementRollups(unittest.TestCase):
+    def test_bucket_start(self):
+        self.assertEqual(bucket_start(0, 60), 0)
+        self.assertEqual(bucket_start(59.9, 60), 0)
+        self.assertEqual(bucket_start(60, 60), 60)
+        self.assertEqual(bucket_start(7199, 3600), 3600)
+
+    def test_aggregate_samples(self):
+        samples = [
+            (0, 20.0, 50.0, 400, 1, 0, 0, 0),
+            (30, 22.0, None, 600, 1, 1, 0, 0),
+            (60, 21.0, 55.0, 500, 0, 0, 1, 0),
+        ]
+        buckets = aggregate_samples(samples, 60)
+        self.assertEqual(sorted(buckets), [0, 60])
+        row = dict(zip(ROLLUP_COLUMNS, buckets[0]))
+        self.assertEqual(row['samples'], 2)
+        self.assertEqual((row['temperature_sum'], row['temperature_min'], row['temperature_max']), (42.0, 20.0, 22.0))
+        # missing values are skipped, not counted as 0
+        self.assertEqual((row['humidity_sum'], row['humidity_min'], row['humidity_max']), (50.0, 50.0, 50.0))
+        self.assertEqual((row['light_on'], row['fridge_on'], row['co2_on'], row['heater_on']), (2, 1, 0, 0))
+        row = dict(zip(ROLLUP_COLUMNS, aggregate_samples(samples, 600)[0]))
+        self.assertEqual(row['samples'], 3)
+        self.assertEqual(row['eco2_max'], 600)
+
+    def test_aggregate_samples_without_values(self):
+        row = aggregate_samples([(5, None, None, None, 0, 0, 0, 0)], 60)[0]
+        self.assertEqual(row[0], 1)
+        self.assertEqual(row[1:10], [None] * 9)
+        self.assertEqual(aggregate_samples([], 60), {})
+
+    def test_select_rollup_level(self):
+        # resolution = timespan / points, the coarsest level not coarser than it is used
+        self.assertIsNone(select_rollup_level(1, 3600))            # 1 s
+        self.assertIsNone(select_rollup_level(1, 61))               # just under a minute
+        self.assertEqual(select_rollup_level(1, 60), 'measurements_1m')
+        self.assertEqual(select_rollup_level(10, 61), 'measurements_1m')
+        self.assertEqual(select_rollup_level(10, 60), 'measurements_10m')
+        self.assertEqual(select_rollup_level(100, 101), 'measurements_10m')
+        self.assertEqual(select_rollup_level(100, 100), 'measurements_1h')
+        self.assertEqual(select_rollup_level(24 * 365, 10), 'measurements_1h')
+
+    def test_select_rollup_level_within_horizon(self):
+        # the minute buckets are kept for 30 days, a longer timespan falls back to the next coarser table
+        self.assertEqual(select_rollup_level(24 * 30, 24 * 30 * 60), 'measurements_1m')
+        self.assertEqual(select_rollup_level(24 * 31, 24 * 31 * 60), 'measurements_10m')
+        self.assertEqual(select_rollup_level(24 * 366, 24 * 366 * 6), 'measurements_1h')
+        self.assertIsNone(select_rollup_level(24 * 31, 24 * 31 * 60 * 2))  # finer than a minute
+
+    def test_select_rollup_level_without_points(self):
+        self.assertIsNone(select_rollup_level(24, 0))
+        self.assertIsNone(select_rollup_level(24, None))
+
+    def test_missing_tables_are_created_and_backfilled(self):
+        cursor = FakeCursor(tables=['measurements', 'measurements_1m'])
+        ensure_rollup_tables(cursor)
+        created = [s for s, _ in cursor.statements if s.lstrip().startswith('CREATE TABLE')]
+        self.assertEqual(len(created), 2)
+        self.assertTrue(all('DEFAULT CURRENT_TIMESTAMP' in s for s in created))
+        rebuilds = [p for s, p in cursor.statements if 'INSERT INTO' in s]
+        self.assertEqual(rebuilds, [(600, 5000.0), (0, 5000.0)])
+
+    def test_auto_update_columns_are_repaired_and_rebuilt(self):
+        tables = ['measurements', 'measurements_1m', 'measurements_10m', 'measurements_1h']
+        cursor = FakeCursor(tables=tables, auto_update=['measurements_1m'])
+        ensure_rollup_tables(cursor)
+        statements = [s for s, _ in cursor.statements]
+        alter = next(i for i, s in enumerate(statements) if s.startswith('ALTER TABLE measurements_1m'))
+        delete = next(i for i, s in enumerate(statements) if s.startswith('DELETE FROM measurements_1m'))
+        rebuild = next(i for i, s in enumerate(statements) if 'INSERT INTO measurements_1m' in s)
+        self.assertLess(alter, delete)
+        self.assertLess(delete, rebuild)
+        self.assertIn('% 60 != 0', statements[delete])
+        self.assertEqual(cursor.statements[rebuild][1], (960, 5000.0))
+        # intact tables are left alone
+        self.assertFalse(any('measurements_10m' in s or 'measurements_1h' in s for s in statements))
+
+    def test_empty_raw_table_is_not_rebuilt(self):
+        cursor = FakeCursor(tables=['measurements'], auto_update=[], raw_range=(None, 5000.0))
+        ensure_rollup_tables(cursor)
+        self.assertFalse(any('INSERT INTO' in s for s, _ in cursor.statements))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+import os
+import tempfile
+from unittest.mock import patch
+from include.measurement_spool import MeasurementSpool
+from include.measurement_storage import SQLiteStorage
+
+
+def make_row(i):
+    return (1700000000.0 + 5 * i, 22.5, 50.0, 800 + i, 1, 0, 0, 0)
+
+
+class TestMeasurementSpool(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'spool', 'measurements.jsonl')
+        self.spool = MeasurementSpool(self.path)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_rows_are_replayed_in_order(self):
+        self.spool.append([make_row(i) for i in range(5)])
+        self.spool.append([make_row(i) for i in range(5, 8)])
+
+        rows, offset = self.spool.read_batch(100)
+        self.assertEqual(rows, [make_row(i) for i in range(8)])
+
+        self.spool.commit(offset)
+        self.assertEqual(self.spool.pending(), 0)
+        self.assertEqual(self.spool.read_batch(100)[0], [])
+
+    def test_replay_resumes_after_committed_offset(self):
+        self.spool.append([make_row(i) for i in range(10)])
+        rows, offset = self.spool.read_batch(4)
+        self.assertEqual(len(rows), 4)
+        self.spool.commit(offset)
+
+        # a new instance (e.g. after a restart) continues where the replay stopped
+        spool = MeasurementSpool(self.path)
+        rows, offset = spool.read_batch(100)
+        self.assertEqual(rows, [make_row(i) for i in range(4, 10)])
+
+    def test_partially_written_line_is_not_replayed(self):
+        self.spool.append([make_row(0)])
+        with open(self.path, 'a') as file:
+            file.write('[1700000005.0, 22.5')
+        rows, _ = self.spool.read_batch(100)
+        self.assertEqual(rows, [make_row(0)])
+
+    def test_replay_inserts_into_storage(self):
+        storage = SQLiteStorage(os.path.join(self.tmpdir.name, 'sensor_data.db'))
+        self.spool.append([make_row(i) for i in range(10)])
+        self.assertEqual(self.spool.replay(storage, batch_size=4), 10)
+        self.assertEqual(self.spool.pending(), 0)
+        self.assertEqual(len(storage.existing_timestamps(0, 2e9)), 10)
+
+    def test_crash_between_insert_and_offset_commit(self):
+        storage = SQLiteStorage(os.path.join(self.tmpdir.name, 'sensor_data.db'))
+        self.spool.append([make_row(i) for i in range(10)])
+        # the first batch reaches the database, then the process dies before the offset is written
+        with patch.object(self.spool, 'commit', side_effect=SystemExit):
+            with self.assertRaises(SystemExit):
+                self.spool.replay(storage, batch_size=4)
+        self.assertEqual(len(storage.existing_timestamps(0, 2e9)), 4)
+
+        spool = MeasurementSpool(self.path)
+        self.assertEqual(spool.replay(storage, batch_size=4), 6)
+        timestamps = [row[7] for row in storage.fetch_window(0)]
+        self.assertEqual(timestamps, [make_row(i)[0] for i in range(10)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import json
+import unittest
+from unittest.mock import patch, MagicMock
+from include.clock import VirtualClock
+from tests.plant_simulator import PlantSimulator, SimulatedMqttClient
+
+
+class TestMqttCommandCache(unittest.TestCase):
+    @patch.dict(os.environ, {'TESTING': '1'})
+    @patch('include.mqtt_interface.mqtt.Client')
+    def setUp(self, mock_client):
+        from include.mqtt_interface import MQTT_Interface
+        self.clock = VirtualClock(start=0)
+        self.mqtt_interface = MQTT_Interface("localhost", 1883, "user", "password", clock=self.clock)
+        self.client = MagicMock()
+        self.mqtt_interface.client = self.client
+        self.light = self.mqtt_interface.lightSocket.friendly_name
+
+    def published(self):
+        return [(call.args[0], json.loads(call.args[1])) for call in self.client.publish.call_args_list]
+
+    def test_repeated_command_is_suppressed(self):
+        for _ in range(10):
+            self.mqtt_interface.setLightState(True)
+            self.clock.advance(1)
+        self.assertEqual(self.published(), [(f"zigbee2mqtt/{self.light}/set",
+                                             {"state": "ON", "on_time": 60, "off_wait_time": 10})])
+        stats = self.mqtt_interface.command_stats()
+        self.assertEqual(stats['published'], 1)
+        self.assertEqual(stats['suppressed'], 9)
+        self.assertEqual(stats['sockets'][self.light], {'published': 1, 'suppressed': 9})
+
+    def test_state_change_is_published(self):
+        self.mqtt_interface.setLightState(True)
+        self.mqtt_interface.setLightState(False)
+        self.mqtt_interface.setLightState(False)
+        self.mqtt_interface.setLightState(True)
+        self.assertEqual([payload['state'] for _, payload in self.published()], ["ON", "OFF", "ON"])
+
+    def test_on_is_refreshed_before_on_time_lapses(self):
+        # 1 Hz light loop for 10 minutes, on_time 60 s and a 15 s margin -> one refresh every 45 s
+        for _ in range(600):
+            self.mqtt_interface.setLightState(True)
+            self.clock.advance(1)
+        self.assertEqual(len(self.published()), 14)
+        stats = self.mqtt_interface.command_stats()
+        self.assertGreater(stats['suppressed'], 10 * stats['published'])
+
+    def test_off_is_refreshed(self):
+        # a socket which missed the OFF or restarted is corrected within on_time - margin
+        for _ in range(600):
+            self.mqtt_interface.setFridgeState(False)
+            self.clock.advance(5)
+        published = self.published()
+        self.assertEqual(len(published), 67)  # 3000 s, every 45 s
+        self.assertTrue(all(payload == {"state": "OFF"} for _, payload in published))
+
+    def test_availability_does_not_invalidate(self):
+        self.mqtt_interface.setLightState(True)
+        message = MagicMock(topic=f"zigbee2mqtt/{self.light}/availability", payload=b'{"state": "online"}')
+        self.mqtt_interface.on_message(None, None, message)
+        self.mqtt_interface.setLightState(True)
+        self.assertEqual(len(self.published()), 1)
+
+    def test_sockets_are_cached_separately(self):
+        self.mqtt_interface.setFridgeState(True)
+        self.mqtt_interface.setHeaterState(True)
+        self.mqtt_interface.setFridgeState(True)
+        self.assertEqual(len(self.published()), 2)
+
+    def test_differing_state_report_invalidates(self):
+        self.mqtt_interface.setLightState(True)
+        # the command was lost, the socket still reports OFF
+        message = MagicMock(topic=f"zigbee2mqtt/{self.light}", payload=b'{"state": "OFF"}')
+        self.mqtt_interface.on_message(None, None, message)
+        self.mqtt_interface.setLightState(True)
+        self.assertEqual(len(self.published()), 2)
+        # a matching report keeps the entry
+        message.payload = b'{"state": "ON"}'
+        self.mqtt_interface.on_message(None, None, message)
+        self.mqtt_interface.setLightState(True)
+        self.assertEqual(len(self.published()), 2)
+
+    def test_reconnect_and_reload_invalidate(self):
+        self.mqtt_interface.setLightState(True)
+        self.mqtt_interface.on_connect(self.client, None, None, 0)
+        self.mqtt_interface.setLightState(True)
+        with patch.dict(os.environ, {'TESTING': '1'}):
+            self.mqtt_interface.reload_device_config()
+        self.mqtt_interface.setLightState(True)
+        self.assertEqual(len(self.published()), 3)
+
+    def test_plant_follows_cached_commands(self):
+        simulator = PlantSimulator()
+        self.mqtt_interface.client = SimulatedMqttClient(simulator, box=0, on_message=self.mqtt_interface.on_message)
+        self.mqtt_interface.setFridgeState(True)
+        self.mqtt_interface.setFridgeState(True)
+        self.assertTrue(simulator.on['fridge'][0])
+        self.mqtt_interface.setFridgeState(False)
+        self.assertFalse(simulator.on['fridge'][0])
+        self.assertEqual(simulator.switches['fridge'][0], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import os
+import json
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+
+
+def message(topic, payload):
+    return MagicMock(topic=topic, payload=json.dumps(payload).encode())
+
+
+class TestMqttDeviceIndex(unittest.TestCase):
+    @patch.dict(os.environ, {'TESTING': '1'})
+    @patch('include.mqtt_interface.mqtt.Client')
+    def setUp(self, mock_client):
+        from include.mqtt_interface import MQTT_Interface
+        self.mqtt_interface = MQTT_Interface("localhost", 1883, "user", "password")
+        self.mqtt_interface.client = MagicMock()
+        self.fridge = self.mqtt_interface.fridgeSocket
+
+    def bridge_devices(self, count):
+        devices = [{'friendly_name': 'Coordinator', 'ieee_address': '0x0', 'type': 'Coordinator'}]
+        devices += [{'friendly_name': f"0x{i:016x}", 'ieee_address': f"0x{i:016x}", 'type': 'Router'}
+                    for i in range(1, count)]
+        devices += [{'friendly_name': device.friendly_name, 'ieee_address': device.friendly_name, 'type': 'Router'}
+                    for device in self.mqtt_interface.devices]
+        return message("zigbee2mqtt/bridge/devices", devices)
+
+    def test_state_report_dispatch(self):
+        self.mqtt_interface.on_message(None, None, message(f"zigbee2mqtt/{self.fridge.friendly_name}", {"state": "ON"}))
+        self.assertTrue(self.mqtt_interface.getFridgeState())
+        self.assertIsNotNone(self.fridge.internalLastSeen)
+        self.mqtt_interface.on_message(None, None, message(f"zigbee2mqtt/{self.fridge.friendly_name}/state", {"state": "OFF"}))
+        self.assertFalse(self.mqtt_interface.getDeviceState(self.fridge.friendly_name))
+        # other devices of the network are ignored
+        self.mqtt_interface.on_message(None, None, message("zigbee2mqtt/0x0000000000000001", {"state": "ON"}))
+        self.assertEqual([device.state for device in self.mqtt_interface.devices], [False] * 4)
+        self.assertIsNone(self.mqtt_interface.getDeviceState("0x0000000000000001"))
+
+    def test_discovered_devices_are_unique(self):
+        self.mqtt_interface.on_message(None, None, self.bridge_devices(300))
+        self.mqtt_interface.on_message(None, None, self.bridge_devices(300))
+        discovered = self.mqtt_interface.getDiscoveredDevices()
+        self.assertEqual(len(discovered), 303)
+        self.assertEqual(len({device['friendly_name'] for device in discovered}), 303)
+        self.assertNotIn('Coordinator', self.mqtt_interface._discovered_by_name)
+
+    def test_availability_updates_discovered_device(self):
+        self.mqtt_interface.on_message(None, None, self.bridge_devices(10))
+        self.fridge.internalLastSeen = time.time()
+        self.mqtt_interface.checkDeviceAvailability(self.fridge.friendly_name)
+        self.assertTrue(self.fridge.availability)
+        discovered = self.mqtt_interface._discovered_by_name[self.fridge.friendly_name]
+        self.assertTrue(discovered['available'])
+        self.fridge.internalLastSeen = time.time() - 60
+        self.mqtt_interface.checkDeviceAvailability(self.fridge.friendly_name)
+        self.assertFalse(discovered['available'])
+
+    def test_missing_configured_device_is_reported(self):
+        devices = [{'friendly_name': 'plug', 'ieee_address': self.fridge.friendly_name, 'type': 'Router'}]
+        with patch('builtins.print') as mock_print:
+            self.mqtt_interface.on_message(None, None, message("zigbee2mqtt/bridge/devices", devices))
+        warnings = [call.args[0] for call in mock_print.call_args_list]
+        self.assertEqual(len(warnings), 3)
+        self.assertFalse(any(self.fridge.friendly_name in warning for warning in warnings))
+
+    def test_reload_reindexes_devices(self):
+        old_name = self.fridge.friendly_name
+        config = dict(self.mqtt_interface.device_config, FRIDGE={'friendly_name': '0xnewfridge'})
+        with patch.object(self.mqtt_interface, 'load_device_config', return_value=config):
+            self.mqtt_interface.reload_device_config()
+        self.mqtt_interface.on_message(None, None, message(f"zigbee2mqtt/{old_name}", {"state": "ON"}))
+        self.assertFalse(self.fridge.state)
+        self.mqtt_interface.on_message(None, None, message("zigbee2mqtt/0xnewfridge", {"state": "ON"}))
+        self.assertTrue(self.fridge.state)
+        self.mqtt_interface.switch_off("0xnewfridge")
+        self.assertTrue(self.fridge.manualOverrideActive)
+
+        # a removed device is no longer dispatched to
+        del config['FRIDGE']
+        with patch.object(self.mqtt_interface, 'load_device_config', return_value=config):
+            self.mqtt_interface.reload_device_config()
+        self.mqtt_interface.on_message(None, None, message("zigbee2mqtt/0xnewfridge", {"state": "ON"}))
+        self.assertFalse(self.fridge.state)
+        self.assertNotIn("", self.mqtt_interface._devices_by_name)
+
+    def test_shared_socket_switches_every_role(self):
+        # fridge and heater are assigned to the same socket
+        heater = self.mqtt_interface.heater
+        config = dict(self.mqtt_interface.device_config, FRIDGE={'friendly_name': '0xshared'},
+                      HEATER={'friendly_name': '0xshared'})
+        with patch.object(self.mqtt_interface, 'load_device_config', return_value=config):
+            self.mqtt_interface.reload_device_config()
+
+        self.mqtt_interface.switch_on("0xshared")
+        self.assertTrue(self.fridge.state and heater.state)
+        self.assertTrue(self.fridge.manualOverrideActive and heater.manualOverrideActive)
+        self.mqtt_interface.switch_off("0xshared")
+        self.assertFalse(self.fridge.state or heater.state)
+        # one command per switch, not one per role
+        self.assertEqual([call.args[0] for call in self.mqtt_interface.client.publish.call_args_list],
+                         ["zigbee2mqtt/0xshared/set"] * 2)
+
+        self.fridge.internalLastSeen = time.time()
+        heater.internalLastSeen = time.time() - 60
+        self.mqtt_interface.checkDeviceAvailability("0xshared")
+        self.assertTrue(self.fridge.availability)
+        self.assertFalse(heater.availability)
+
+
+if __name__ == '__main__':
+    unittest.main()
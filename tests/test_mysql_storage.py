@@ -0,0 +1,56 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import mysql.connector
+from include.database_pool import DatabasePool
+from include.measurement_storage import MySQLStorage
+
+
+def make_connection(**config):
+    conn = MagicMock()
+    conn.in_transaction = False
+    conn.cursor.return_value.fetchmany.return_value = [(1700000000, 22.0)]
+    return conn
+
+
+@patch('include.database_pool.mysql.connector.connect')
+class TestMySQLStorageExport(unittest.TestCase):
+    def setUp(self):
+        self.pool = DatabasePool({'host': 'dummy'}, pool_size=2)
+        self.storage = MySQLStorage(self.pool)
+
+    def batches(self):
+        return self.storage.iter_table('measurements_1m', ['temperature_c'], 'bucket_start', 0, 1800000000)
+
+    def test_aborted_export_discards_the_connection(self, connect):
+        conn = make_connection()
+        connect.return_value = conn
+        batches = self.batches()
+        self.assertEqual(next(batches), [(1700000000, 22.0)])
+        # the download was cancelled, the unbuffered cursor still has unread rows
+        conn.cursor.return_value.close.side_effect = mysql.connector.errors.InternalError(msg="Unread result found")
+        batches.close()
+        conn.close.assert_called_once()
+        self.assertEqual(self.pool._idle, [])
+        stats = self.pool.stats()
+        self.assertEqual((stats['open'], stats['connections_discarded']), (0, 1))
+
+    def test_completed_export_returns_the_connection(self, connect):
+        conn = make_connection()
+        conn.cursor.return_value.fetchmany.side_effect = [[(1700000000, 22.0)], []]
+        connect.return_value = conn
+        self.assertEqual(list(self.batches()), [[(1700000000, 22.0)]])
+        conn.close.assert_not_called()
+        self.assertEqual([idle for idle, _ in self.pool._idle], [conn])
+
+    def test_failed_query_discards_the_connection(self, connect):
+        conn = make_connection()
+        conn.cursor.return_value.execute.side_effect = mysql.connector.errors.OperationalError(msg="gone")
+        connect.return_value = conn
+        with self.assertRaises(mysql.connector.errors.OperationalError):
+            list(self.batches())
+        self.assertEqual(self.pool._idle, [])
+        self.assertEqual(self.pool.stats()['connections_discarded'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
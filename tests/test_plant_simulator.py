@@ -0,0 +1,98 @@
+import os
+import unittest
+from unittest.mock import patch
+import numpy as np
+from tests.plant_simulator import PlantSimulator, SimulatedMqttClient, SimulatedOutput, benchmark_thermostats
+from tests.replay_harness import ReplayHarness, SYNTHETIC_START
+
+FRIDGE_SOCKET = "0xf0d1b8be24085e85"  # tests/test_configs/device_setup.json
+
+
+class TestPlantSimulator(unittest.TestCase):
+    def test_lamp_heats_to_equilibrium(self):
+        simulator = PlantSimulator()
+        simulator.set_actuator('light', True)
+        simulator.advance_to(12 * 3600, max_step=600)
+        # ambient + lamp heat / wall conductance
+        self.assertAlmostEqual(simulator.temperature[0], 21.0 + 100.0 / 8.0, places=2)
+
+    def test_large_steps_match_small_steps(self):
+        coarse = PlantSimulator(temperature=30.0)
+        fine = PlantSimulator(temperature=30.0)
+        for simulator in (coarse, fine):
+            simulator.set_actuator('fridge', True)
+            simulator.set_actuator('humidifier', True)
+        coarse.advance_to(1800, max_step=600)
+        fine.advance_to(1800, max_step=1)
+        self.assertAlmostEqual(coarse.temperature[0], fine.temperature[0], places=6)
+        self.assertAlmostEqual(coarse.humidity[0], fine.humidity[0], places=6)
+
+    def test_vectorised_boxes(self):
+        simulator = PlantSimulator(n=100, spread=0.1, seed=3)
+        heated = np.arange(100) < 50
+        simulator.set_actuator('heater', heated)
+        simulator.set_actuator('co2', ~heated)
+        simulator.advance_to(3600)
+        self.assertTrue((simulator.temperature[heated] > 23).all())
+        self.assertTrue((np.abs(simulator.temperature[~heated] - 21) < 1e-9).all())
+        self.assertTrue((simulator.co2[~heated] > 1000).all())
+        self.assertTrue((simulator.humidity >= 0).all() and (simulator.humidity <= 100).all())
+        # same seed, same boxes
+        again = PlantSimulator(n=100, spread=0.1, seed=3)
+        np.testing.assert_array_equal(again.parameters['heater_power'], simulator.parameters['heater_power'])
+
+    def test_socket_on_time_expires_without_refresh(self):
+        simulator = PlantSimulator()
+        topic = f"zigbee2mqtt/{FRIDGE_SOCKET}/set"
+        report = simulator.handle_message(topic, '{"state": "ON", "on_time":60, "off_wait_time":10}')
+        self.assertEqual(report, (f"zigbee2mqtt/{FRIDGE_SOCKET}", '{"state": "ON"}'))
+        simulator.advance_to(50)
+        simulator.handle_message(topic, '{"state": "ON", "on_time":60, "off_wait_time":10}')
+        simulator.advance_to(100)
+        self.assertTrue(simulator.on['fridge'][0])
+        simulator.advance_to(115)
+        self.assertFalse(simulator.on['fridge'][0])
+        self.assertEqual(simulator.switches['fridge'][0], 2)
+        self.assertIsNone(simulator.handle_message("zigbee2mqtt/unknown/set", '{"state": "ON"}'))
+
+    @patch.dict(os.environ, {'TESTING': '1'})
+    @patch('include.mqtt_interface.mqtt.Client')
+    def test_mqtt_interface_commands(self, mock_client):
+        from include.mqtt_interface import MQTT_Interface
+        simulator = PlantSimulator(n=2)
+        mqtt_interface = MQTT_Interface("localhost", 1883, "user", "password")
+        mqtt_interface.client = SimulatedMqttClient(simulator, box=1, on_message=mqtt_interface.on_message)
+
+        mqtt_interface.setFridgeState(True)
+        mqtt_interface.setHeaterState(True)
+        self.assertEqual(list(simulator.on['fridge']), [False, True])
+        # the socket's state report reaches the interface
+        self.assertTrue(mqtt_interface.getFridgeState())
+        mqtt_interface.setHeaterState(False)
+        self.assertFalse(mqtt_interface.getHeaterState())
+        self.assertFalse(simulator.on['heater'][1])
+
+        output = SimulatedOutput(simulator, box=0)
+        output.on()
+        self.assertEqual(list(simulator.on['humidifier']), [True, False])
+
+    def test_closed_loop_through_controllers(self):
+        simulator = PlantSimulator(start=SYNTHETIC_START)
+        report = ReplayHarness().run(plant=simulator, start=SYNTHETIC_START, hours=2)
+        self.assertEqual(report['samples'], 1440)
+        self.assertEqual(simulator.time, SYNTHETIC_START + 1439 * 5)
+        self.assertGreater(report['switches']['co2'], 0)
+        # the valve keeps the CO2 close to the target
+        self.assertGreater(report['time_in_band']['co2'], 0.9)
+
+    def test_benchmark_variants(self):
+        result = benchmark_thermostats(boxes=30, hours=2, hysteresis=(0.2, 1.0))
+        self.assertEqual(set(result['variants']), {0.2, 1.0})
+        narrow, wide = result['variants'][0.2], result['variants'][1.0]
+        self.assertGreaterEqual(narrow['heater_switches'] + narrow['fridge_switches'],
+                                wide['heater_switches'] + wide['fridge_switches'])
+        self.assertGreater(result['speedup'], 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
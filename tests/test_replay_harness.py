@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+from include.sensor_sample_store import SensorSample
+from tests.replay_harness import ReplayHarness, synthetic_trace, load_trace, SYNTHETIC_START
+
+
+class ConstantPlant:
+    """Closed loop stand-in, records the actuator states it is asked with"""
+    def __init__(self):
+        self.states = []
+
+    def sample(self, timestamp, states):
+        self.states.append(states)
+        return SensorSample(timestamp, 20.0, 60.0, 600.0)
+
+
+class TestReplayHarness(unittest.TestCase):
+    def test_day_replay_is_deterministic_and_fast(self):
+        first = ReplayHarness().run()
+        second = ReplayHarness().run()
+        self.assertEqual(first['samples'], 17280)
+        self.assertEqual(first['virtual_seconds'], 86400.0)
+        # a day takes under a second, the bound catches a 2x regression on slow machines
+        self.assertLess(min(first['wall_seconds'], second['wall_seconds']), 2.0)
+        first.pop('wall_seconds')
+        second.pop('wall_seconds')
+        self.assertEqual(first, second)
+        self.assertGreater(first['switches']['heater'], 0)
+        self.assertGreater(first['switches']['co2'], 0)
+        self.assertEqual(first['switches']['light'], 2)
+
+    def test_bus_reacts_to_the_sample_polling_lags(self):
+        trace = list(synthetic_trace(hours=2))
+        bus = ReplayHarness(mode='bus').run(trace)
+        polling = ReplayHarness(mode='polling', polling_phase=2.5).run(trace)
+        self.assertGreater(bus['decision_latency_s']['count'], 0)
+        self.assertEqual(bus['decision_latency_s']['max'], 0.0)
+        self.assertEqual(polling['decision_latency_s']['p50'], 2.5)
+
+    def test_watchdog_safe_mode_on_sensor_gap(self):
+        # CO2 below target opens the valve, then samples stop for two minutes
+        trace = [SensorSample(SYNTHETIC_START + 5 * i, 22.0, 45.0, 500.0) for i in range(12)]
+        trace.append(SensorSample(SYNTHETIC_START + 180, 22.0, 45.0, 500.0))
+        harness = ReplayHarness(mode='bus')
+        report = harness.run(trace)
+        self.assertEqual(harness.sample_bus.stats()['safe_mode_entries'], 1)
+        # opened, closed by the safe mode, opened again by the last sample
+        self.assertEqual(report['switches']['co2'], 3)
+
+    def test_recorded_trace(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'trace.csv')
+            with open(path, 'w') as file:
+                file.write('timestamp,temperature_c,humidity,eco2\n')
+                for i in range(120):
+                    file.write(f'{SYNTHETIC_START + 5 * i},{21 + i / 100},{50},{700}\n')
+                file.write('not a time,,,\n')
+            trace = load_trace(path)
+        self.assertEqual(len(trace), 120)
+        report = ReplayHarness().run(trace)
+        self.assertEqual(report['samples'], 120)
+        self.assertEqual(report['time_in_band']['co2'], 1.0)
+
+    def test_closed_loop_plant(self):
+        plant = ConstantPlant()
+        report = ReplayHarness().run(plant=plant, start=SYNTHETIC_START, hours=1)
+        self.assertEqual(report['samples'], 720)
+        self.assertEqual(len(plant.states), 720)
+        # 600 ppm is below the target, the valve is open from the second sample on
+        self.assertTrue(plant.states[-1]['co2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
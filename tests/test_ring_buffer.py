@@ -0,0 +1,57 @@
+import unittest
+import math
+from include.ring_buffer import SampleRingBuffer, samples_to_rows
+
+
+def make_row(i, temperature=None):
+    return (1000.0 + 5 * i, 20.0 + i if temperature is None else temperature, 50.0, 800, i % 2, 0, 0, 1)
+
+
+class TestSampleRingBuffer(unittest.TestCase):
+    def test_window_after_wrap_around(self):
+        ring = SampleRingBuffer(capacity=10)
+        for i in range(25):
+            ring.append(make_row(i))
+
+        self.assertEqual(len(ring), 10)
+        samples = ring.window(1000.0 + 5 * 17)
+        self.assertEqual(samples['timestamp'].tolist(), [1000.0 + 5 * i for i in range(17, 25)])
+        # everything before the oldest retained sample was overwritten
+        self.assertEqual(ring.covered_since, 1000.0 + 5 * 15)
+        self.assertFalse(ring.covers(1000.0 + 5 * 14))
+
+    def test_window_end_and_exclusive_start(self):
+        ring = SampleRingBuffer(capacity=8)
+        for i in range(12):
+            ring.append(make_row(i))
+        samples = ring.window(1000.0 + 5 * 6, 1000.0 + 5 * 9, include_start=False)
+        self.assertEqual(samples['timestamp'].tolist(), [1035.0, 1040.0])
+
+    def test_history_is_prepended(self):
+        ring = SampleRingBuffer(capacity=100)
+        for i in range(10, 15):
+            ring.append(make_row(i))
+        self.assertFalse(ring.covers(1000.0))
+
+        # the database already contains some of the live samples
+        ring.load_history([make_row(i) for i in range(0, 12)], since=990.0)
+        self.assertEqual(ring.window(0)['timestamp'].tolist(), [1000.0 + 5 * i for i in range(15)])
+        self.assertTrue(ring.covers(990.0))
+
+    def test_out_of_order_sample_is_ignored(self):
+        ring = SampleRingBuffer(capacity=10)
+        ring.append(make_row(5))
+        self.assertFalse(ring.append(make_row(3)))
+        self.assertEqual(len(ring), 1)
+
+    def test_rows_use_none_for_missing_values(self):
+        ring = SampleRingBuffer(capacity=10)
+        ring.append((1000.0, None, 50.0, 800, 1, 0, 0, 0))
+        row = samples_to_rows(ring.window(0))[0]
+        self.assertIsNone(row[0])
+        self.assertEqual(row[1:], (50.0, 800.0, 1, 0, 0, 0, 1000.0))
+        self.assertTrue(math.isnan(ring.latest()['temperature']))
+
+
+if __name__ == '__main__':
+    unittest.main()
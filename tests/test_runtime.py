@@ -0,0 +1,116 @@
+import unittest
+import threading
+import time
+from include.runtime import Runtime
+
+
+class TestRuntime(unittest.TestCase):
+    def setUp(self):
+        self.runtime = Runtime(control_workers=2, io_workers=1)
+
+    def tearDown(self):
+        self.runtime.stop()
+
+    def test_jobs_rearm_themselves(self):
+        calls = []
+        done = threading.Event()
+
+        def job(sc, label):
+            calls.append(label)
+            if len(calls) < 3:
+                sc.enter(0.01, 1, job, (sc, label))
+            else:
+                done.set()
+
+        scheduler = self.runtime.scheduler('test')
+        scheduler.enter(0, 1, job, (scheduler, 'a'))
+        self.runtime.start()
+        self.assertTrue(done.wait(2))
+        self.assertEqual(calls, ['a', 'a', 'a'])
+
+    def test_callbacks_of_one_scheduler_do_not_overlap(self):
+        active = []
+        overlaps = []
+        finished = threading.Semaphore(0)
+
+        def job():
+            active.append(1)
+            if len(active) > 1:
+                overlaps.append(1)
+            time.sleep(0.05)
+            active.pop()
+            finished.release()
+
+        scheduler = self.runtime.scheduler('serial')
+        for _ in range(3):
+            scheduler.enter(0, 1, job)
+        self.runtime.start()
+        for _ in range(3):
+            self.assertTrue(finished.acquire(timeout=2))
+        self.assertEqual(overlaps, [])
+
+    def test_failures_are_recorded(self):
+        def broken():
+            raise RuntimeError("sensor unplugged")
+
+        scheduler = self.runtime.scheduler('broken', executor='io')
+        scheduler.enter(0, 1, broken)
+        later = self.runtime.scheduler('later')
+        later.enter(60, 1, print)
+        self.runtime.start()
+
+        deadline = time.time() + 2
+        while scheduler.status()['runs'] == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        status = {job['name']: job for job in self.runtime.jobs()}
+        self.assertEqual(status['broken']['failures'], 1)
+        self.assertIn('sensor unplugged', status['broken']['last_error'])
+        self.assertEqual(status['broken']['pending'], 0)
+        self.assertGreater(status['later']['next_run_in_s'], 50)
+
+    def test_timing_and_overruns(self):
+        done = threading.Event()
+
+        def slow():
+            time.sleep(0.05)
+            done.set()
+
+        scheduler = self.runtime.scheduler('slow', budget=0.01)
+        scheduler.enter(0.02, 1, slow)
+        self.runtime.start()
+        self.assertTrue(done.wait(2))
+        time.sleep(0.05)
+        status = scheduler.status(buckets=True)
+        self.assertEqual(status['overruns'], 1)
+        self.assertEqual(status['budget_ms'], 10.0)
+        self.assertEqual(status['duration_ms']['count'], 1)
+        self.assertGreaterEqual(status['duration_ms']['max'], 50.0)
+        self.assertEqual(status['start_lag_ms']['count'], 1)
+        self.assertGreaterEqual(status['start_lag_ms']['max'], 0.0)
+        self.assertEqual(len(status['duration_buckets_ms']), 1)
+
+    def test_budget_defaults_to_period(self):
+        def job(sc):
+            time.sleep(0.05)
+            # hourly job whose first run was scheduled with a short start-up delay
+            sc.enter(3600, 1, job, (sc,))
+
+        scheduler = self.runtime.scheduler('periodic')
+        scheduler.enter(0.01, 1, job, (scheduler,))
+        self.assertIsNone(scheduler.status()['budget_ms'])
+        self.runtime.start()
+        deadline = time.monotonic() + 2
+        while scheduler.status()['runs'] < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        status = scheduler.status()
+        self.assertEqual(status['runs'], 1)
+        self.assertEqual(status['budget_ms'], 3600000.0)
+        self.assertEqual(status['overruns'], 0)
+
+    def test_unknown_executor(self):
+        with self.assertRaises(ValueError):
+            self.runtime.scheduler('x', executor='gpu')
+
+
+if __name__ == '__main__':
+    unittest.main()
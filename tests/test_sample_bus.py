@@ -0,0 +1,106 @@
+import sched
+import unittest
+from include.sample_bus import SampleBus
+from include.sensor_sample_store import LatestSampleStore, SensorSample
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeScheduler:
+    """Collects entered jobs, run() executes them like a scheduler thread would"""
+    def __init__(self):
+        self.jobs = []
+
+    def enter(self, delay, priority, action, argument=()):
+        self.jobs.append((delay, action, argument))
+
+    def run(self):
+        jobs, self.jobs = self.jobs, []
+        for delay, action, argument in jobs:
+            action(*argument)
+
+
+class TestSampleBus(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.store = LatestSampleStore(max_age=60)
+        self.bus = SampleBus(self.store, timeout=15, check_interval=5, clock=self.clock)
+        self.scheduler = FakeScheduler()
+        self.samples = []
+        self.safe_mode_runs = 0
+        self.bus.subscribe('fridge', self.scheduler, self.samples.append, self.enter_safe_mode)
+
+    def enter_safe_mode(self):
+        self.safe_mode_runs += 1
+
+    def publish(self, co2=800):
+        self.store.publish(SensorSample(self.clock.now, 22.0, 50.0, co2))
+
+    def test_runs_once_per_sample(self):
+        self.publish(700)
+        self.scheduler.run()
+        self.clock.now += 5
+        self.publish(710)
+        self.scheduler.run()
+        self.scheduler.run()
+        self.assertEqual([s.co2 for s in self.samples], [700, 710])
+        self.assertEqual(self.bus.stats()['subscribers'][0]['runs'], 2)
+
+    def test_busy_subscriber_gets_newest_sample(self):
+        self.publish(700)
+        self.publish(710)
+        self.publish(720)
+        self.assertEqual(len(self.scheduler.jobs), 1)
+        self.scheduler.run()
+        self.assertEqual([s.co2 for s in self.samples], [720])
+        self.assertEqual(self.bus.stats()['subscribers'][0]['coalesced'], 2)
+
+    def test_watchdog_safe_mode(self):
+        watchdog = FakeScheduler()
+        self.publish()
+        self.scheduler.run()
+        self.clock.now += 10
+        self.bus.watchdog(watchdog)
+        self.scheduler.run()
+        self.assertEqual(self.safe_mode_runs, 0)
+
+        self.clock.now += 10
+        self.bus.watchdog(watchdog)
+        self.scheduler.run()
+        self.assertEqual(self.safe_mode_runs, 1)
+        self.assertTrue(self.bus.stats()['safe_mode'])
+        # stays in safe mode on every check until samples come back
+        self.bus.watchdog(watchdog)
+        self.scheduler.run()
+        self.assertEqual(self.safe_mode_runs, 2)
+
+        self.publish()
+        self.scheduler.run()
+        self.assertFalse(self.bus.stats()['safe_mode'])
+        self.assertEqual(self.bus.stats()['safe_mode_entries'], 1)
+        self.assertEqual(len(self.samples), 2)
+        # the watchdog re-arms itself
+        self.assertEqual([job[0] for job in watchdog.jobs], [5, 5, 5])
+
+    def test_safe_mode_without_any_sample(self):
+        self.bus.watchdog(FakeScheduler())
+        self.scheduler.run()
+        self.assertEqual(self.safe_mode_runs, 1)
+
+    def test_sched_scheduler(self):
+        scheduler = sched.scheduler()
+        heater = []
+        self.bus.subscribe('heater', scheduler, heater.append, self.enter_safe_mode)
+        self.publish()
+        scheduler.run()
+        self.assertEqual(len(heater), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+import threading
+import time
+from include.sample_queue import SampleQueue, DROP_OLDEST, COALESCE
+from include.sensor_sample_store import SensorSample
+
+
+def sample(timestamp):
+    return SensorSample(timestamp, 21.0, 50.0, 800.0)
+
+
+class TestSampleQueue(unittest.TestCase):
+    def test_batch_by_size(self):
+        queue = SampleQueue(maxsize=10)
+        for i in range(5):
+            queue.put(sample(i))
+        self.assertEqual([s.timestamp for s in queue.get_batch(3, timeout=1)], [0, 1, 2])
+        self.assertEqual(len(queue), 2)
+
+    def test_batch_by_timeout(self):
+        queue = SampleQueue(maxsize=10)
+        queue.put(sample(0))
+        started = time.monotonic()
+        self.assertEqual(len(queue.get_batch(12, timeout=0.1)), 1)
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+        self.assertEqual(queue.get_batch(12, timeout=0.01), [])
+
+    def test_writer_is_woken_up(self):
+        queue = SampleQueue(maxsize=10)
+        batches = []
+        writer = threading.Thread(target=lambda: batches.append(queue.get_batch(2, timeout=5)))
+        writer.start()
+        queue.put(sample(0))
+        queue.put(sample(1))
+        writer.join(2)
+        self.assertEqual(len(batches[0]), 2)
+
+    def test_drop_oldest(self):
+        queue = SampleQueue(maxsize=3, policy=DROP_OLDEST)
+        for i in range(5):
+            queue.put(sample(i))
+        self.assertEqual([s.timestamp for s in queue.get_batch(3, timeout=0)], [2, 3, 4])
+        self.assertEqual(queue.stats()['dropped'], 2)
+
+    def test_coalesce(self):
+        queue = SampleQueue(maxsize=3, policy=COALESCE)
+        for i in range(5):
+            queue.put(sample(i))
+        self.assertEqual([s.timestamp for s in queue.get_batch(3, timeout=0)], [0, 1, 4])
+        self.assertEqual(queue.stats()['coalesced'], 2)
+
+    def test_latency(self):
+        queue = SampleQueue()
+        queue.record_latency([sample(100.0), sample(98.0)], now=101.0)
+        stats = queue.stats()
+        self.assertEqual(stats['written'], 2)
+        self.assertEqual(stats['latency_max_s'], 3.0)
+        with self.assertRaises(ValueError):
+            SampleQueue(policy='block')
+
+
+if __name__ == '__main__':
+    unittest.main()
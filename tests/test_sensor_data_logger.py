@@ -0,0 +1,68 @@
+import os
+import time
+import tempfile
+import importlib.util
+import unittest
+from include.heater_controller import Heater
+from include.measurement_spool import MeasurementSpool
+from include.ring_buffer import SampleRingBuffer
+from include.sample_bus import SampleBus
+from include.sample_queue import SampleQueue
+from include.sensor_sample_store import LatestSampleStore, SensorSample
+from include.trend_estimator import TrendEstimator
+
+# the logger opens the I2C bus, so this only runs where the sensor libraries are installed
+HARDWARE_LIBRARIES = all(importlib.util.find_spec(name) for name in ('adafruit_dht', 'board', 'busio', 'adafruit_ccs811'))
+
+
+class ImmediateScheduler:
+    """Runs a job as soon as it is entered, i.e. while the sample is being published"""
+    def enter(self, delay, priority, action, argument=()):
+        action(*argument)
+
+
+@unittest.skipUnless(HARDWARE_LIBRARIES, "sensor libraries not installed")
+class TestSensorDataLogger(unittest.TestCase):
+    def setUp(self):
+        os.environ['TESTING'] = '1'
+        from include.data_writer_mysql import SensorDataLogger
+        self.directory = tempfile.TemporaryDirectory()
+        self.sample_store = LatestSampleStore()
+        self.ring_buffer = SampleRingBuffer()
+        self.trend_estimator = TrendEstimator()
+        self.logger = SensorDataLogger(storage=object(), sample_store=self.sample_store, ring_buffer=self.ring_buffer,
+                                       trend_estimator=self.trend_estimator, sample_queue=SampleQueue(),
+                                       spool=MeasurementSpool(os.path.join(self.directory.name, 'spool.jsonl')))
+        db_config = {'host': 'dummy', 'user': 'dummy', 'password': 'dummy', 'database': 'dummy'}
+        self.heater = Heater(db_config, self.sample_store, ring_buffer=self.ring_buffer,
+                             trend_estimator=self.trend_estimator)
+        self.bus = SampleBus(self.sample_store)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_bus_driven_heater_sees_triggering_sample(self):
+        seen = []
+
+        def on_sample(sample):
+            seen.append((sample.temperature, self.heater.get_current_temp(),
+                         self.heater.get_temperature_change(self.heater.trend_minutes),
+                         self.ring_buffer.latest_timestamp()))
+
+        self.bus.subscribe('heater', ImmediateScheduler(), on_sample, lambda: None)
+        start = time.time() - 60
+        for i in range(6):
+            self.logger.record_sample(SensorSample(start + 5 * i, 22.0, 50.0, 800))
+        # a sudden drop: the trend computed in the triggered run already contains it
+        self.logger.record_sample(SensorSample(start + 30, 20.0, 50.0, 800))
+        temperature, current, change, latest = seen[-1]
+        self.assertEqual(temperature, 20.0)
+        self.assertEqual(current, 20.0)
+        self.assertLess(change, 0)
+        self.assertEqual(latest, start + 30)
+        # the writer still gets every sample, after the controllers ran
+        self.assertEqual(len(self.logger.sample_queue.get_batch(10, 0)), 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import threading
+import unittest
+from include.clock import VirtualClock
+from include.heater_controller import Heater
+from include.sensor_sample_store import LatestSampleStore, SensorSample, SENSOR_VALUE_MISSING, SENSOR_VALUE_STALE
+
+START = 1700000000.0
+
+
+class TestLatestSampleStore(unittest.TestCase):
+    def setUp(self):
+        self.clock = VirtualClock(start=START)
+        self.store = LatestSampleStore(max_age=60, clock=self.clock)
+
+    def publish(self, temperature=22.0, age=0):
+        sample = SensorSample(self.clock.time() - age, temperature, 50.0, 800)
+        self.store.publish(sample)
+        return sample
+
+    def test_missing(self):
+        self.assertIsNone(self.store.latest())
+        self.assertIsNone(self.store.fresh())
+        self.assertIsNone(self.store.age())
+        self.assertTrue(self.store.is_stale())
+        self.assertEqual(self.store.snapshot(), (None, 0))
+
+    def test_fresh_until_max_age(self):
+        sample = self.publish()
+        self.assertIs(self.store.fresh(), sample)
+        self.clock.advance(60)
+        self.assertEqual(self.store.age(), 60)
+        self.assertFalse(self.store.is_stale())
+        self.assertIs(self.store.fresh(), sample)
+
+        self.clock.advance(1)
+        self.assertTrue(self.store.is_stale())
+        self.assertIsNone(self.store.fresh())
+        # the stale sample is still available to callers who want it anyway
+        self.assertIs(self.store.latest(), sample)
+        self.assertIs(self.store.fresh(max_age=120), sample)
+        self.assertFalse(self.store.is_stale(max_age=120))
+
+    def test_publish_bumps_version(self):
+        self.assertEqual(self.store.version, 0)
+        first = self.publish(21.0)
+        self.assertEqual(self.store.version, 1)
+        second = self.publish(21.0)
+        # every publish counts, also if the values did not change
+        self.assertEqual(self.store.snapshot(), (second, 2))
+        self.assertIsNot(first, second)
+
+    def test_newer_sample_replaces_stale_one(self):
+        self.publish(age=300)
+        self.assertTrue(self.store.is_stale())
+        sample = self.publish(23.0)
+        self.assertIs(self.store.fresh(), sample)
+
+    def test_listeners_get_sample_and_version(self):
+        received = []
+        self.store.subscribe(lambda sample, version: received.append((sample.temperature, version)))
+        self.publish(21.0)
+        self.publish(22.0)
+        self.assertEqual(received, [(21.0, 1), (22.0, 2)])
+
+    def test_listener_may_read_the_store(self):
+        # listeners run outside the lock
+        seen = []
+        self.store.subscribe(lambda sample, version: seen.append(self.store.snapshot()))
+        sample = self.publish()
+        self.assertEqual(seen, [(sample, 1)])
+
+    def test_concurrent_publish(self):
+        def publisher():
+            for _ in range(500):
+                self.publish()
+
+        threads = [threading.Thread(target=publisher) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.store.version, 2000)
+
+    def test_controller_sentinels(self):
+        db_config = {'host': 'dummy', 'user': 'dummy', 'password': 'dummy', 'database': 'dummy'}
+        heater = Heater(db_config, self.store, clock=self.clock)
+        self.assertEqual(heater.get_current_temp(), SENSOR_VALUE_MISSING)
+        self.publish(21.5)
+        self.assertEqual(heater.get_current_temp(), 21.5)
+        self.clock.advance(61)
+        self.assertEqual(heater.get_current_temp(), SENSOR_VALUE_STALE)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import threading
+import time
+from include.single_flight_cache import SingleFlightCache
+
+
+class TestSingleFlightCache(unittest.TestCase):
+    def test_hit(self):
+        cache = SingleFlightCache()
+        calls = []
+        for _ in range(3):
+            self.assertEqual(cache.get(('4h', 1), lambda: calls.append(1) or 'rows'), 'rows')
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.stats()['hits'], 2)
+
+    def test_concurrent_requests_are_coalesced(self):
+        cache = SingleFlightCache()
+        release = threading.Event()
+        calls = []
+        results = []
+
+        def compute():
+            calls.append(1)
+            release.wait(5)
+            return 'rows'
+
+        threads = [threading.Thread(target=lambda: results.append(cache.get('key', compute))) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        while cache.stats()['coalesced'] < 9:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['rows'] * 10)
+
+    def test_errors_are_not_cached(self):
+        cache = SingleFlightCache()
+
+        def fail():
+            raise RuntimeError("database down")
+
+        with self.assertRaises(RuntimeError):
+            cache.get('key', fail)
+        self.assertEqual(cache.get('key', lambda: 'rows'), 'rows')
+
+    def test_lru_eviction(self):
+        cache = SingleFlightCache(max_entries=2)
+        cache.get('a', lambda: 1)
+        cache.get('b', lambda: 2)
+        cache.get('a', lambda: 1)
+        cache.get('c', lambda: 3)
+        self.assertEqual(cache.get('a', lambda: 'recomputed'), 1)
+        self.assertEqual(cache.get('b', lambda: 'recomputed'), 'recomputed')
+
+
+if __name__ == '__main__':
+    unittest.main()
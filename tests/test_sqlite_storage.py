@@ -0,0 +1,90 @@
+import unittest
+import os
+import tempfile
+import threading
+import time
+from include.measurement_storage import SQLiteStorage, SQLiteRetention
+from tests.measurement_rows import make_rows
+
+
+class TestSQLiteStorage(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.storage = SQLiteStorage(os.path.join(self.tmpdir.name, 'sensor_data.db'))
+        self.now = time.time()
+
+    def tearDown(self):
+        self.storage.close()
+        self.tmpdir.cleanup()
+
+    def test_wal_mode(self):
+        mode = self.storage._fetchall("PRAGMA journal_mode")[0][0]
+        self.assertEqual(mode, 'wal')
+
+    def test_insert_and_window(self):
+        self.storage.insert_rows(make_rows(self.now - 600, 120))
+        rows = self.storage.fetch_window(self.now - 300)
+        self.assertEqual(len(rows), 60)
+        # same column order as the MySQL backend: values, unix timestamp, id
+        self.assertEqual(rows[0][7], self.now - 300)
+        self.assertEqual(rows[0][8], 61)
+        self.assertEqual(self.storage.max_id(), 120)
+
+        rows = self.storage.fetch_after_id(100, self.now - 3600, 1000)
+        self.assertEqual([row[8] for row in rows], list(range(101, 121)))
+
+    def test_rollups(self):
+        start = (int(self.now) // 3600 - 1) * 3600  # full hour, 720 samples
+        self.storage.insert_rows(make_rows(start, 360))
+        self.storage.insert_rows(make_rows(start + 1800, 360))
+
+        rows = self.storage.fetch_rollups('measurements_1h', start)
+        self.assertEqual(len(rows[0]), 8)
+        self.assertEqual(rows[0][7], start)
+        self.assertAlmostEqual(rows[0][0], 20.45, places=5)
+        self.assertAlmostEqual(rows[0][3], 0.5)  # light on every other sample
+        self.assertEqual(rows[0][5], 1.0)
+
+    def test_threads_reuse_pooled_connections(self):
+        # the threaded web server runs every request in a new thread
+        for _ in range(20):
+            thread = threading.Thread(target=self.storage.max_id)
+            thread.start()
+            thread.join()
+        self.assertEqual(self.storage.stats()['connections_opened'], 1)
+        self.assertEqual(self.storage.stats()['connections_idle'], 1)
+
+    def test_idle_connections_are_bounded(self):
+        self.storage.insert_rows(make_rows(self.now - 600, 10))
+        # open exports hold their connection until they are consumed
+        exports = [self.storage.iter_table('measurements', ['temperature_c'], 'timestamp', 0, self.now, batch_size=1)
+                   for _ in range(6)]
+        for export in exports:
+            next(export)
+        self.assertEqual(self.storage.stats()['connections_opened'], 6)
+        for export in exports:
+            export.close()
+        self.assertEqual(self.storage.stats()['connections_idle'], self.storage.pool_size)
+        self.storage.close()
+        self.assertEqual(self.storage.stats()['connections_idle'], 0)
+
+    def test_retention_deletes_old_rows(self):
+        self.storage.insert_rows(make_rows(self.now - 3 * 86400, 10) + make_rows(self.now - 60, 10))
+        retention = SQLiteRetention(self.storage, retention_days=1, delete_chunk_size=3)
+        self.assertEqual(retention.apply(), 10)
+        self.assertEqual(len(self.storage.fetch_window(0)), 10)
+
+    def test_retention_expires_fine_rollups(self):
+        old = (int(self.now) // 3600 - 40 * 24) * 3600
+        recent = (int(self.now) // 3600 - 1) * 3600
+        self.storage.insert_rows(make_rows(old, 12) + make_rows(recent, 12))
+        SQLiteRetention(self.storage, retention_days=365).apply()
+        # minute buckets are kept for 30 days, the coarser ones longer
+        self.assertEqual([row[7] for row in self.storage.fetch_rollups('measurements_1m', 0)], [recent])
+        self.assertEqual([row[7] for row in self.storage.fetch_rollups('measurements_10m', 0)], [old, recent])
+        self.assertEqual([row[7] for row in self.storage.fetch_rollups('measurements_1h', 0)], [old, recent])
+        self.assertEqual(len(self.storage.fetch_window(0)), 24)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+from include.trend_estimator import RollingTrend, TrendEstimator
+
+
+class TestRollingTrend(unittest.TestCase):
+    def test_slope_of_linear_signal(self):
+        trend = RollingTrend(window_seconds=120)
+        for i in range(100):
+            trend.add(1700000000.0 + 5 * i, 20.0 + 0.01 * i)  # 0.12 °C/min
+        self.assertAlmostEqual(trend.slope() * 60, 0.12, places=6)
+        self.assertAlmostEqual(trend.ewma_slope() * 60, 0.12, places=6)
+
+    def test_window_is_time_based(self):
+        trend = RollingTrend(window_seconds=120)
+        for i in range(100):
+            trend.add(1000.0 + 5 * i, float(i))
+        self.assertEqual(trend.count(), 25)  # 120 s of 5 s samples, both ends included
+        self.assertEqual(trend.span(), 120.0)
+
+    def test_single_outlier_barely_moves_the_slope(self):
+        trend = RollingTrend(window_seconds=120)
+        values = [22.0] * 24 + [23.0]  # flat signal with a jump in the newest sample
+        for i, value in enumerate(values):
+            trend.add(1000.0 + 5 * i, value)
+        # first/last difference would report +1 °C over two minutes
+        self.assertLess(abs(trend.slope() * 120), 0.25)
+
+    def test_rebuild_keeps_the_result(self):
+        trend = RollingTrend(window_seconds=60, rebuild_every=7)
+        for i in range(50):
+            trend.add(1000.0 + 5 * i, 3.0 - 0.5 * i)
+        self.assertAlmostEqual(trend.slope(), -0.1, places=9)
+
+    def test_too_few_samples(self):
+        trend = RollingTrend(min_samples=3)
+        trend.add(1000.0, 1.0)
+        trend.add(1005.0, 2.0)
+        self.assertIsNone(trend.slope())
+
+
+class TestTrendEstimator(unittest.TestCase):
+    def test_only_registered_signals_are_tracked(self):
+        estimator = TrendEstimator()
+        estimator.register('temperature', window_seconds=120)
+        for i in range(30):
+            estimator.add_sample(1000.0 + 5 * i, temperature=25.0 - 0.05 * i, humidity=50.0)
+        self.assertAlmostEqual(estimator.slope_per_minute('temperature'), -0.6, places=6)
+        self.assertIsNone(estimator.slope_per_minute('humidity'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -43,4 +43,15 @@ else
     exit 1
 fi
 
+# Timestamp index and daily partitions for the measurements table
+echo "Migrating measurements table to daily partitions..."
+python3 -m include.measurement_retention --migrate
+
+if [ $? -eq 0 ]; then
+    echo "Successfully migrated measurements table!"
+else
+    echo "Error: Failed to migrate measurements table"
+    exit 1
+fi
+
 echo "Update completed successfully!"